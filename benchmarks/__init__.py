@@ -0,0 +1,44 @@
+"""Microbenchmarks for the launch and course hot paths.
+
+Run them from the repository root as modules, e.g.::
+
+    python -m benchmarks.oauth
+
+Benchmarks that touch the database use ``DJANGO_SETTINGS_MODULE`` (default
+``dev_skeleton.settings``); the rest configure a minimal in-memory setup.
+"""
+import os
+import time
+
+import django
+from django.conf import settings
+
+
+def setup_django(**overrides):
+    """Configure Django for a benchmark.
+
+    With keyword arguments, configure a minimal database-less project using
+    them as settings; otherwise load the project settings module.
+    """
+    if overrides:
+        overrides.setdefault('INSTALLED_APPS', [
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'ltilaunch',
+        ])
+        settings.configure(**overrides)
+    else:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                              'dev_skeleton.settings')
+    django.setup()
+
+
+def timed(label, func, count):
+    """Call ``func(i)`` for i in range(count) and print the mean cost."""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.1f} us/op  ({} ops)".format(
+        label, elapsed / count * 1e6, count))
+    return elapsed
@@ -0,0 +1,143 @@
+"""Concurrent saves through the save_code endpoint: lost updates vs. conflicts.
+
+Many threads play editor tabs of the same student, or instructors editing the
+same assignment, and save through ``save_code`` as fast as they can.  Each
+sends the ``base_version`` of its last save and, on a 409, takes the current
+version from the response and saves again.  Every accepted save must bump the
+version exactly once, so at the end the version equals the accepted saves.
+
+Creates a consumer, course and users in the configured database and removes
+them afterwards, so only run it against a development database.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks import setup_django
+
+PREFIX = 'bench-concurrency-'
+
+
+def seed():
+    from ltilaunch.models import LTIToolConsumer, get_or_create_lti_user
+    from lti_django_skeleton.models import Assignment, Course, Submission
+
+    consumer = LTIToolConsumer.objects.create(
+        name=PREFIX + 'consumer', tool_consumer_instance_guid=PREFIX + 'guid')
+    lti_user = get_or_create_lti_user(consumer, {
+        'user_id': PREFIX + 'instructor',
+        'roles': 'Instructor',
+        'context_id': PREFIX + 'course',
+        'context_title': 'Concurrency',
+    })
+    course = Course.from_lti('canvas', PREFIX + 'course', 'Concurrency',
+                             lti_user.pk)
+    assignment = Assignment.objects.create(owner=lti_user, course=course)
+    Submission.load(lti_user.pk, assignment.pk)
+    return lti_user, assignment
+
+
+def cleanup():
+    from django.contrib.auth import get_user_model
+    from ltilaunch.models import LTIToolConsumer
+    from lti_django_skeleton.models import Course
+
+    # the course cascades to its assignments and submissions
+    Course.objects.filter(external_id=PREFIX + 'course').delete()
+    consumers = LTIToolConsumer.objects.filter(name=PREFIX + 'consumer')
+    users = get_user_model().objects.filter(
+        ltiuser__lti_tool_consumer__in=consumers)
+    users.delete()
+    consumers.delete()
+
+
+def client_for(lti_user):
+    from django.test import Client
+    from ltilaunch import LTILAUNCH_SESSION_KEY, LTIUSER_SESSION_KEY
+
+    client = Client()
+    client.force_login(lti_user.user)
+    session = client.session
+    session[LTIUSER_SESSION_KEY] = lti_user.pk
+    session[LTILAUNCH_SESSION_KEY] = lti_user.last_launch_id
+    session.save()
+    return client
+
+
+def hammer(lti_user, assignment_id, filename, threads, saves):
+    """Save from many threads, returning (accepted, conflicts, seconds)."""
+    from django.db import connection
+    from django.urls import reverse
+
+    url = reverse('lti_save_code')
+    clients = [client_for(lti_user) for _ in range(threads)]
+    counts = {'accepted': 0, 'conflicts': 0}
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def tab(n, client):
+        base_version = 0
+        accepted = conflicts = 0
+        try:
+            start_line.wait()
+            while accepted < saves:
+                response = client.post(url, {
+                    'question_id': assignment_id,
+                    'filename': filename,
+                    'code': 'print({}, {})'.format(n, accepted),
+                    'base_version': base_version,
+                })
+                result = response.json()
+                base_version = result['version']
+                if response.status_code == 409:
+                    conflicts += 1
+                else:
+                    accepted += 1
+            with lock:
+                counts['accepted'] += accepted
+                counts['conflicts'] += conflicts
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=tab, args=(n, client))
+               for n, client in enumerate(clients)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts['accepted'], counts['conflicts'], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--saves', type=int, default=50,
+                        help="accepted saves per thread")
+    args = parser.parse_args()
+
+    setup_django()
+    from lti_django_skeleton.models import Assignment, Submission
+
+    try:
+        lti_user, assignment = seed()
+        for label, filename, version in [
+                ("student tabs (submission)", '__main__',
+                 lambda: Submission.objects.get(
+                     user=lti_user, assignment=assignment).version),
+                ("instructors (on_run)", 'on_run',
+                 lambda: Assignment.objects.get(pk=assignment.pk).version)]:
+            before = version()
+            accepted, conflicts, elapsed = hammer(
+                lti_user, assignment.pk, filename, args.threads, args.saves)
+            lost = accepted - (version() - before)
+            print("{:<28} {:>6} saves {:>6} conflicts {:>8.1f} saves/s "
+                  "{:>4} lost".format(label, accepted, conflicts,
+                                      accepted / elapsed, lost))
+            assert lost == 0
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
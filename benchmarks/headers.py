@@ -0,0 +1,92 @@
+"""Header extraction for the OAuth check on a gunicorn-sized request.META."""
+import argparse
+import re
+
+from benchmarks import setup_django, timed
+
+
+def gunicorn_meta(i):
+    """A request.META much like one built by gunicorn behind a proxy."""
+    meta = {
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': '',
+        'RAW_URI': '/lti/launch',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': '/lti/launch',
+        'SERVER_NAME': 'tool.example.edu',
+        'SERVER_PORT': '443',
+        'REMOTE_ADDR': '10.0.0.12',
+        'REMOTE_PORT': str(40000 + i % 20000),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': None,
+        'wsgi.errors': None,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': None,
+        'wsgi.input_terminated': True,
+        'gunicorn.socket': None,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': '1834',
+        'HTTP_HOST': 'tool.example.edu',
+        'HTTP_CONNECTION': 'close',
+        'HTTP_USER_AGENT': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/115.0',
+        'HTTP_ACCEPT': 'text/html,application/xhtml+xml,*/*;q=0.8',
+        'HTTP_ACCEPT_LANGUAGE': 'en-US,en;q=0.5',
+        'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br',
+        'HTTP_ORIGIN': 'https://canvas.example.edu',
+        'HTTP_REFERER': 'https://canvas.example.edu/courses/1/assignments/2',
+        'HTTP_COOKIE': 'csrftoken=abc; sessionid=def',
+        'HTTP_UPGRADE_INSECURE_REQUESTS': '1',
+        'HTTP_SEC_FETCH_DEST': 'iframe',
+        'HTTP_SEC_FETCH_MODE': 'navigate',
+        'HTTP_SEC_FETCH_SITE': 'cross-site',
+        'HTTP_X_FORWARDED_FOR': '192.0.2.{}'.format(i % 250),
+        'HTTP_X_FORWARDED_PROTO': 'https',
+        'HTTP_X_REAL_IP': '192.0.2.1',
+    }
+    meta['HTTP_AUTHORIZATION'] = 'OAuth oauth_nonce="{}"'.format(i)
+    return meta
+
+
+class FakeRequest:
+    def __init__(self, meta):
+        self.META = meta
+
+
+def legacy_headers_from_request(request):
+    """headers_from_request as it was, with regexes applied per key."""
+    header_key_re = re.compile(r"^(HTTP_.+|CONTENT_TYPE|CONTENT_LENGTH)$")
+
+    def meta_key_to_header(meta_key):
+        return re.sub("_", "-", re.sub("^HTTP_", "", meta_key)).title()
+
+    return dict(
+        (meta_key_to_header(k), v) for k, v in request.META.items()
+        if re.match(header_key_re, k) and
+        not k.startswith("HTTP_X_FORWARDED"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django(ALLOWED_HOSTS=['*'])
+
+    from ltilaunch.utils import (headers_from_request,
+                                 oauth_headers_from_request)
+
+    requests = [FakeRequest(gunicorn_meta(i)) for i in range(args.requests)]
+    timed("legacy headers_from_request",
+          lambda i: legacy_headers_from_request(requests[i]), args.requests)
+    timed("cached headers_from_request",
+          lambda i: headers_from_request(requests[i]), args.requests)
+    timed("oauth_headers_from_request",
+          lambda i: oauth_headers_from_request(requests[i]), args.requests)
+
+
+if __name__ == '__main__':
+    main()
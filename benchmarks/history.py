@@ -0,0 +1,139 @@
+"""Storage and CPU cost of the code history on simulated editing sessions.
+
+Students type an assignment's solution a few characters at a time, with the
+occasional edit in the middle of the file, and every keystroke autosaves.
+Each save is written as a file of its own (the old code logs), as
+keyframes only, and as deltas with periodic keyframes.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from lti_django_skeleton.history import CodeHistory
+
+SOLUTION = '''import weather
+
+reports = weather.get_weather()
+temperatures = []
+for report in reports:
+    if report["Station"]["State"] == "Virginia":
+        temperatures.append(report["Data"]["Temperature"]["Avg Temp"])
+
+total = 0
+for temperature in temperatures:
+    total = total + temperature
+print(total / len(temperatures))
+
+import matplotlib.pyplot as plt
+plt.hist(temperatures)
+plt.title("Average temperatures in Virginia")
+plt.xlabel("Temperature")
+plt.ylabel("Weeks")
+plt.show()
+'''
+
+
+def typing_session(rng, saves):
+    """Yield the code after each of a student's saves."""
+    code = ''
+    for _ in range(saves):
+        if len(code) < len(SOLUTION) and rng.random() < 0.9:
+            code += SOLUTION[len(code):len(code) + rng.randint(1, 4)]
+        else:
+            # fix a typo somewhere earlier in the file
+            at = rng.randrange(len(code) + 1)
+            code = code[:at] + rng.choice('abcxyz ') + code[at + 1:]
+        yield code
+
+
+def disk_usage(directory):
+    # allocated blocks, since small files each take a whole one
+    return sum(os.stat(os.path.join(root, name)).st_blocks * 512
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def write_files(directory, sessions):
+    # the code_logs layout: one file per save
+    for user_id, saves in sessions.items():
+        user_dir = os.path.join(directory, '1', str(user_id))
+        os.makedirs(user_dir)
+        for i, code in enumerate(saves):
+            with open(os.path.join(user_dir, '{:08d}.py'.format(i)),
+                      'w') as code_file:
+                code_file.write(code)
+
+
+def read_files(directory, user_id):
+    user_dir = os.path.join(directory, '1', str(user_id))
+    codes = []
+    for name in sorted(os.listdir(user_dir)):
+        with open(os.path.join(user_dir, name)) as code_file:
+            codes.append(code_file.read())
+    return codes
+
+
+def write_history(history, sessions):
+    # interleave students the way concurrent autosaves would arrive
+    for i in range(max(len(saves) for saves in sessions.values())):
+        for user_id, saves in sessions.items():
+            if i < len(saves):
+                history.append(1, user_id, saves[i], timestamp=1000.0 + i)
+
+
+def report(label, directory, saves, write, read, latest):
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    size = disk_usage(directory)
+    start = time.perf_counter()
+    read()
+    read_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    latest()
+    latest_elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.1f} MB {:>8.0f} B/save {:>8.1f} us/save "
+          "{:>8.1f} ms/history {:>8.1f} us/latest".format(
+              label, size / 1e6, size / saves, elapsed / saves * 1e6,
+              read_elapsed * 1e3, latest_elapsed * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--saves', type=int, default=400,
+                        help="saves per student")
+    parser.add_argument('--keyframe-interval', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    sessions = {user_id: list(typing_session(rng, args.saves))
+                for user_id in range(args.students)}
+    saves = args.students * args.saves
+    final = sessions[0][-1]
+
+    directory = tempfile.mkdtemp()
+    try:
+        target = os.path.join(directory, 'files')
+        report("file per save", target, saves,
+               lambda: write_files(target, sessions),
+               lambda: read_files(target, 0),
+               lambda: read_files(target, 0)[-1])
+        for label, interval in [("keyframes only", 1),
+                                ("deltas", args.keyframe_interval)]:
+            target = os.path.join(directory, label)
+            history = CodeHistory(target, keyframe_interval=interval)
+            report(label, target, saves,
+                   lambda: write_history(history, sessions),
+                   lambda: list(history.snapshots(1, 0)),
+                   lambda: history.snapshot_at(1, 0, float('inf')))
+            assert [s.code for s in history.snapshots(1, 0)] == sessions[0]
+            assert history.snapshot_at(1, 0, float('inf')).code == final
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Per-launch OAuth signature check: fresh endpoint vs. pooled endpoint."""
+import argparse
+
+from benchmarks import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--launches', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django(
+        LTILAUNCH_NONCE_STORE='ltilaunch.nonces.MemoryNonceStore')
+
+    import oauthlib.oauth1
+    from ltilaunch.consumers import ConsumerSnapshot
+    from ltilaunch.oauth import (LTIOAuthValidator, endpoint_for_consumer,
+                                 validate_lti_launch)
+    from oauthlib.oauth1 import SignatureOnlyEndpoint
+
+    consumer = ConsumerSnapshot(
+        pk=1, name='bench', oauth_consumer_key='k' * 40,
+        oauth_consumer_secret='s' * 40, tool_consumer_instance_guid='guid',
+        match_guid_and_consumer=True, consumer_group_id=None,
+        matcher_class_name=None)
+    uri = 'https://example.com/lti/launch'
+    signer = oauthlib.oauth1.Client(
+        client_key=consumer.oauth_consumer_key,
+        client_secret=consumer.oauth_consumer_secret,
+        signature_type=oauthlib.oauth1.SIGNATURE_TYPE_BODY)
+
+    def signed_launches():
+        # nonces must be fresh, so sign a new batch for every run
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        return [signer.sign(uri, http_method='POST', headers=headers,
+                            body={'user_id': str(i), 'roles': 'Learner'})
+                for i in range(args.launches)]
+
+    launches = signed_launches()
+
+    def fresh(i):
+        _, headers, body = launches[i]
+        SignatureOnlyEndpoint(LTIOAuthValidator(consumer)).validate_request(
+            uri, http_method='POST', body=body, headers=headers)
+
+    timed("fresh endpoint per launch", fresh, args.launches)
+
+    launches = signed_launches()
+
+    def pooled(i):
+        _, headers, body = launches[i]
+        validate_lti_launch(consumer, uri, body, headers)
+
+    timed("pooled endpoint", pooled, args.launches)
+
+    timed("endpoint construction only",
+          lambda i: SignatureOnlyEndpoint(LTIOAuthValidator(consumer)),
+          args.launches)
+    timed("endpoint pool lookup only",
+          lambda i: endpoint_for_consumer(consumer), args.launches)
+
+
+if __name__ == '__main__':
+    main()
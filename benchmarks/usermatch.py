@@ -0,0 +1,129 @@
+"""User matching against a large LTI user table: legacy vs. single query.
+
+Seeds ``--users`` Django users and LTI users (one million by default) spread
+over a consumer group, so only run it against a disposable development
+database.  The seeded rows are removed afterwards unless ``--keep`` is given.
+"""
+import argparse
+import random
+
+from benchmarks import setup_django, timed
+
+PREFIX = 'bench-usermatch-'
+
+
+def seed(consumers, count):
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from ltilaunch.models import LTIUser
+
+    quote = connection.ops.quote_name
+    user_table = quote(get_user_model()._meta.db_table)
+    lti_user_table = quote(LTIUser._meta.db_table)
+    # promoted columns have no database default
+    others = [quote(column) for column, _ in LTIUser.PROMOTED_PARAMETERS
+              if column not in ('canvas_login_id', 'sourcedid')]
+    promoted = ', '.join(others)
+    blanks = ', '.join("''" for _ in others)
+    consumer_ids = 'ARRAY[{}]'.format(', '.join(str(c.pk) for c in consumers))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {users} (username, password, is_superuser, "
+            "first_name, last_name, email, is_staff, is_active, date_joined) "
+            "SELECT %s || i, '!', false, '', '', '', false, true, now() "
+            "FROM generate_series(0, %s - 1) AS i".format(users=user_table),
+            [PREFIX, count])
+        cursor.execute(
+            "INSERT INTO {lti_users} (user_id, lti_tool_consumer_id, "
+            "lti_user_id, canvas_login_id, sourcedid, {promoted}) "
+            "SELECT u.id, ({ids})[1 + mod(u.id, {n})], u.username, "
+            "'login' || u.id, 'sis' || u.id, {blanks} "
+            "FROM {users} u WHERE u.username LIKE %s".format(
+                lti_users=lti_user_table, users=user_table, ids=consumer_ids,
+                n=len(consumers), promoted=promoted, blanks=blanks),
+            [PREFIX + '%'])
+        cursor.execute("ANALYZE {}".format(lti_user_table))
+        cursor.execute(
+            "SELECT min(id), max(id) FROM {} WHERE username LIKE %s".format(
+                user_table), [PREFIX + '%'])
+        return cursor.fetchone()
+
+
+def cleanup(group):
+    from django.contrib.auth import get_user_model
+
+    # deleting the users cascades to their LTI users
+    get_user_model().objects.filter(username__startswith=PREFIX).delete()
+    group.ltitoolconsumer_set.all().delete()
+    group.delete()
+
+
+def legacy_match(consumer, launch_data):
+    """The matcher as it was: a consumer subquery, exists() and then [0]."""
+    from ltilaunch.models import LTIToolConsumer, LTIUser
+
+    lti_users = LTIUser.objects.all()
+    if consumer.consumer_group_id:
+        lti_users = lti_users.filter(
+            lti_tool_consumer__in=LTIToolConsumer.objects.filter(
+                consumer_group_id=consumer.consumer_group_id))
+    else:
+        lti_users = lti_users.filter(lti_tool_consumer_id=consumer.pk)
+    results = lti_users.filter(
+        canvas_login_id=launch_data["custom_canvas_user_login_id"])
+    if not results.exists():
+        results = lti_users.filter(
+            sourcedid=launch_data["lis_person_sourcedid"])
+    if results.exists():
+        return results[0].user
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--consumers', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--keep', action='store_true',
+                        help="leave the seeded rows in place")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from ltilaunch.consumers import consumer_registry
+    from ltilaunch.models import LTIToolConsumer, LTIToolConsumerGroup
+    from ltilaunch.usermatch import CanvasCustomUserMatcher
+
+    group = LTIToolConsumerGroup.objects.create(name=PREFIX + 'group')
+    try:
+        consumers = [LTIToolConsumer.objects.create(
+            name='{}{}'.format(PREFIX, i),
+            tool_consumer_instance_guid='{}{}'.format(PREFIX, i),
+            matcher_class_name='ltilaunch.usermatch.CanvasCustomUserMatcher',
+            consumer_group=group) for i in range(args.consumers)]
+        print("seeding {} LTI users...".format(args.users))
+        low, high = seed(consumers, args.users)
+
+        consumer = consumer_registry.get(consumers[0].oauth_consumer_key)
+        matcher = CanvasCustomUserMatcher()
+        rng = random.Random(0)
+
+        def launch(i):
+            # alternate between login ID hits and sourcedid fallbacks
+            user_id = rng.randint(low, high)
+            login_id = 'login{}'.format(user_id) if i % 2 else 'missing'
+            return {"custom_canvas_user_login_id": login_id,
+                    "lis_person_sourcedid": 'sis{}'.format(user_id)}
+
+        launches = [launch(i) for i in range(args.lookups)]
+        timed("legacy matcher", lambda i: legacy_match(
+            consumer, launches[i]), args.lookups)
+        timed("single query matcher", lambda i: matcher.get_matching_user(
+            consumer, launches[i]), args.lookups)
+    finally:
+        if not args.keep:
+            cleanup(group)
+
+
+if __name__ == '__main__':
+    main()
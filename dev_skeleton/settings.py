@@ -22,6 +22,20 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 BLOCKLY_LOG_DIR = os.path.join(BASE_DIR, 'logs')
 
+# editor autosaves are journaled here and flushed to the database in batches
+AUTOSAVE_JOURNAL_DIR = os.path.join(BLOCKLY_LOG_DIR, 'autosave')
+AUTOSAVE_FLUSH_INTERVAL = 5
+# every saved snapshot, in per-assignment segment files
+CODE_HISTORY_DIR = os.path.join(BLOCKLY_LOG_DIR, 'history')
+# snapshots are stored as deltas, with a full copy every so many revisions
+CODE_HISTORY_KEYFRAME_INTERVAL = 50
+# clickstream events are queued in memory and written in batches
+EVENT_QUEUE_SIZE = 10000
+EVENT_BATCH_SIZE = 500
+EVENT_FLUSH_INTERVAL = 1
+# characters of highlighted code HTML kept in memory per process
+HIGHLIGHT_CACHE_SIZE = 8 * 1024 * 1024
+
 #configured for GMAIL
 # MAIL_SERVER = 'smtp.gmail.com'
 # MAIL_PORT = 465
@@ -61,6 +75,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'lti_django_skeleton.middleware.LaunchContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -106,6 +121,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by all workers: consumer and catalog invalidations are announced
+# through it, so it must not be per process.  Create the table with
+# ``manage.py createcachetable``.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'lti_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -0,0 +1 @@
+default_app_config = 'lti_django_skeleton.apps.LtiDjangoSkeletonConfig'
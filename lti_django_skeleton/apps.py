@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LtiDjangoSkeletonConfig(AppConfig):
     name = 'lti_django_skeleton'
+
+    def ready(self):
+        from . import catalog  # noqa: F401 connects invalidation signals
+        from . import checks  # noqa: F401 registers system checks
@@ -0,0 +1,397 @@
+"""Coalescing write path for editor autosaves.
+
+The editor saves on almost every keystroke.  Instead of writing each save to
+the database, ``Autosaver.save`` appends it to a journal file and keeps only
+the latest code per (user, assignment) in memory.  A background thread
+flushes the buffered code to ``Submission`` rows every
+``AUTOSAVE_FLUSH_INTERVAL`` seconds, and views reading submissions back
+flush any of them still buffered in their process.
+
+Every process appends to its own journal segment.  A flush seals the
+segment, writes the buffer, adds every journaled save to the code history
+(see ``lti_django_skeleton.history``) and then removes the segment, so a
+segment left on disk holds saves that may not have reached the database.
+Segments of dead processes are replayed when an autosaver starts, or with
+the ``replay_autosave_journal`` management command.  A process claims a
+segment by renaming it into its own name before replaying it, so workers
+starting together replay each segment once.
+
+A save is only written to a submission last modified before the save was
+made, see ``write_pending``.  Buffered saves therefore never overwrite code
+that a tab saved since with ``Submission.save_code``, and a replay after a
+crash between the write and the removal of a segment changes nothing.
+"""
+import atexit
+import datetime
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .history import Snapshot, get_code_history
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+
+# {host}-{pid}-{token}-{sequence}, or -claimed-{n} once taken over; host
+# names may contain dashes themselves
+SEGMENT_NAME = re.compile(r'^(?P<host>.+)-(?P<pid>\d+)-(?P<token>[^-]+)-'
+                          r'(?:claimed-)?\d{8}\.journal$')
+
+# saved_at is the time of the latest save, in seconds since the epoch
+Pending = namedtuple('Pending', ['code', 'assignment_version', 'touches',
+                                 'saved_at'])
+
+
+class Journal:
+    """Append-only per-process journal of autosaves, in numbered segments.
+
+    ``append`` only writes; callers serialize appends and seals.  ``sync``
+    then makes a record durable without holding the caller's lock, and one
+    fsync covers every record written before it, so threads saving at the
+    same time share it.
+    """
+
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        # the token tells our segments from those of an earlier process
+        # that had the same pid
+        self.token = uuid.uuid4().hex[:8]
+        self.prefix = '{}-{}-{}-'.format(self.host, self.pid, self.token)
+        self._sequence = 0
+        self._claimed = 0
+        self._fd = None
+        # records written and records known to be on disk
+        self._written = 0
+        self._synced = 0
+        self._sync_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, '{}{:08d}.journal'.format(
+            self.prefix, self._sequence))
+
+    def append(self, user_id, assignment_id, code, assignment_version,
+               saved_at):
+        """Write a record, returning the ticket to ``sync`` it with."""
+        # one write per record, so a crash can only truncate the last line
+        line = json.dumps({'user': user_id, 'assignment': assignment_id,
+                           'version': assignment_version, 'code': code,
+                           'time': saved_at})
+        if self._fd is None:
+            self._fd = os.open(self.path,
+                               os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        os.write(self._fd, (line + '\n').encode('utf-8'))
+        self._written += 1
+        return self._written
+
+    def sync(self, ticket):
+        """Wait until the record of a ticket, and all before it, is on disk."""
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return
+            # records past the last seal were written through the current
+            # fd, which seal cannot close while we hold the sync lock
+            written = self._written
+            os.fsync(self._fd)
+            self._synced = written
+
+    def seal(self):
+        """Start a new segment, returning the path of the sealed one."""
+        if self._fd is None:
+            return None
+        with self._sync_lock:
+            if self.fsync and self._synced < self._written:
+                os.fsync(self._fd)
+            self._synced = self._written
+            os.close(self._fd)
+            self._fd = None
+        sealed = self.path
+        self._sequence += 1
+        return sealed
+
+    def orphaned_segments(self):
+        """Return segments of processes on this host that are gone."""
+        orphans = []
+        for path in sorted(glob.glob(
+                os.path.join(self.directory, self.host + '-*.journal'))):
+            match = SEGMENT_NAME.match(os.path.basename(path))
+            # the glob also matches hosts named like ours plus a suffix
+            if match is None or match.group('host') != self.host:
+                continue
+            pid = int(match.group('pid'))
+            if pid == self.pid:
+                if match.group('token') != self.token:
+                    orphans.append(path)
+            elif not _process_alive(pid):
+                orphans.append(path)
+        return orphans
+
+    def claim_orphans(self):
+        """Take over orphaned segments, returning their new paths in order.
+
+        Segments another process claimed or replayed first are skipped.
+        """
+        claimed = []
+        for path in self.orphaned_segments():
+            self._claimed += 1
+            target = os.path.join(self.directory, '{}claimed-{:08d}.journal'
+                                  .format(self.prefix, self._claimed))
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+        return claimed
+
+
+def read_segment(path):
+    """Return the records of a journal segment, in order."""
+    records = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("skipping torn autosave record in %s", path)
+    return records
+
+
+def coalesce(records):
+    """Reduce journal records to the latest pending save per submission."""
+    pending = {}
+    for record in records:
+        key = (record['user'], record['assignment'])
+        touches = pending[key].touches + 1 if key in pending else 1
+        pending[key] = Pending(record['code'], record['version'], touches,
+                               record['time'])
+    return pending
+
+
+def record_history(records, history):
+    """Add every save in the journal records to the code history."""
+    history.extend(
+        Snapshot(r['assignment'], r['user'], r['time'], r['code'])
+        for r in records)
+
+
+def write_pending(pending):
+    """Write coalesced autosaves to their submissions in one transaction.
+
+    A submission's date_modified is the time of the save it holds.  Saves
+    older than that are skipped: the submission was written since, by a
+    compare-and-swap save (``Submission.save_code``) or by a newer save that
+    another process flushed first, and must not be overwritten.  Skipped
+    saves are still in the code history.
+
+    :param pending: a dict of Pending saves by (user id, assignment id)
+    :return: the number of saves skipped
+    """
+    if not pending:
+        return 0
+    users = {user_id for user_id, _ in pending}
+    assignments = {assignment_id for _, assignment_id in pending}
+    existing = {}
+    with transaction.atomic():
+        rows = (Submission.objects
+                          .filter(user_id__in=users,
+                                  assignment_id__in=assignments)
+                          .order_by('-pk')
+                          .values_list('pk', 'user_id', 'assignment_id'))
+        for pk, user_id, assignment_id in rows:
+            # keep the oldest if duplicates slipped in
+            existing[(user_id, assignment_id)] = pk
+        created = []
+        skipped = 0
+        for (user_id, assignment_id), save in pending.items():
+            pk = existing.get((user_id, assignment_id))
+            if pk is None:
+                created.append(Submission(
+                    user_id=user_id, assignment_id=assignment_id,
+                    code=save.code, assignment_version=save.assignment_version,
+                    version=save.touches - 1))
+                continue
+            saved_at = datetime.datetime.fromtimestamp(save.saved_at,
+                                                       timezone.utc)
+            written = (Submission.objects
+                                 .filter(pk=pk, date_modified__lt=saved_at)
+                                 .update(code=save.code,
+                                         version=F('version') + save.touches,
+                                         date_modified=saved_at))
+            if not written:
+                skipped += 1
+        Submission.objects.bulk_create(created)
+    if skipped:
+        logger.info("skipped %d autosaves older than their submissions",
+                    skipped)
+    return skipped
+
+
+def replay_segments(paths, history=None):
+    """Write the saves of journal segments and remove them."""
+    history = history or get_code_history()
+    for path in paths:
+        records = read_segment(path)
+        write_pending(coalesce(records))
+        record_history(records, history)
+        os.remove(path)
+    if paths:
+        logger.info("replayed %d autosave journal segments", len(paths))
+    return len(paths)
+
+
+class Autosaver:
+    def __init__(self, journal_dir, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 fsync=True, history=None):
+        self.journal = Journal(journal_dir, fsync=fsync)
+        self.history = history or get_code_history()
+        self.flush_interval = flush_interval
+        self._pending = {}
+        # keys taken out of _pending by a flush that is still writing them
+        self._writing = frozenset()
+        self._sealed = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self.replay_orphans()
+
+    def save(self, user_id, assignment_id, code, assignment_version):
+        """Journal an autosave and buffer it for the next flush."""
+        key = (user_id, assignment_id)
+        with self._lock:
+            saved_at = time.time()
+            ticket = self.journal.append(user_id, assignment_id, code,
+                                         assignment_version, saved_at)
+            touches = self._pending[key].touches + 1 \
+                if key in self._pending else 1
+            self._pending[key] = Pending(code, assignment_version, touches,
+                                         saved_at)
+        # outside the lock, so saves in other threads are not held up by
+        # the disk; they wait here at most for one shared fsync
+        self.journal.sync(ticket)
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write everything buffered so far and drop its journal segment."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._writing = frozenset(pending)
+                sealed = self.journal.seal()
+                if sealed:
+                    self._sealed.append(sealed)
+            try:
+                write_pending(pending)
+            except Exception:
+                logger.exception("failed to flush %d autosaves", len(pending))
+                self._restore(pending)
+                return
+            finally:
+                with self._lock:
+                    self._writing = frozenset()
+            # segments sealed by failed flushes are covered by this one too
+            for path in list(self._sealed):
+                try:
+                    record_history(read_segment(path), self.history)
+                except Exception:
+                    # keep the segment and retry on the next flush
+                    logger.exception("failed to record code history of %s",
+                                     path)
+                    continue
+                os.remove(path)
+                self._sealed.remove(path)
+
+    def flush_submissions(self, keys):
+        """Flush if any of the given submissions has buffered code.
+
+        Call this before reading submissions back, e.g. on submit.  Only the
+        buffer of this process is flushed; saves that went to another
+        process reach the database within its flush interval.  Code that a
+        flush running in another thread is still writing counts as buffered,
+        and ``flush`` waits for that flush to finish.
+
+        :param keys: (user id, assignment id) pairs
+        """
+        with self._lock:
+            buffered = any(key in self._pending or key in self._writing
+                           for key in keys)
+        if buffered:
+            self.flush()
+
+    def replay_orphans(self):
+        """Write and remove journal segments left behind by dead processes."""
+        return replay_segments(self.journal.claim_orphans(), self.history)
+
+    def _restore(self, pending):
+        # put unwritten saves back behind any newer ones
+        with self._lock:
+            for key, save in pending.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    save = newer._replace(
+                        touches=newer.touches + save.touches)
+                self._pending[key] = save
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not self.flush_interval:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically,
+                    name='autosave-flusher', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_autosaver = None
+_autosaver_lock = threading.Lock()
+
+
+def get_autosaver():
+    """Return this process's Autosaver, configured from the settings."""
+    global _autosaver
+    if _autosaver is None:
+        with _autosaver_lock:
+            if _autosaver is None:
+                _autosaver = Autosaver(
+                    settings.AUTOSAVE_JOURNAL_DIR,
+                    getattr(settings, 'AUTOSAVE_FLUSH_INTERVAL',
+                            DEFAULT_FLUSH_INTERVAL),
+                    getattr(settings, 'AUTOSAVE_FSYNC', True))
+    return _autosaver
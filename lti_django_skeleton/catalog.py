@@ -0,0 +1,161 @@
+"""Cached listing of a course's assignments and assignment groups.
+
+The select, share and batch edit pages all list the same course content.  A
+serialized snapshot of it is kept in the Django cache under the course's
+content version, a token that moves whenever an assignment, group or
+membership of the course is saved or deleted.  Readers only need the version
+to know whether their snapshot, or a client's ETag, is still current, so
+the cache must be shared by all workers; the ``lti_django_skeleton.E001``
+system check rejects a per-process one.
+
+Autosaves check the assignment version on every keystroke, so the versions
+alone are cached as well, under the same content version, and read with
+``get_assignment_versions`` without unpickling the whole catalog.
+
+Queryset ``update()`` calls send no signals; call ``invalidate_course`` after
+using them on catalog models.
+"""
+import logging
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Assignment, AssignmentGroup, AssignmentGroupMembership
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+VERSION_KEY = 'lti_django_skeleton:catalog:version:{}'
+SNAPSHOT_KEY = 'lti_django_skeleton:catalog:{}:{}'
+VERSIONS_KEY = 'lti_django_skeleton:catalog:{}:{}:versions'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# a superset of Assignment.to_dict(), which check_assignments used to return
+ASSIGNMENT_FIELDS = ('id', 'name', 'body', 'mode', 'type', 'visibility',
+                     'disabled', 'version')
+
+
+class CourseCatalog:
+    def __init__(self, course_id, version, data):
+        self.course_id = course_id
+        self.version = version
+        self.data = data
+        self._by_id = {a['id']: a for a in data['assignments']}
+
+    def assignments(self, exclude_builtins=False):
+        """Return assignment summaries, optionally without maze levels."""
+        return [a for a in self.data['assignments']
+                if not (exclude_builtins and a['mode'] == 'maze')]
+
+    def groups(self):
+        """Return (group, ordered assignment summaries) pairs by name."""
+        return [(group, [self._by_id[pk] for pk in group['assignments']])
+                for group in self.data['groups']]
+
+    def strays(self):
+        """Return summaries of the assignments that are in no group."""
+        return [self._by_id[pk] for pk in self.data['strays']]
+
+
+def catalog_version(course_id):
+    """Return the current content version token of a course."""
+    cache = caches[CACHE_ALIAS]
+    key = VERSION_KEY.format(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_catalog_etag(course_id):
+    """Return the ETag of a course's catalog without loading it."""
+    return '"{}-{}"'.format(course_id, catalog_version(course_id))
+
+
+def get_catalog(course_id):
+    """Return the CourseCatalog of a course, building it if not cached."""
+    cache = caches[CACHE_ALIAS]
+    version = catalog_version(course_id)
+    key = SNAPSHOT_KEY.format(course_id, version)
+    data = cache.get(key)
+    if data is None:
+        data = _build(course_id)
+        cache.set(key, data, SNAPSHOT_TIMEOUT)
+        logger.debug("built catalog of course %s", course_id)
+    return CourseCatalog(course_id, version, data)
+
+
+def get_assignment_versions(course_id):
+    """Return the version of each assignment of a course, by id."""
+    cache = caches[CACHE_ALIAS]
+    key = VERSIONS_KEY.format(course_id, catalog_version(course_id))
+    versions = cache.get(key)
+    if versions is None:
+        versions = dict(Assignment.objects.filter(course_id=course_id)
+                                          .values_list('id', 'version'))
+        cache.set(key, versions, SNAPSHOT_TIMEOUT)
+    return versions
+
+
+def invalidate_course(course_id):
+    """Move the content version of a course, here and once committed."""
+    def bump():
+        caches[CACHE_ALIAS].set(
+            VERSION_KEY.format(course_id), uuid.uuid4().hex, None)
+    bump()
+    # bump again once the change is visible to other connections
+    transaction.on_commit(bump)
+
+
+def _build(course_id):
+    assignments = list(Assignment.objects.filter(course_id=course_id)
+                                         .order_by('id')
+                                         .values(*ASSIGNMENT_FIELDS))
+    groups = list(AssignmentGroup.objects.filter(course_id=course_id)
+                                         .order_by('name')
+                                         .values('id', 'name'))
+    members = {group['id']: [] for group in groups}
+    memberships = (AssignmentGroupMembership.objects
+                   .filter(assignment_group__course_id=course_id)
+                   .order_by('assignment_group_id', 'position')
+                   .values_list('assignment_group_id', 'assignment_id'))
+    known = {a['id'] for a in assignments}
+    grouped = set()
+    for group_id, assignment_id in memberships:
+        # skip assignments moved into a group of another course
+        if assignment_id in known:
+            members[group_id].append(assignment_id)
+            grouped.add(assignment_id)
+    for group in groups:
+        group['assignments'] = members[group['id']]
+    for assignment in assignments:
+        assignment['title'] = Assignment(
+            id=assignment['id'], name=assignment['name']).title()
+    return {
+        'assignments': assignments,
+        'groups': groups,
+        'strays': [a['id'] for a in assignments if a['id'] not in grouped],
+    }
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_save, sender=AssignmentGroup)
+@receiver(post_delete, sender=AssignmentGroup)
+def _course_content_changed(instance, **kwargs):
+    invalidate_course(instance.course_id)
+
+
+@receiver(post_save, sender=AssignmentGroupMembership)
+@receiver(post_delete, sender=AssignmentGroupMembership)
+def _membership_changed(instance, **kwargs):
+    try:
+        course_id = instance.assignment_group.course_id
+    except AssignmentGroup.DoesNotExist:
+        # the group is being deleted, which invalidates the course itself
+        return
+    invalidate_course(course_id)
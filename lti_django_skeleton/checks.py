@@ -0,0 +1,13 @@
+"""System checks for the lti_django_skeleton app."""
+from django.core.checks import register
+
+from ltilaunch.checks import shared_cache_errors
+
+
+@register()
+def check_catalog_cache(app_configs, **kwargs):
+    from .catalog import CACHE_ALIAS
+    return shared_cache_errors(
+        CACHE_ALIAS,
+        "the content versions of course catalogs and their ETags",
+        'lti_django_skeleton.E001')
@@ -0,0 +1,191 @@
+"""Buffered ingestion of editor clickstream events.
+
+Events arrive at hundreds per second while a class is working.  Views hand
+them to ``EventQueue.offer``, which only puts them on a bounded in-process
+queue; a background thread drains it and writes each batch with one
+``bulk_create``.  When the queue is full, events are refused rather than
+letting requests pile up behind the database, and the view tells the client
+to retry later.
+
+Queued events are lost if the process dies, which is acceptable for
+clickstream data but is the reason code saves go through the journaled
+``lti_django_skeleton.autosave`` instead.  ``EventQueue.stats`` counts what
+was accepted, written, refused and discarded.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Assignment, Log
+
+logger = logging.getLogger(__name__)
+interactions_logger = logging.getLogger('StudentInteractions')
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1
+# longest event or action name stored, as in Log
+MAX_NAME_LENGTH = 255
+
+# date_created is when the event arrived, not when its batch is written
+Event = namedtuple('Event', ['user_id', 'assignment_id', 'event', 'action',
+                             'date_created'])
+
+
+def parse_event(user_id, data):
+    """Build an Event from a client's JSON object.
+
+    :param user_id: the LTIUser the event comes from
+    :param data: a dict with question_id, event and action
+    :raises ValueError: if the data is not an event
+    """
+    if not isinstance(data, dict):
+        raise ValueError("an event must be an object")
+    try:
+        assignment_id = int(data['question_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("no assignment ID given")
+    return Event(user_id, assignment_id,
+                 str(data.get('event', 'blank'))[:MAX_NAME_LENGTH],
+                 str(data.get('action', 'missing'))[:MAX_NAME_LENGTH],
+                 timezone.now())
+
+
+def write_events(events):
+    """Write events to the Log table, skipping unknown assignments.
+
+    :return: the number of events written
+    """
+    assignment_ids = {event.assignment_id for event in events}
+    known = set(Assignment.objects.filter(pk__in=assignment_ids)
+                                  .values_list('pk', flat=True))
+    logs = [Log(event=e.event, action=e.action,
+                assignment_id=e.assignment_id, user_id=e.user_id,
+                date_created=e.date_created)
+            for e in events if e.assignment_id in known]
+    Log.objects.bulk_create(logs)
+    for log in logs:
+        interactions_logger.info("%s %s %s %s", log.user_id,
+                                 log.assignment_id, log.event, log.action)
+    return len(logs)
+
+
+class EventQueue:
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize)
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def offer(self, events):
+        """Queue events for writing, as many as there is room for.
+
+        :return: the number of events accepted, a prefix of ``events``
+        """
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                break
+            accepted += 1
+        refused = len(events) - accepted
+        self._count(accepted=accepted, refused=refused)
+        if refused:
+            logger.warning("event queue full, refused %d events", refused)
+        self._ensure_flusher()
+        return accepted
+
+    def flush(self):
+        """Write everything queued so far."""
+        with self._flush_lock:
+            while self._write_batch(self._take(block=False)):
+                pass
+
+    def stats(self):
+        """Return counts of accepted, written, refused and discarded events,
+        and how many are queued right now."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _take(self, block):
+        batch = []
+        deadline = time.monotonic() + (self.flush_interval or 0)
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        if not batch:
+            return False
+        try:
+            written = write_events(batch)
+        except Exception:
+            logger.exception("failed to write %d events", len(batch))
+            self._count(discarded=len(batch))
+        else:
+            self._count(written=written, discarded=len(batch) - written)
+        return True
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            self._stats.update(counts)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not self.flush_interval:
+            return
+        with self._stats_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically,
+                    name='event-flusher', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            # wait for a full batch or the flush interval, whichever is first
+            batch = self._take(block=True)
+            if batch:
+                close_old_connections()
+                with self._flush_lock:
+                    self._write_batch(batch)
+
+
+_event_queue = None
+_event_queue_lock = threading.Lock()
+
+
+def get_event_queue():
+    """Return this process's EventQueue, configured from the settings."""
+    global _event_queue
+    if _event_queue is None:
+        with _event_queue_lock:
+            if _event_queue is None:
+                _event_queue = EventQueue(
+                    getattr(settings, 'EVENT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                    getattr(settings, 'EVENT_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                    getattr(settings, 'EVENT_FLUSH_INTERVAL',
+                            DEFAULT_FLUSH_INTERVAL))
+    return _event_queue
@@ -0,0 +1,219 @@
+"""Streaming export of a course's submissions, logs and code history.
+
+Exports are generators of byte chunks, written by the ``export_course``
+management command or sent as a ``StreamingHttpResponse`` by the ``export``
+view.  Rows are read with ``QuerySet.iterator()``, which uses server-side
+cursors on PostgreSQL, so memory stays flat however many rows there are.
+
+Two formats are available.  ``ndjson`` gives one JSON object per line, each
+with a ``type`` of ``submission``, ``log`` or ``snapshot``.  ``zip`` holds
+each submission's code as ``code/<assignment id>/<user id>.py``, plus
+``submissions.ndjson``, ``logs.ndjson`` and each student's snapshots as
+``history/<assignment id>/<user id>.ndjson``.  The zip is written without
+seeking, so a file's sizes follow its data rather than preceding it.
+
+Snapshots come from the code history store, which is read one assignment at
+a time: its index once for the whole class, then each student's snapshots in
+turn.  The date bounds apply to the time each snapshot was saved.
+"""
+import datetime
+import itertools
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .history import get_code_history
+from .models import Assignment, Log, Submission
+
+FORMATS = ('ndjson', 'zip')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'zip': 'application/zip'}
+# bytes buffered before a chunk is handed out
+CHUNK_SIZE = 64 * 1024
+
+SUBMISSION_FIELDS = ('id', 'assignment_id', 'user_id', 'user__lti_user_id',
+                     'correct', 'status', 'version', 'assignment_version',
+                     'date_created', 'date_modified')
+LOG_FIELDS = ('id', 'assignment_id', 'user_id', 'event', 'action',
+              'date_created')
+
+
+class ExportFilter:
+    """Which rows of a course to export.
+
+    :param course_id: the course to export
+    :param assignment_ids: if given, only these assignments of the course
+    :param since: if given, only rows changed at or after this datetime
+    :param until: if given, only rows changed before this datetime
+    """
+
+    def __init__(self, course_id, assignment_ids=None, since=None,
+                 until=None):
+        self.course_id = course_id
+        self.assignment_ids = assignment_ids
+        self.since = since
+        self.until = until
+
+    def assignments(self):
+        """Return the ids of the exported assignments, in order."""
+        assignments = Assignment.objects.filter(course_id=self.course_id)
+        if self.assignment_ids:
+            assignments = assignments.filter(pk__in=self.assignment_ids)
+        return list(assignments.order_by('pk').values_list('pk', flat=True))
+
+    def submissions(self, *fields):
+        submissions = self._dated(
+            Submission.objects.filter(assignment_id__in=self.assignments()),
+            'date_modified')
+        return (submissions.order_by('assignment_id', 'user_id')
+                           .values(*fields).iterator())
+
+    def logs(self):
+        # in the order of the (assignment, user, date_created) index
+        logs = self._dated(
+            Log.objects.filter(assignment_id__in=self.assignments()),
+            'date_created')
+        return (logs.order_by('assignment_id', 'user_id', 'date_created')
+                    .values(*LOG_FIELDS).iterator())
+
+    def histories(self):
+        """Yield (assignment id, user id, snapshots) for every student.
+
+        Snapshots are dicts, saved within the bounds, and have to be read
+        before moving on to the next student.
+        """
+        since = None if self.since is None else self.since.timestamp()
+        history = get_code_history()
+        for assignment_id in self.assignments():
+            for user_id, snapshots in history.assignment_snapshots(
+                    assignment_id, since=since):
+                yield assignment_id, user_id, self._snapshots(snapshots)
+
+    def _snapshots(self, snapshots):
+        until = None if self.until is None else self.until.timestamp()
+        # oldest first, so nothing after the first one past the bound
+        for snapshot in snapshots:
+            if until is not None and snapshot.timestamp >= until:
+                break
+            yield {'assignment_id': snapshot.assignment_id,
+                   'user_id': snapshot.user_id,
+                   'date_created': datetime.datetime.fromtimestamp(
+                       snapshot.timestamp, timezone.utc),
+                   'code': snapshot.code}
+
+    def _dated(self, rows, field):
+        if self.since is not None:
+            rows = rows.filter(**{field + '__gte': self.since})
+        if self.until is not None:
+            rows = rows.filter(**{field + '__lt': self.until})
+        return rows
+
+
+def parse_bound(value):
+    """Parse an ISO date or datetime given as an export bound.
+
+    Dates mean midnight, and naive values are in the current time zone.
+
+    :raises ValueError: if the value is neither
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError("not an ISO date or datetime: {!r}".format(value))
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _line(record):
+    return (json.dumps(record, cls=DjangoJSONEncoder) + '\n').encode('utf-8')
+
+
+def _records(export):
+    for submission in export.submissions(*SUBMISSION_FIELDS + ('code',)):
+        submission['type'] = 'submission'
+        yield submission
+    for log in export.logs():
+        log['type'] = 'log'
+        yield log
+    for _, _, snapshots in export.histories():
+        for snapshot in snapshots:
+            snapshot['type'] = 'snapshot'
+            yield snapshot
+
+
+def ndjson_chunks(export):
+    """Yield the rows of an ExportFilter as NDJSON."""
+    lines, size = [], 0
+    for record in _records(export):
+        line = _line(record)
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(lines)
+            lines, size = [], 0
+    yield b''.join(lines)
+
+
+class _ChunkBuffer:
+    """Write-only stream whose contents are taken out in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks, self.size = [], 0
+        return data
+
+
+def zip_chunks(export):
+    """Yield the rows of an ExportFilter as a zip archive."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for submission in export.submissions('assignment_id', 'user_id',
+                                             'code'):
+            archive.writestr('code/{}/{}.py'.format(
+                submission['assignment_id'], submission['user_id']),
+                submission['code'])
+            if buffer.size >= CHUNK_SIZE:
+                yield buffer.take()
+        for name, rows in (('submissions.ndjson',
+                            export.submissions(*SUBMISSION_FIELDS)),
+                           ('logs.ndjson', export.logs())):
+            with archive.open(name, 'w', force_zip64=True) as member:
+                for row in rows:
+                    member.write(_line(row))
+                    if buffer.size >= CHUNK_SIZE:
+                        yield buffer.take()
+        for assignment_id, user_id, snapshots in export.histories():
+            first = next(snapshots, None)
+            if first is None:
+                continue
+            name = 'history/{}/{}.ndjson'.format(assignment_id, user_id)
+            with archive.open(name, 'w', force_zip64=True) as member:
+                for snapshot in itertools.chain([first], snapshots):
+                    member.write(_line(snapshot))
+                    if buffer.size >= CHUNK_SIZE:
+                        yield buffer.take()
+    yield buffer.take()
+
+
+def export_chunks(export, format='ndjson'):
+    """Yield an export in one of FORMATS as byte chunks."""
+    if format == 'zip':
+        return zip_chunks(export)
+    return ndjson_chunks(export)
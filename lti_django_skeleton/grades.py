@@ -0,0 +1,220 @@
+"""Outbox for grades posted to the LMS through LIS Outcomes.
+
+Posting a grade used to happen inside the request, so a slow LMS held a
+worker per student submitting.  Views now only call ``enqueue_grade``,
+which writes a ``GradePost`` row in the request's transaction; the
+``send_grades`` management command runs the worker that posts them.
+
+Each post is keyed by its consumer and ``lis_result_sourcedid``.  Queueing
+a grade while an earlier one for the same result is still unsent replaces
+it, so a burst of submissions costs the LMS one request.  Failed posts are
+retried with exponential backoff and given up on after ``MAX_ATTEMPTS``,
+until a new grade for the result revives them.  Several workers may run at
+once: due posts are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``.
+
+Run ``python -m lti_django_skeleton.outcomes_stub`` for a local outcomes
+service to point launches at while testing.
+"""
+import logging
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.html import escape
+from lti import OutcomeRequest, OutcomeResponse
+from requests.adapters import HTTPAdapter
+from requests_oauthlib import OAuth1
+from requests_oauthlib.oauth1_auth import SIGNATURE_TYPE_AUTH_HEADER
+
+from .models import GradePost
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60 * 60
+# claimed posts become due again if their worker dies before finishing
+CLAIM_TIMEOUT = 5 * 60
+REQUEST_TIMEOUT = 30
+
+GRADEPOST_COLUMNS = ('date_created', 'date_modified', 'consumer_id',
+                     'lis_result_sourcedid', 'lis_outcome_service_url',
+                     'submission_id', 'score', 'summary', 'submission_url',
+                     'include_code', 'revision', 'attempts', 'next_attempt',
+                     'last_error')
+# columns a newer grade overwrites in the pending post
+REPLACED_COLUMNS = ('date_modified', 'lis_outcome_service_url',
+                    'submission_id', 'score', 'summary', 'submission_url',
+                    'include_code', 'next_attempt')
+
+
+class OutcomeError(Exception):
+    pass
+
+
+def enqueue_grade(lti_user, submission, score, summary, submission_url='',
+                  include_code=True, lis_result_sourcedid=None):
+    """Queue a grade for the LMS, replacing any pending one for the result.
+
+    :param lti_user: the LTIUser whose last launch gives the outcome service
+    :param submission: the Submission the grade is for
+    :param score: the grade, between 0 and 1
+    :param summary: heading of the result text shown in the LMS
+    :param submission_url: if given, the result text links to the code
+    :param include_code: whether the result text shows the code
+    :param lis_result_sourcedid: the result to grade, by default that of
+        the last launch
+    :return: the GradePost, or None if the launch had no outcome service
+    """
+    parameters = lti_user.last_launch_parameters
+    service_url = parameters.get('lis_outcome_service_url')
+    lis_result_sourcedid = lis_result_sourcedid or \
+        parameters.get('lis_result_sourcedid')
+    if not service_url or not lis_result_sourcedid:
+        return None
+    now = timezone.now()
+    quote = connection.ops.quote_name
+    table = quote(GradePost._meta.db_table)
+    sql = ("INSERT INTO {table} ({columns}) VALUES ({values}) "
+           "ON CONFLICT (consumer_id, lis_result_sourcedid) "
+           "WHERE sent IS NULL DO UPDATE SET {replaced}, "
+           "revision = {table}.revision + 1, attempts = 0, last_error = '' "
+           "RETURNING *").format(
+        table=table,
+        columns=", ".join(GRADEPOST_COLUMNS),
+        values=", ".join(["%s"] * len(GRADEPOST_COLUMNS)),
+        replaced=", ".join("{0} = EXCLUDED.{0}".format(quote(c))
+                           for c in REPLACED_COLUMNS))
+    values = [now, now, lti_user.lti_tool_consumer_id, lis_result_sourcedid,
+              service_url, submission.id, score, summary, submission_url,
+              include_code, 0, 0, now, '']
+    return next(iter(GradePost.objects.raw(sql, values)))
+
+
+def backoff(attempts):
+    """Return the delay before retrying a post that failed so many times."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    # spread retries of posts that failed together, e.g. in an LMS outage
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim_due(limit):
+    """Claim up to ``limit`` due posts for this worker.
+
+    :return: (GradePost, revision) pairs; the revision tells whether a newer
+        grade replaced the post while it was being sent
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = list(GradePost.objects.select_for_update(skip_locked=True)
+                                        .filter(sent__isnull=True,
+                                                next_attempt__lte=now)
+                                        .order_by('next_attempt')
+                                        .values_list('pk', 'revision')[:limit])
+        revisions = dict(claimed)
+        GradePost.objects.filter(pk__in=revisions).update(
+            next_attempt=now + timedelta(seconds=CLAIM_TIMEOUT))
+    posts = (GradePost.objects.filter(pk__in=revisions)
+                              .select_related('consumer', 'submission'))
+    return [(post, revisions[post.pk]) for post in posts]
+
+
+def result_text(post):
+    """Return the HTML shown with the grade in the LMS."""
+    submission = post.submission
+    text = "<h1>{0}</h1>".format(escape(post.summary))
+    if post.submission_url:
+        text += ("<div>Latest work in progress: <a href='{0}' "
+                 "target='_blank'>View</a></div>".format(
+                     escape(post.submission_url)) +
+                 "<div>Touches: {0}</div>".format(submission.version) +
+                 "Last ran code:<br>")
+    if post.include_code:
+        text += submission.highlighted_code()
+    return text
+
+
+class OutcomeSender:
+    """Posts grades concurrently over one pooled HTTP session."""
+
+    def __init__(self, concurrency=8, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency,
+                              pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def post(self, post, text):
+        """Send one grade, raising if the LMS did not accept it."""
+        request = OutcomeRequest({
+            'operation': 'replaceResult',
+            'score': post.score,
+            'result_data': {'text': text},
+            'message_identifier': uuid.uuid4().hex,
+            'lis_outcome_service_url': post.lis_outcome_service_url,
+            'lis_result_sourcedid': post.lis_result_sourcedid,
+        })
+        auth = OAuth1(post.consumer.oauth_consumer_key,
+                      post.consumer.oauth_consumer_secret,
+                      signature_type=SIGNATURE_TYPE_AUTH_HEADER,
+                      force_include_body=True)
+        response = self.session.post(
+            post.lis_outcome_service_url, data=request.generate_request_xml(),
+            auth=auth, headers={'Content-Type': 'application/xml'},
+            timeout=self.timeout)
+        outcome = OutcomeResponse.from_post_response(response,
+                                                     response.content)
+        if not outcome.is_success():
+            raise OutcomeError("HTTP {}: {} {}".format(
+                response.status_code, outcome.code_major,
+                outcome.description))
+
+    def send_due(self, limit=50):
+        """Claim due posts, send them and record the outcomes.
+
+        :return: the number of posts claimed
+        """
+        claimed = claim_due(limit)
+        # render here, so only this thread needs the database
+        futures = [(post, revision,
+                    self.executor.submit(self.post, post, result_text(post)))
+                   for post, revision in claimed]
+        for post, revision, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                self._failed(post, revision, e)
+            else:
+                self._sent(post, revision)
+        return len(claimed)
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def _sent(self, post, revision):
+        # a newer grade that arrived meanwhile stays pending
+        GradePost.objects.filter(pk=post.pk, revision=revision).update(
+            sent=timezone.now(), attempts=F('attempts') + 1, last_error='')
+
+    def _failed(self, post, revision, error):
+        attempts = post.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            logger.error("giving up on grade post %s for %s: %s", post.pk,
+                         post.lis_result_sourcedid, error)
+            next_attempt = None
+        else:
+            logger.warning("grade post %s for %s failed, attempt %d: %s",
+                           post.pk, post.lis_result_sourcedid, attempts,
+                           error)
+            next_attempt = timezone.now() + backoff(attempts)
+        GradePost.objects.filter(pk=post.pk, revision=revision).update(
+            attempts=attempts, next_attempt=next_attempt,
+            last_error=str(error))
@@ -0,0 +1,91 @@
+"""Cached syntax highlighting of student code.
+
+Rendering code with Pygments costs milliseconds, and the same code is
+rendered again for every grade passback and code view.  ``highlight_code``
+renders with one shared lexer and formatter and keeps the HTML by a hash of
+the code: in a per-process LRU capped at ``HIGHLIGHT_CACHE_SIZE`` characters
+of HTML, then in the Django cache shared by all processes.  Submissions also
+keep the HTML of their current version, see ``Submission.highlighted_code``.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import PythonLexer
+
+CACHE_ALIAS = 'default'
+HTML_KEY = 'lti_django_skeleton:highlight:{}'
+HTML_TIMEOUT = 60 * 60 * 24 * 7
+DEFAULT_CACHE_SIZE = 8 * 1024 * 1024
+
+_lexer = PythonLexer()
+_formatter = HtmlFormatter()
+
+
+class RenderCache:
+    """LRU of rendered HTML by code hash, capped in total characters."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        if len(html) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = html
+            self.size += len(html)
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def code_hash(code):
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+def highlight_code(code):
+    """Return the code as highlighted HTML, rendering it only if unseen."""
+    key = code_hash(code)
+    memory = get_render_cache()
+    html = memory.get(key)
+    if html is None:
+        cache = caches[CACHE_ALIAS]
+        html = cache.get(HTML_KEY.format(key))
+        if html is None:
+            html = highlight(code, _lexer, _formatter)
+            cache.set(HTML_KEY.format(key), html, HTML_TIMEOUT)
+        memory.put(key, html)
+    return html
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Return this process's RenderCache, sized from the settings."""
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache(
+                    getattr(settings, 'HIGHLIGHT_CACHE_SIZE',
+                            DEFAULT_CACHE_SIZE))
+    return _render_cache
@@ -0,0 +1,369 @@
+"""Append-only store of every code snapshot students save.
+
+Each assignment gets a directory of rolling segment files under
+``CODE_HISTORY_DIR``.  A segment is a sequence of length-prefixed records.
+Next to every segment, an index file holds a fixed-size (user id, timestamp,
+offset) entry per record, so a student's history is read without touching
+anyone else's.
+
+Consecutive snapshots usually differ by a few characters, so most records
+are deltas: the common prefix and suffix lengths against a base record plus
+the text in between.  Every ``CODE_HISTORY_KEYFRAME_INTERVAL`` revisions, or
+when a delta would not pay off, a full zlib-compressed keyframe is written
+instead, which bounds the records read to rebuild any snapshot.  A delta
+names its base by segment and offset, and bases are records this process
+wrote itself, so processes appending to the same store never need to read
+each other's latest records.
+
+Records are in the order they were written, which is not always the order
+the code was saved in, so readers sort a student's entries by time.
+
+Appends take an exclusive ``flock`` on the assignment directory.  A segment
+is rolled once it grows past ``CODE_HISTORY_SEGMENT_SIZE`` bytes.
+"""
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from itertools import groupby
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_KEYFRAME_INTERVAL = 50
+# (assignment, user) chains remembered per process to delta against
+CHAIN_CACHE_SIZE = 10000
+
+# body length, record kind, user id, timestamp, crc32 of the body
+RECORD = struct.Struct('>IBQdI')
+# user id, timestamp, offset of the record in its segment
+INDEX_ENTRY = struct.Struct('>QdQ')
+# base segment, base offset, revisions since the keyframe, common prefix
+# length and common suffix length; the inserted text follows
+DELTA = struct.Struct('>IQHII')
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+Snapshot = namedtuple('Snapshot', ['assignment_id', 'user_id', 'timestamp',
+                                   'code'])
+
+# where a chain's latest record is, how deep it is, and its code
+_ChainTip = namedtuple('_ChainTip', ['segment', 'offset', 'depth', 'code'])
+
+
+class CorruptRecord(Exception):
+    pass
+
+
+class CodeHistory:
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.keyframe_interval = keyframe_interval
+        self._tips = OrderedDict()
+
+    def append(self, assignment_id, user_id, code, timestamp=None):
+        """Record one snapshot of a student's code."""
+        self.extend([Snapshot(assignment_id, user_id,
+                              time.time() if timestamp is None else timestamp,
+                              code)])
+
+    def extend(self, snapshots):
+        """Record several snapshots, taking each assignment's lock once."""
+        def assignment(snapshot):
+            return snapshot.assignment_id
+        for assignment_id, batch in groupby(
+                sorted(snapshots, key=assignment), key=assignment):
+            with self._locked(assignment_id) as directory:
+                self._write(assignment_id, directory, list(batch))
+
+    def snapshots(self, assignment_id, user_id, since=None, until=None):
+        """Yield a student's snapshots of an assignment, oldest first.
+
+        :param since: if given, skip snapshots older than this epoch time
+        :param until: if given, skip snapshots newer than this epoch time
+        """
+        reader = _Reader(self._directory(assignment_id))
+        try:
+            yield from self._decoded(reader, assignment_id, user_id,
+                                     reader.entries(user_id), since, until)
+        finally:
+            reader.close()
+
+    def assignment_snapshots(self, assignment_id, since=None):
+        """Yield (user id, snapshots) pairs for every student of an assignment.
+
+        The index files are read once for the whole class.  Each student's
+        snapshots are decoded as their iterator is consumed, oldest first,
+        and must be consumed before moving on to the next student.
+
+        :param since: if given, skip snapshots older than this epoch time
+        """
+        reader = _Reader(self._directory(assignment_id))
+        try:
+            by_user = {}
+            for segment, entry in reader.entries():
+                by_user.setdefault(entry[0], []).append((segment, entry))
+            for user_id in sorted(by_user):
+                yield user_id, self._decoded(reader, assignment_id, user_id,
+                                             by_user[user_id], since)
+                # deltas only refer to records of the same student
+                reader.forget()
+        finally:
+            reader.close()
+
+    def _decoded(self, reader, assignment_id, user_id, entries, since=None,
+                 until=None):
+        for segment, (_, timestamp, offset) in _by_time(entries):
+            if (since is None or timestamp >= since) and \
+                    (until is None or timestamp <= until):
+                yield Snapshot(assignment_id, user_id, timestamp,
+                               reader.code_at(segment, offset))
+
+    def snapshot_at(self, assignment_id, user_id, timestamp):
+        """Return a student's latest snapshot at or before a time, or None."""
+        reader = _Reader(self._directory(assignment_id))
+        try:
+            found = None
+            for segment, entry in reader.entries(user_id):
+                # not in time order, see _by_time; ties go to the later write
+                if entry[1] <= timestamp and \
+                        (found is None or entry[1] >= found[1][1]):
+                    found = segment, entry
+            if found is None:
+                return None
+            segment, (_, found_timestamp, offset) = found
+            return Snapshot(assignment_id, user_id, found_timestamp,
+                            reader.code_at(segment, offset))
+        finally:
+            reader.close()
+
+    def rebuild_index(self, assignment_id):
+        """Rewrite the index files of an assignment from its segments."""
+        with self._locked(assignment_id) as directory:
+            for segment in _segments(directory):
+                entries = []
+                with open(_segment_path(directory, segment), 'rb') as data:
+                    while True:
+                        offset = data.tell()
+                        try:
+                            record = _read_record(data)
+                        except CorruptRecord:
+                            logger.warning("history segment %s/%08d is cut "
+                                           "off at %d", directory, segment,
+                                           offset)
+                            break
+                        if record is None:
+                            break
+                        entries.append(INDEX_ENTRY.pack(
+                            record[1], record[2], offset))
+                with open(_index_path(directory, segment), 'wb') as index:
+                    index.write(b''.join(entries))
+
+    def _write(self, assignment_id, directory, snapshots):
+        segments = _segments(directory)
+        segment = segments[-1] if segments else 0
+        path = _segment_path(directory, segment)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset >= self.segment_size:
+            segment, offset = segment + 1, 0
+        records, entries, tips = [], [], {}
+        for snapshot in snapshots:
+            key = (assignment_id, snapshot.user_id)
+            tip = tips.get(key) or self._tips.get(key)
+            kind, body, depth = self._encode(tip, snapshot.code)
+            record = RECORD.pack(len(body), kind, snapshot.user_id,
+                                 snapshot.timestamp, zlib.crc32(body)) + body
+            entries.append(INDEX_ENTRY.pack(snapshot.user_id,
+                                            snapshot.timestamp, offset))
+            records.append(record)
+            tips[key] = _ChainTip(segment, offset, depth, snapshot.code)
+            offset += len(record)
+        # the index is written last: a record without an index entry is
+        # only invisible until rebuild_index, never misread
+        with open(_segment_path(directory, segment), 'ab') as data:
+            data.write(b''.join(records))
+        with open(_index_path(directory, segment), 'ab') as index:
+            index.write(b''.join(entries))
+        # only remember bases once they are safely written
+        for key, tip in tips.items():
+            self._tips.pop(key, None)
+            self._tips[key] = tip
+        while len(self._tips) > CHAIN_CACHE_SIZE:
+            self._tips.popitem(last=False)
+
+    def _encode(self, tip, code):
+        if tip is not None and tip.depth + 1 < self.keyframe_interval:
+            prefix, suffix = _common_affixes(tip.code, code)
+            inserted = code[prefix:len(code) - suffix]
+            # rewrites are cheaper to store, and rebuild, as keyframes
+            if len(inserted) * 2 <= len(code):
+                body = DELTA.pack(tip.segment, tip.offset, tip.depth + 1,
+                                  prefix, suffix) + inserted.encode('utf-8')
+                return KIND_DELTA, body, tip.depth + 1
+        return KIND_FULL, zlib.compress(code.encode('utf-8')), 0
+
+    def _directory(self, assignment_id):
+        return os.path.join(self.directory, str(assignment_id))
+
+    def _locked(self, assignment_id):
+        return _DirectoryLock(self._directory(assignment_id))
+
+
+class _Reader:
+    """Decodes records of one assignment, remembering rebuilt snapshots."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+        self._codes = {}
+
+    def entries(self, user_id=None):
+        """Yield (segment, index entry) pairs of a user, or of all users."""
+        for segment in _segments(self.directory):
+            for entry in _read_index(self.directory, segment):
+                if user_id is None or entry[0] == user_id:
+                    yield segment, entry
+
+    def code_at(self, segment, offset):
+        code = self._codes.get((segment, offset))
+        if code is not None:
+            return code
+        data = self._file(segment)
+        data.seek(offset)
+        record = _read_record(data)
+        if record is None:
+            raise CorruptRecord
+        kind, _, _, body = record
+        if kind == KIND_FULL:
+            code = zlib.decompress(body).decode('utf-8')
+        else:
+            base_segment, base_offset, _, prefix, suffix = \
+                DELTA.unpack_from(body)
+            base = self.code_at(base_segment, base_offset)
+            code = (base[:prefix] +
+                    body[DELTA.size:].decode('utf-8') +
+                    base[len(base) - suffix:])
+        self._codes[(segment, offset)] = code
+        return code
+
+    def forget(self):
+        """Drop the snapshots rebuilt so far."""
+        self._codes = {}
+
+    def close(self):
+        for data in self._files.values():
+            data.close()
+
+    def _file(self, segment):
+        if segment not in self._files:
+            self._files[segment] = open(
+                _segment_path(self.directory, segment), 'rb')
+        return self._files[segment]
+
+
+def _by_time(entries):
+    """Sort (segment, index entry) pairs by time, keeping ties in order.
+
+    Entries are in the order records were written, which is not the order
+    they were saved in: autosave flushes and journal replays write saves
+    that are older than records already in the file.
+    """
+    return sorted(entries, key=lambda pair: pair[1][1])
+
+
+def _common_affixes(old, new):
+    """Return the lengths of the common prefix and suffix of two strings."""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def _segments(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len('.seg')]) for name in names
+                  if name.endswith('.seg'))
+
+
+class _DirectoryLock:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._fd = os.open(os.path.join(self.directory, '.lock'),
+                           os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self.directory
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+def _segment_path(directory, segment):
+    return os.path.join(directory, '{:08d}.seg'.format(segment))
+
+
+def _index_path(directory, segment):
+    return os.path.join(directory, '{:08d}.idx'.format(segment))
+
+
+def _read_index(directory, segment):
+    try:
+        with open(_index_path(directory, segment), 'rb') as index:
+            data = index.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+
+def _read_record(data):
+    """Read the record at the current offset, or None at the end."""
+    header = data.read(RECORD.size)
+    if not header:
+        return None
+    if len(header) < RECORD.size:
+        raise CorruptRecord
+    length, kind, user_id, timestamp, crc = RECORD.unpack(header)
+    body = data.read(length)
+    if len(body) < length or zlib.crc32(body) != crc:
+        raise CorruptRecord
+    return kind, user_id, timestamp, body
+
+
+_code_history = None
+_code_history_lock = threading.Lock()
+
+
+def get_code_history():
+    """Return the CodeHistory configured by the settings."""
+    global _code_history
+    if _code_history is None:
+        with _code_history_lock:
+            if _code_history is None:
+                _code_history = CodeHistory(
+                    settings.CODE_HISTORY_DIR,
+                    getattr(settings, 'CODE_HISTORY_SEGMENT_SIZE',
+                            DEFAULT_SEGMENT_SIZE),
+                    getattr(settings, 'CODE_HISTORY_KEYFRAME_INTERVAL',
+                            DEFAULT_KEYFRAME_INTERVAL))
+    return _code_history
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lti_django_skeleton.export import (
+    FORMATS, ExportFilter, export_chunks, parse_bound)
+
+
+class Command(BaseCommand):
+    help = ("Stream a course's submissions, logs and code history as "
+            "NDJSON or a zip archive, reading rows with server-side "
+            "cursors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+            help="ndjson, or zip for code files plus NDJSON.")
+        parser.add_argument(
+            '--assignment', type=int, action='append', default=[],
+            help="Export only this assignment; may be given more than once.")
+        parser.add_argument(
+            '--since', default=None,
+            help="Export only rows changed at or after this ISO date or "
+                 "datetime.")
+        parser.add_argument(
+            '--until', default=None,
+            help="Export only rows changed before this ISO date or datetime.")
+        parser.add_argument(
+            '--output', default=None,
+            help="File to write to instead of standard output.")
+
+    def handle(self, *args, **options):
+        try:
+            since, until = [parse_bound(options[bound])
+                            if options[bound] else None
+                            for bound in ('since', 'until')]
+        except ValueError as e:
+            raise CommandError(e)
+        chunks = export_chunks(ExportFilter(options['course_id'],
+                                            options['assignment'], since,
+                                            until), options['format'])
+        if options['output'] is None:
+            self._write(chunks, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            with open(options['output'], 'wb') as output:
+                self._write(chunks, output)
+
+    def _write(self, chunks, output):
+        for chunk in chunks:
+            output.write(chunk)
@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lti_django_skeleton.history import Snapshot, get_code_history
+
+
+class Command(BaseCommand):
+    help = ("Import the per-save code files under "
+            "<log dir>/<assignment id>/<user id>/ into the code history.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=getattr(settings, 'BLOCKLY_LOG_DIR', None),
+            help="the old log directory, BLOCKLY_LOG_DIR by default")
+        parser.add_argument(
+            '--delete', action='store_true',
+            help="remove each user's files once they are imported")
+
+    def handle(self, *args, **options):
+        history = get_code_history()
+        source = options['source']
+        imported = 0
+        for assignment_id, user_id, directory in _user_directories(source):
+            names = sorted(name for name in os.listdir(directory)
+                           if name.endswith('.py'))
+            snapshots = []
+            for name in names:
+                with open(os.path.join(directory, name), 'rb') as code_file:
+                    code = code_file.read().decode('utf-8', 'replace')
+                snapshots.append(Snapshot(assignment_id, user_id,
+                                          _timestamp(name), code))
+            history.extend(snapshots)
+            imported += len(snapshots)
+            if options['delete']:
+                for name in names:
+                    os.remove(os.path.join(directory, name))
+                if not os.listdir(directory):
+                    os.rmdir(directory)
+        self.stdout.write("Imported {} code snapshots.".format(imported))
+
+
+def _user_directories(source):
+    # only numeric <assignment>/<user> directories hold per-save files
+    for assignment in sorted(os.listdir(source)):
+        assignment_dir = os.path.join(source, assignment)
+        if not assignment.isdigit() or not os.path.isdir(assignment_dir):
+            continue
+        for user in sorted(os.listdir(assignment_dir)):
+            user_dir = os.path.join(assignment_dir, user)
+            if user.isdigit() and os.path.isdir(user_dir):
+                yield int(assignment), int(user), user_dir
+
+
+def _timestamp(name):
+    # files were named with time.strftime("%Y%m%d-%H%M%S") in local time
+    stem = os.path.splitext(name)[0][:len('YYYYmmdd-HHMMSS')]
+    try:
+        return time.mktime(time.strptime(stem, "%Y%m%d-%H%M%S"))
+    except ValueError:
+        return 0.0
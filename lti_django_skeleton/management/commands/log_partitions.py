@@ -0,0 +1,63 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lti_django_skeleton.partitions import (
+    add_months, archive_detached_log_partition, archive_log_partition,
+    create_log_partition, detach_log_partition, detached_log_partitions,
+    log_partitions, month_start, partition_name)
+
+
+class Command(BaseCommand):
+    help = ("Create the monthly Log partitions of the coming months, and "
+            "detach or archive those older than --retain months.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=3,
+            help="Months to create partitions for after the current one.")
+        parser.add_argument(
+            '--retain', type=int, default=None,
+            help="Months to keep attached before the current one; older "
+                 "partitions are detached. Keeps all by default.")
+        parser.add_argument(
+            '--archive-dir', default=None,
+            help="Dump partitions past --retain here as gzipped CSV and drop "
+                 "them, instead of leaving them as detached tables. Old "
+                 "partitions left detached are archived too.")
+
+    def handle(self, *args, **options):
+        archive_dir = options['archive_dir']
+        if archive_dir is not None:
+            if options['retain'] is None:
+                raise CommandError("--archive-dir needs --retain")
+            if not os.path.isdir(archive_dir):
+                raise CommandError("{} is not a directory".format(archive_dir))
+        current = month_start(timezone.now())
+        attached = log_partitions()
+        for offset in range(options['ahead'] + 1):
+            month = add_months(current, offset)
+            if month not in attached:
+                create_log_partition(month)
+                self.stdout.write("Created {}.".format(partition_name(month)))
+        if options['retain'] is None:
+            return
+        oldest = add_months(current, -options['retain'])
+        if archive_dir is not None:
+            # e.g. by an earlier run that failed after the detach
+            for month in detached_log_partitions():
+                if month < oldest:
+                    path = archive_detached_log_partition(month, archive_dir)
+                    self.stdout.write("Archived detached {} to {}.".format(
+                        partition_name(month), path))
+        for month in attached:
+            if month >= oldest:
+                break
+            if archive_dir is None:
+                detach_log_partition(month)
+                self.stdout.write("Detached {}.".format(partition_name(month)))
+            else:
+                path = archive_log_partition(month, archive_dir)
+                self.stdout.write("Archived {} to {}.".format(
+                    partition_name(month), path))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lti_django_skeleton.autosave import Journal, replay_segments
+
+
+class Command(BaseCommand):
+    help = ("Write autosaves left in the journal by processes that are no "
+            "longer running on this host to the database.")
+
+    def handle(self, *args, **options):
+        journal = Journal(settings.AUTOSAVE_JOURNAL_DIR)
+        replayed = replay_segments(journal.claim_orphans())
+        self.stdout.write("Replayed {} journal segments.".format(replayed))
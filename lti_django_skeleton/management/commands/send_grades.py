@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lti_django_skeleton.grades import OutcomeSender
+
+
+class Command(BaseCommand):
+    help = ("Post queued grades to the LMS, retrying failed posts with "
+            "backoff. Runs until interrupted unless --once is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help="Grades to post at the same time.")
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help="Due grades to claim at a time.")
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to wait when no grades are due.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Send the grades due now and exit.")
+
+    def handle(self, *args, **options):
+        sender = OutcomeSender(options['concurrency'])
+        try:
+            while True:
+                close_old_connections()
+                claimed = sender.send_due(options['batch_size'])
+                if options['once'] and claimed < options['batch_size']:
+                    break
+                if claimed < options['batch_size']:
+                    time.sleep(options['poll_interval'])
+        finally:
+            sender.close()
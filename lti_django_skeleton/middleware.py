@@ -0,0 +1,93 @@
+"""Per-launch request context for the tool views.
+
+Resolving the LTI user, roles and course of a request takes several queries,
+and a page firing a burst of AJAX saves would repeat them on every call.  The
+context is resolved once per launch and kept in the session as a handful of
+columns, so later requests rebuild it without touching the database.
+
+``LaunchContextMiddleware`` sets it lazily on every request as
+``request.lti_context``, which the views read through
+``ensure_canvas_arguments``.
+"""
+from collections import namedtuple
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+
+from ltilaunch import LTILAUNCH_SESSION_KEY, LTIUSER_SESSION_KEY
+from ltilaunch.models import LTIUser
+
+from .models import Course
+
+CONTEXT_SESSION_KEY = 'lti_django_skeleton_context'
+
+# columns kept in the session; other fields load on first access
+LTI_USER_FIELDS = ('id', 'user_id', 'roles', 'context_id', 'context_title',
+                   'return_url')
+COURSE_FIELDS = ('id', 'owner_id', 'service', 'external_id', 'name')
+
+LaunchContext = namedtuple('LaunchContext', ['lti_user', 'roles', 'course'])
+
+
+def get_launch_context(request):
+    """Return the LaunchContext of the launch behind this request.
+
+    :param request: an HttpRequest from a logged in LTI user
+    :return: a LaunchContext, memoized on the request and the session
+    """
+    context = getattr(request, '_lti_context', None)
+    if context is None:
+        context = _from_session(request.session)
+        if context is None:
+            context = _resolve(request)
+        request._lti_context = context
+    return context
+
+
+def _from_session(session):
+    stored = session.get(CONTEXT_SESSION_KEY)
+    if stored is None or \
+            stored['launch'] != session.get(LTILAUNCH_SESSION_KEY) or \
+            stored['lti_user']['id'] != session.get(LTIUSER_SESSION_KEY):
+        return None
+    lti_user = _partial_instance(LTIUser, stored['lti_user'])
+    course = _partial_instance(Course, stored['course'])
+    return LaunchContext(lti_user, lti_user.roles, course)
+
+
+def _partial_instance(model, values):
+    # from_db expects the loaded fields in model order
+    names = [f.attname for f in model._meta.concrete_fields
+             if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[n] for n in names])
+
+
+def _resolve(request):
+    lti_user_id = request.session.get(LTIUSER_SESSION_KEY)
+    if lti_user_id is not None:
+        lti_user = LTIUser.objects.get(pk=lti_user_id)
+    else:
+        lti_user = LTIUser.objects.get(user=request.user)
+    course = Course.from_lti("canvas",
+                             lti_user.context_id,
+                             lti_user.context_title,
+                             lti_user.id)
+    if lti_user_id is not None:
+        request.session[CONTEXT_SESSION_KEY] = {
+            'launch': request.session.get(LTILAUNCH_SESSION_KEY),
+            'lti_user': {f: getattr(lti_user, f) for f in LTI_USER_FIELDS},
+            'course': {f: getattr(course, f) for f in COURSE_FIELDS},
+        }
+    return LaunchContext(lti_user, lti_user.roles, course)
+
+
+class LaunchContextMiddleware:
+    """Expose the launch context lazily as ``request.lti_context``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.lti_context = SimpleLazyObject(
+            lambda: get_launch_context(request))
+        return self.get_response(request)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:07
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_courses(apps, schema_editor):
+    """Fold courses sharing (service, external_id) into the oldest one."""
+    Course = apps.get_model('lti_django_skeleton', 'Course')
+    duplicates = (Course.objects.values('service', 'external_id')
+                  .annotate(count=Count('id'), keep=Min('id'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        merged = list(Course.objects.filter(
+            service=duplicate['service'],
+            external_id=duplicate['external_id'],
+        ).exclude(pk=duplicate['keep']).values_list('pk', flat=True))
+        for relation in Course._meta.related_objects:
+            field = relation.field.name
+            relation.related_model.objects.filter(
+                **{field + '__in': merged}).update(
+                **{field: duplicate['keep']})
+        Course.objects.filter(pk__in=merged).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_courses,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:07
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0002_merge_duplicate_courses'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='course',
+            unique_together=set([('service', 'external_id')]),
+        ),
+    ]
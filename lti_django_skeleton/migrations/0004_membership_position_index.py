@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:08
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0003_course_unique_external_id'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='assignmentgroupmembership',
+            index_together=set([('assignment_group', 'position')]),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:20
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Rebuilds the Log table as a partitioned one and copies the rows over, so
+# this takes a while on a big table; Log inserts block meanwhile.
+
+COLUMNS = 'id, date_created, date_modified, event, action, assignment_id, user_id'
+
+PARTITION = [
+    'ALTER TABLE lti_django_skeleton_log'
+    ' RENAME TO lti_django_skeleton_log_unpartitioned',
+    'ALTER INDEX lti_django_skeleton_log_pkey'
+    ' RENAME TO lti_django_skeleton_log_unpartitioned_pkey',
+    """
+    CREATE TABLE lti_django_skeleton_log (
+        id integer NOT NULL DEFAULT nextval('lti_django_skeleton_log_id_seq'),
+        date_created timestamp with time zone NOT NULL,
+        date_modified timestamp with time zone NOT NULL,
+        event varchar(255) NOT NULL,
+        action varchar(255) NOT NULL,
+        assignment_id integer NOT NULL
+            REFERENCES lti_django_skeleton_assignment (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        user_id integer NOT NULL
+            REFERENCES ltilaunch_ltiuser (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, date_created)
+    ) PARTITION BY RANGE (date_created)
+    """,
+    'ALTER SEQUENCE lti_django_skeleton_log_id_seq'
+    ' OWNED BY lti_django_skeleton_log.id',
+    'CREATE TABLE lti_django_skeleton_log_default'
+    ' PARTITION OF lti_django_skeleton_log DEFAULT',
+    # a partition for every month with rows, up to three months ahead
+    """
+    DO $$
+    DECLARE
+        month timestamp := date_trunc('month', coalesce(
+            (SELECT min(date_created)
+             FROM lti_django_skeleton_log_unpartitioned),
+            now()) AT TIME ZONE 'UTC');
+    BEGIN
+        WHILE month <= date_trunc('month', now() AT TIME ZONE 'UTC')
+                       + interval '3 months' LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF lti_django_skeleton_log'
+                ' FOR VALUES FROM (%L) TO (%L)',
+                'lti_django_skeleton_log_' || to_char(month, '"y"YYYY"m"MM'),
+                to_char(month, 'YYYY-MM-DD "00:00:00+00"'),
+                to_char(month + interval '1 month',
+                        'YYYY-MM-DD "00:00:00+00"'));
+            month := month + interval '1 month';
+        END LOOP;
+    END
+    $$
+    """,
+    # check the copied rows now, or the deferred checks block the indexes
+    'SET CONSTRAINTS ALL IMMEDIATE',
+    'INSERT INTO lti_django_skeleton_log ({0})'
+    ' SELECT {0} FROM lti_django_skeleton_log_unpartitioned'.format(COLUMNS),
+    'DROP TABLE lti_django_skeleton_log_unpartitioned',
+    'CREATE INDEX log_date_created_brin ON lti_django_skeleton_log'
+    ' USING brin (date_created)',
+    'CREATE INDEX log_assignment_user_date ON lti_django_skeleton_log'
+    ' (assignment_id, user_id, date_created)',
+    'CREATE INDEX log_user_date ON lti_django_skeleton_log'
+    ' (user_id, date_created)',
+]
+
+UNPARTITION = [
+    """
+    CREATE TABLE lti_django_skeleton_log_unpartitioned (
+        id integer PRIMARY KEY
+            DEFAULT nextval('lti_django_skeleton_log_id_seq'),
+        date_created timestamp with time zone NOT NULL,
+        date_modified timestamp with time zone NOT NULL,
+        event varchar(255) NOT NULL,
+        action varchar(255) NOT NULL,
+        assignment_id integer NOT NULL
+            REFERENCES lti_django_skeleton_assignment (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        user_id integer NOT NULL
+            REFERENCES ltilaunch_ltiuser (id)
+            DEFERRABLE INITIALLY DEFERRED
+    )
+    """,
+    'SET CONSTRAINTS ALL IMMEDIATE',
+    'INSERT INTO lti_django_skeleton_log_unpartitioned ({0})'
+    ' SELECT {0} FROM lti_django_skeleton_log'.format(COLUMNS),
+    'ALTER SEQUENCE lti_django_skeleton_log_id_seq'
+    ' OWNED BY lti_django_skeleton_log_unpartitioned.id',
+    'DROP TABLE lti_django_skeleton_log',
+    'ALTER TABLE lti_django_skeleton_log_unpartitioned'
+    ' RENAME TO lti_django_skeleton_log',
+    'ALTER INDEX lti_django_skeleton_log_unpartitioned_pkey'
+    ' RENAME TO lti_django_skeleton_log_pkey',
+    'CREATE INDEX lti_django_skeleton_log_assignment_id_idx'
+    ' ON lti_django_skeleton_log (assignment_id)',
+    'CREATE INDEX lti_django_skeleton_log_user_id_idx'
+    ' ON lti_django_skeleton_log (user_id)',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0004_membership_position_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(PARTITION, UNPARTITION),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='log',
+                    name='assignment',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='lti_django_skeleton.Assignment'),
+                ),
+                migrations.AlterField(
+                    model_name='log',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ltilaunch.LTIUser'),
+                ),
+                migrations.AddIndex(
+                    model_name='log',
+                    index=django.contrib.postgres.indexes.BrinIndex(fields=['date_created'], name='log_date_created_brin', pages_per_range=None),
+                ),
+                migrations.AddIndex(
+                    model_name='log',
+                    index=models.Index(fields=['assignment', 'user', 'date_created'], name='log_assignment_user_date'),
+                ),
+                migrations.AddIndex(
+                    model_name='log',
+                    index=models.Index(fields=['user', 'date_created'], name='log_user_date'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0010_matcher_class_name_validator'),
+        ('lti_django_skeleton', '0005_partition_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradePost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('lis_result_sourcedid', models.TextField()),
+                ('lis_outcome_service_url', models.TextField()),
+                ('score', models.FloatField()),
+                ('summary', models.CharField(default='', max_length=255)),
+                ('submission_url', models.TextField(blank=True, default='')),
+                ('include_code', models.BooleanField(default=True)),
+                ('revision', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('sent', models.DateTimeField(null=True)),
+                ('consumer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ltilaunch.LTIToolConsumer')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='lti_django_skeleton.Submission')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        # a pending post per result, which new grades replace
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX gradepost_pending_result'
+            ' ON lti_django_skeleton_gradepost'
+            ' (consumer_id, lis_result_sourcedid) WHERE sent IS NULL',
+            'DROP INDEX gradepost_pending_result',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX gradepost_due ON lti_django_skeleton_gradepost'
+            ' (next_attempt) WHERE sent IS NULL',
+            'DROP INDEX gradepost_due',
+        ),
+    ]
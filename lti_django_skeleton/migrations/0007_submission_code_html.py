@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0006_gradepost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='code_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='code_html_version',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:37
+from __future__ import unicode_literals
+
+import json
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+def split_explanations(apps, schema_editor):
+    """Move explain-mode elements out of the code into explanation."""
+    Submission = apps.get_model('lti_django_skeleton', 'Submission')
+    submissions = (Submission.objects.filter(assignment__mode='explain')
+                   .values_list('pk', 'code'))
+    for pk, code in submissions.iterator():
+        try:
+            document = json.loads(code)
+            code, elements = document['code'], document['elements']
+        except (ValueError, TypeError, KeyError):
+            # never explained; saving the code creates the elements
+            continue
+        Submission.objects.filter(pk=pk).update(code=code,
+                                                explanation=elements)
+
+
+def join_explanations(apps, schema_editor):
+    Submission = apps.get_model('lti_django_skeleton', 'Submission')
+    submissions = (Submission.objects.filter(explanation__isnull=False)
+                   .values_list('pk', 'code', 'explanation'))
+    for pk, code, elements in submissions.iterator():
+        Submission.objects.filter(pk=pk).update(code=json.dumps(
+            {'code': code, 'elements': elements}))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0007_submission_code_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='explanation',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(split_explanations, join_explanations),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 09:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_django_skeleton', '0008_submission_explanation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='date_created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
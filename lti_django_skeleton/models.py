@@ -5,9 +5,15 @@ import os
 import json
 import logging
 
-from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import connection, models
+from django.utils import timezone
 
-from ltilaunch.models import LTIUser
+from ltilaunch.models import LTIToolConsumer, LTIUser
+
+from .highlighting import highlight_code
+from .history import get_code_history
 
 
 class Base(models.Model):
@@ -23,33 +29,102 @@ class Base(models.Model):
         abstract = True
 
 
+class VersionConflict(Exception):
+    """
+    A versioned row moved on since the version a change was based on.
+
+    :ivar current: the version the row is at now
+    """
+
+    def __init__(self, current):
+        super().__init__("changed meanwhile, now at version {}".format(current))
+        self.current = current
+
+
+def compare_and_swap(model, where, expected_version, values):
+    """
+    Writes some columns of one row and bumps its version, in one statement.
+
+    The UPDATE only matches while the row is at expected_version, so of two
+    writers that read the same version the second one fails instead of
+    silently overwriting the first.  Columns not in values are not written.
+
+    :param model: a model with a version column
+    :param where: column values that pick the row
+    :param expected_version: the version the change is based on, or None to
+        change whichever version the row is at
+    :param values: new values by column name
+    :return: the updated row, or None if no row matched
+    """
+    quote = connection.ops.quote_name
+    where = dict(where)
+    if expected_version is not None:
+        where['version'] = expected_version
+    values = dict(values, date_modified=timezone.now())
+    sql = ("UPDATE {table} SET {values}, version = version + 1 "
+           "WHERE {where} RETURNING *").format(
+        table=quote(model._meta.db_table),
+        values=", ".join("{} = %s".format(quote(c)) for c in values),
+        where=" AND ".join("{} = %s".format(quote(c)) for c in where))
+    return next(iter(model.objects.raw(
+        sql, list(values.values()) + list(where.values()))), None)
+
+
 class Course(Base):
     name = models.CharField(max_length=255)
     owner = models.ForeignKey(LTIUser, on_delete=models.CASCADE)
     service = models.CharField(max_length=80, default="")
     external_id = models.CharField(max_length=255, default="")
 
+    class Meta:
+        unique_together = ('service', 'external_id')
+
     def __str__(self):
         return '<Course {}>'.format(self.id)
 
     @staticmethod
     def new_lti_course(service, external_id, name, user_id):
-        owner = LTIUser.objects.get(pk=user_id)
-        new_course = Course(name=name, owner=owner,
+        new_course = Course(name=name, owner_id=user_id,
                             service=service, external_id=external_id)
         new_course.save()
         return new_course
 
     @staticmethod
     def from_lti(service, lti_context_id, name, user_id):
-        lti_course = Course.objects.filter(external_id=lti_context_id).first()
+        """
+        Returns the course for an LTI context, creating it on first launch.
+
+        Simultaneous first launches into a course all get the same course:
+        the insert is an INSERT ... ON CONFLICT DO NOTHING on the unique
+        (service, external_id) index.
+
+        :param service: the LMS the context belongs to, e.g. "canvas"
+        :param lti_context_id: the LTI context_id of the launch
+        :param name: the course name, used if the course is created
+        :param user_id: the LTIUser id of the owner, used if created
+        :return: a Course
+        """
+        lti_course = Course.objects.filter(
+            service=service, external_id=lti_context_id).first()
         if lti_course is None:
-            return Course.new_lti_course(service=service,
-                                         external_id=lti_context_id,
-                                         name=name,
-                                         user_id=user_id)
-        else:
-            return lti_course
+            lti_course = Course._insert_lti_course(
+                service, lti_context_id, name, user_id)
+        if lti_course is None:
+            # a concurrent launch created it first
+            lti_course = Course.objects.get(
+                service=service, external_id=lti_context_id)
+        return lti_course
+
+    @staticmethod
+    def _insert_lti_course(service, external_id, name, user_id):
+        now = timezone.now()
+        sql = ("INSERT INTO {} (date_created, date_modified, name, owner_id, "
+               "service, external_id) VALUES (%s, %s, %s, %s, %s, %s) "
+               "ON CONFLICT (service, external_id) DO NOTHING "
+               "RETURNING *").format(
+            connection.ops.quote_name(Course._meta.db_table))
+        return next(iter(Course.objects.raw(
+            sql, [now, now, name, user_id, service, external_id])), None)
 
 
 class Role(Base):
@@ -90,31 +165,37 @@ class Assignment(Base):
     version = models.IntegerField(default=0)
 
     @staticmethod
-    def edit(assignment_id, presentation=None, name=None, on_run=None, on_step=None, on_start=None, parsons=None, text_first=None):
-        assignment = Assignment.objects.get(pk=assignment_id)
-        if name is not None:
-            assignment.name = name
-            assignment.version += 1
-        if presentation is not None:
-            assignment.body = presentation
-            assignment.version += 1
-        if on_run is not None:
-            assignment.on_run = on_run
-            assignment.version += 1
-        if on_step is not None:
-            assignment.on_step = on_step
-            assignment.version += 1
-        if on_start is not None:
-            assignment.on_start = on_start
-            assignment.version += 1
-        assignment.type = 'normal'
-        if parsons is True:
-            assignment.type = 'parsons'
-            assignment.version += 1
-        if text_first is True:
-            assignment.type = 'text'
-            assignment.version += 1
-        assignement.save()
+    def edit(assignment_id, presentation=None, name=None, on_run=None, on_step=None, on_start=None, parsons=None, text_first=None, expected_version=None):
+        """
+        Changes the given parts of an assignment and bumps its version.
+
+        Only the changed columns are written, with compare_and_swap, so two
+        instructors editing different parts do not undo each other.
+
+        :param parsons: whether it is a Parsons problem; with text_first,
+            sets the type if either is given
+        :param expected_version: the version the edit is based on, if the
+            edit must fail when someone else changed the assignment first
+        :raises VersionConflict: if it is no longer at expected_version
+        :raises Assignment.DoesNotExist: if there is no such assignment
+        :return: the edited Assignment
+        """
+        changes = {'name': name, 'body': presentation, 'on_run': on_run,
+                   'on_step': on_step, 'on_start': on_start}
+        changes = {column: value for column, value in changes.items()
+                   if value is not None}
+        if parsons is not None or text_first is not None:
+            changes['type'] = ('text' if text_first else
+                               'parsons' if parsons else 'normal')
+        assignment = compare_and_swap(Assignment, {'id': assignment_id},
+                                      expected_version, changes)
+        if assignment is None:
+            current = Assignment.objects.values_list(
+                'version', flat=True).get(pk=assignment_id)
+            raise VersionConflict(current)
+        # update() sends no post_save, see lti_django_skeleton.catalog
+        from .catalog import invalidate_course
+        invalidate_course(assignment.course_id)
         return assignment
 
     def to_dict(self):
@@ -223,11 +304,28 @@ class AssignmentGroup(Base):
 
     @staticmethod
     def by_course(course_id):
-        course = Course.objects.get(pk=course_id)
-        return (AssignmentGroup.objects.filter(course=course)
+        return (AssignmentGroup.objects.filter(course_id=course_id)
                                      .order_by('name')
                                      .all())
 
+    @staticmethod
+    def by_course_with_assignments(course_id):
+        """
+        Returns every group of a course with its assignments, in two queries.
+
+        :param course_id: the Course id
+        :return: a list of (group, ordered list of assignments) pairs
+        """
+        memberships = (AssignmentGroupMembership.objects
+                                                .select_related('assignment')
+                                                .order_by('position'))
+        groups = AssignmentGroup.by_course(course_id).prefetch_related(
+            models.Prefetch('assignmentgroupmembership_set',
+                            queryset=memberships,
+                            to_attr='ordered_memberships'))
+        return [(group, [m.assignment for m in group.ordered_memberships])
+                for group in groups]
+
     @staticmethod
     def get_ungrouped_assignments(course_id):
         course = Course.objects.get(pk=course_id)
@@ -237,12 +335,9 @@ class AssignmentGroup(Base):
                           .all())
 
     def get_assignments(self):
-        return (Assignment.query
-                          .join(AssignmentGroupMembership,
-                                AssignmentGroupMembership.assignment_id == Assignment.id)
-                          .filter(AssignmentGroupMembership.assignment_group_id==self.id)
-                          .order_by(AssignmentGroupMembership.position)
-                          .all())
+        return (Assignment.objects
+                          .filter(assignmentgroupmembership__assignment_group=self)
+                          .order_by('assignmentgroupmembership__position'))
 
 
 class AssignmentGroupMembership(Base):
@@ -250,6 +345,9 @@ class AssignmentGroupMembership(Base):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     position = models.IntegerField()
 
+    class Meta:
+        index_together = [('assignment_group', 'position')]
+
     @staticmethod
     def move_assignment(assignment_id, new_group_id):
         assignment = Assignment.objects.get(pk=assignment_id)
@@ -275,76 +373,155 @@ class Submission(Base):
     user = models.ForeignKey(LTIUser, on_delete=models.CASCADE)
     assignment_version = models.IntegerField(default=0)
     version = models.IntegerField(default=0)
+    # highlighted HTML of the code as of code_html_version
+    code_html = models.TextField(blank=True, default="")
+    code_html_version = models.IntegerField(null=True)
+    # explain mode: the code's elements by name, each with its line,
+    # whether it is present and the student's answer
+    explanation = JSONField(null=True, blank=True)
 
     def __str__(self):
         return '<Submission {} for {}>'.format(self.id, self.user)
 
+    def highlighted_code(self):
+        '''
+        Returns the code as highlighted HTML, rendered once per version.
+        '''
+        if self.code_html_version != self.version:
+            self.code_html = highlight_code(self.code)
+            self.code_html_version = self.version
+            # unless the code moved on meanwhile
+            Submission.objects.filter(pk=self.pk, version=self.version).update(
+                code_html=self.code_html, code_html_version=self.version)
+        return self.code_html
+
     @staticmethod
     def load(user_id, assignment_id):
-        submission = Submission.objects.filter(assignment_id=assignment_id,
-                                                user_id=user_id).first()
+        submission = (Submission.objects.filter(assignment_id=assignment_id,
+                                                 user_id=user_id)
+                                        .defer('explanation').first())
         if not submission:
-            submission = Submission(assignment_id=assignment_id, user_id=user_id)
             assignment = Assignment.objects.get(pk=assignment_id)
-            if assignment.mode == 'explain':
-                submission.code = json.dumps(Submission.default_explanation(''))
-            else:
-                submission.code = assignment.on_start
+            submission = Submission(
+                assignment=assignment, user_id=user_id,
+                code=Submission.initial_code(assignment),
+                explanation=Submission.initial_explanation(assignment))
             submission.save()
         return submission
 
     @staticmethod
-    def default_explanation(code):
-        return {
-                'code': code,
-                'elements': {
-                    'CORGIS_USE': {'line': 0, 'present': False, 'answer': '', 'name': 'CORGIS_USE'},
-                    'FOR_LOOP': {'line': 0, 'present': False, 'answer': '', 'name': 'FOR_LOOP'},
-                    'DICTIONARY_ACCESS': {'line': 0, 'present': False, 'answer': '', 'name': 'DICTIONARY_ACCESS'},
-                    'IMPORT_CORGIS': {'line': 0, 'present': False, 'answer': '', 'name': 'IMPORT_CORGIS'},
-                    'LIST_APPEND': {'line': 0, 'present': False, 'answer': '', 'name': 'LIST_APPEND'},
-                    'IMPORT_MATPLOTLIB': {'line': 0, 'present': False, 'answer': '', 'name': 'IMPORT_MATPLOTLIB'},
-                    'ASSIGNMENT': {'line': 0, 'present': False, 'answer': '', 'name': 'ASSIGNMENT'},
-                    'MATPLOTLIB_PLOT': {'line': 0, 'present': False, 'answer': '', 'name': 'MATPLOTLIB_PLOT'},
-                    'LIST_ASSIGNMENT': {'line': 0, 'present': False, 'answer': '', 'name': 'LIST_ASSIGNMENT'}
-                }
-        }
+    def load_many(user_id, assignments):
+        """
+        Loads the user's submissions for several assignments at once.
+
+        Existing submissions are fetched in one query and the missing ones
+        are created with a single bulk insert.
+
+        :param user_id: the LTIUser id
+        :param assignments: loaded Assignment objects
+        :return: a list of Submissions, in the order of the assignments
+        """
+        assignments = list(assignments)
+        by_assignment = {}
+        existing = (Submission.objects
+                              .filter(user_id=user_id,
+                                      assignment__in=assignments)
+                              .defer('explanation')
+                              .order_by('-pk'))
+        for submission in existing:
+            # keep the oldest if duplicates slipped in
+            by_assignment[submission.assignment_id] = submission
+        missing = [Submission(
+                       assignment=assignment, user_id=user_id,
+                       code=Submission.initial_code(assignment),
+                       explanation=Submission.initial_explanation(assignment))
+                   for assignment in assignments
+                   if assignment.id not in by_assignment]
+        if missing:
+            # bulk_create sets primary keys on PostgreSQL
+            for submission in Submission.objects.bulk_create(missing):
+                by_assignment[submission.assignment_id] = submission
+        submissions = [by_assignment[assignment.id]
+                       for assignment in assignments]
+        for assignment, submission in zip(assignments, submissions):
+            submission.assignment = assignment
+        return submissions
+
+    @staticmethod
+    def initial_code(assignment):
+        if assignment.mode == 'explain':
+            return ''
+        return assignment.on_start
+
+    @staticmethod
+    def initial_explanation(assignment):
+        if assignment.mode == 'explain':
+            return Submission.default_elements()
+        return None
+
+    EXPLANATION_ELEMENTS = ['CORGIS_USE', 'FOR_LOOP', 'DICTIONARY_ACCESS',
+                            'IMPORT_CORGIS', 'LIST_APPEND',
+                            'IMPORT_MATPLOTLIB', 'ASSIGNMENT',
+                            'MATPLOTLIB_PLOT', 'LIST_ASSIGNMENT']
+
+    @staticmethod
+    def default_elements():
+        return {name: {'line': 0, 'present': False, 'answer': '',
+                       'name': name}
+                for name in Submission.EXPLANATION_ELEMENTS}
 
     @staticmethod
     def save_explanation_answer(user_id, assignment_id, name, answer):
-        submission = Submission.objects.filter(user_id=user_id,
-                                                assignment_id=assignment_id).first()
-        submission_destructured = json.loads(submission.code)
-        elements = submission_destructured['elements']
-        if name in elements:
-            elements[name]['answer'] = answer
-            submission.code = json.dumps(submission_destructured)
-            submission.version += 1
-            submission.save()
-            submission.log_code()
-            return submission_destructured
+        '''
+        Stores the answer to one element with a single jsonb_set UPDATE.
 
+        :return: the answered element, or None if the submission has no
+            such element
+        '''
+        sql = ("UPDATE {} SET explanation = jsonb_set(explanation, "
+               "%s::text[], to_jsonb(%s::text)), version = version + 1, "
+               "date_modified = %s "
+               "WHERE user_id = %s AND assignment_id = %s "
+               "AND explanation ? %s "
+               "RETURNING explanation -> %s").format(
+            connection.ops.quote_name(Submission._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [[name, 'answer'], answer, timezone.now(),
+                                 user_id, assignment_id, name, name])
+            row = cursor.fetchone()
+        return row and row[0]
 
     def save_explanation_code(self, code, elements):
-        try:
-            submission_destructured = json.loads(self.code)
-        except ValueError:
-            submission_destructured = {}
-        if 'code' in submission_destructured:
-            submission_destructured['code'] = code
-            existing_elements = submission_destructured['elements']
-            for element in existing_elements:
-                existing_elements[element]['present'] = False
-            for element, value in elements.items():
-                existing_elements[element]['line'] = value
-                existing_elements[element]['present'] = True
-        else:
-            submission_destructured = Submission.default_explanation(code)
-        self.code = json.dumps(submission_destructured)
-        self.version += 1
-        self.save()
+        '''
+        Stores the explained code and the lines of the elements found in it.
+
+        Elements not given are marked absent; answers are kept.  The
+        elements are rewritten in the UPDATE itself, so an answer saved
+        meanwhile is not lost.
+
+        :param elements: the line of each present element, by name
+        :return: all elements, by name
+        '''
+        sql = ("UPDATE {} SET code = %s, version = version + 1, "
+               "date_modified = %s, explanation = ("
+               "SELECT jsonb_object_agg(key, CASE WHEN found.line IS NULL "
+               "THEN value || jsonb_build_object('present', false) "
+               "ELSE value || jsonb_build_object("
+               "'line', found.line, 'present', true) END) "
+               "FROM jsonb_each(COALESCE(explanation, %s::jsonb)) "
+               "AS element(key, value) "
+               "LEFT JOIN jsonb_each(%s::jsonb) AS found(key, line) "
+               "USING (key)) "
+               "WHERE id = %s RETURNING version, explanation").format(
+            connection.ops.quote_name(Submission._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [code, timezone.now(),
+                                 json.dumps(Submission.default_elements()),
+                                 json.dumps(elements), self.pk])
+            self.version, self.explanation = cursor.fetchone()
+        self.code = code
         self.log_code()
-        return submission_destructured
+        return self.explanation
 
     ELEMENT_PRIORITY_LIST = ['CORGIS_USE', 'FOR_LOOP', 'DICTIONARY_ACCESS',
                          'IMPORT_CORGIS', 'LIST_APPEND', 'IMPORT_MATPLOTLIB',
@@ -355,99 +532,141 @@ class Submission(Base):
         return ''.join([l[0] for l in element_type.split("_")])
 
     def load_explanation(self, max_questions):
-        submission_destructured = json.loads(self.code)
-        code = submission_destructured['code']
-        # Find the first FIVE
+        '''
+        Returns the code and up to max_questions present elements to ask
+        about, one per line, in ELEMENT_PRIORITY_LIST order.  Only present
+        elements are read from the database.
+        '''
+        sql = ("SELECT element.value FROM {}, jsonb_each(explanation) "
+               "AS element(key, value) "
+               "WHERE id = %s AND element.key = ANY(%s) "
+               "AND (element.value ->> 'present')::boolean "
+               "ORDER BY array_position(%s::text[], element.key)").format(
+            connection.ops.quote_name(Submission._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.pk, Submission.ELEMENT_PRIORITY_LIST,
+                                 Submission.ELEMENT_PRIORITY_LIST])
+            present = [element for element, in cursor.fetchall()]
         available_elements = []
         used_lines = set()
-        e = submission_destructured['elements']
-        for element in Submission.ELEMENT_PRIORITY_LIST:
-            # Not present?
-            if not e[element]['present']:
-                continue
+        for element in present:
             # Already used that line?
-            if e[element]['line'][0] in used_lines:
+            if element['line'][0] in used_lines:
                 continue
-            # Cool, then add it
-            available_elements.append(e[element])
-            used_lines.add(e[element]['line'][0])
+            available_elements.append(element)
+            used_lines.add(element['line'][0])
             # Stop if we have enough already
             if len(available_elements) >= max_questions:
                 break
-        return code, available_elements
+        return self.code, available_elements
 
     @staticmethod
-    def save_code(user_id, assignment_id, code, assignment_version):
-        submission = Submission.objects.filter(user_id=user_id,
-                                                assignment_id=assignment_id).first()
-        is_version_correct = True
-        if not submission:
-            submission = Submission(assignment_id=assignment_id,
-                                    user_id=user_id,
-                                    code=code,
-                                    assignment_version=assignment_version)
-        else:
-            submission.code = code
-            submission.version += 1
-            current_assignment_version = Assignment.objects.get(pk=submission.assignment_id).version
-            is_version_correct = (assignment_version == current_assignment_version)
-        submission.save()
+    def save_code(user_id, assignment_id, code, assignment_version,
+                  expected_version=None):
+        """
+        Saves a student's code right away, bypassing the autosaver.
+
+        Only the code and version are written, with compare_and_swap.  A
+        submission that does not exist yet is created, whatever version the
+        client expected.
+
+        :param assignment_version: the assignment version the client has
+        :param expected_version: the submission version the code is based
+            on, if the save must fail when another tab saved first
+        :raises VersionConflict: if the submission moved on meanwhile
+        :return: the Submission, and whether assignment_version is current
+        """
+        submission = compare_and_swap(
+            Submission, {'user_id': user_id, 'assignment_id': assignment_id},
+            expected_version, {'code': code})
+        if submission is None:
+            current = (Submission.objects.filter(user_id=user_id,
+                                                 assignment_id=assignment_id)
+                                         .values_list('version', flat=True)
+                                         .first())
+            if current is not None:
+                raise VersionConflict(current)
+            submission = Submission.objects.create(
+                assignment_id=assignment_id, user_id=user_id, code=code,
+                assignment_version=assignment_version)
+        current_assignment_version = Assignment.objects.values_list(
+            'version', flat=True).get(pk=assignment_id)
         submission.log_code()
-        return submission, is_version_correct
+        return submission, assignment_version == current_assignment_version
 
     @staticmethod
     def save_correct(user_id, assignment_id):
-        submission = Submission.query.filter_by(user_id=user_id,
-                                                assignment_id=assignment_id).first()
-        if not submission:
-            submission = Submission(assignment_id=self.id,
-                                    user_id=user_id,
-                                    correct=True)
-        else:
-            submission.correct = True
-        submission.save()
+        submission = Submission.load(user_id, assignment_id)
+        # only the flag, so concurrent code saves are not reverted
+        Submission.objects.filter(pk=submission.pk).update(correct=True)
+        submission.correct = True
         return submission
 
-    def log_code(self, extension='.py'):
+    def log_code(self):
         '''
-        Store the code on disk, mapped to the Assignment ID and the Student ID
+        Store the code in the code history, mapped to the Assignment ID and
+        the Student ID
         '''
-        # Multiple-file logging
-        directory = os.path.join(app.config['BLOCKLY_LOG_DIR'],
-                                 str(self.assignment_id),
-                                 str(self.user_id))
-
-        ensure_dirs(directory)
-        name = time.strftime("%Y%m%d-%H%M%S")
-        file_name = os.path.join(directory, name + extension)
-        with open(file_name, 'wb') as blockly_logfile:
-            blockly_logfile.write(self.code)
-        # Single file logging
+        get_code_history().append(self.assignment_id, self.user_id, self.code)
+        # Single file logging; the code itself is only kept in the history
         student_interactions_logger = logging.getLogger('StudentInteractions')
         student_interactions_logger.info(
-            StructuredEvent(self.user_id, self.assignment_id, 'code', 'set', self.code)
-        )
+            "%s %s %s %s", self.user_id, self.assignment_id, 'code', 'set')
 
 
 class Log(Base):
+    '''
+    The table is partitioned by month of date_created, see
+    lti_django_skeleton.partitions.  date_created is when the event
+    happened, which batched writes set explicitly.
+    '''
+    date_created = models.DateTimeField(default=timezone.now)
     event = models.CharField(max_length=255, default="")
     action = models.CharField(max_length=255, default="")
-    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
-    user = models.ForeignKey(LTIUser, on_delete=models.CASCADE)
+    # covered by the composite indexes below
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE,
+                                   db_index=False)
+    user = models.ForeignKey(LTIUser, on_delete=models.CASCADE,
+                             db_index=False)
 
-    @staticmethod
-    def new(event, action, assignment_id, user_id):
-        assignment = Assignment.objects.get(pk=assignment_id)
-        user = User.objects.get(pk=user_id)
-        # Database logging
-        log = Log(event=event, action=action, assignment=assignment, user=user)
-        log.save()
-        # Single-file logging
-        student_interactions_logger = logging.getLogger('StudentInteractions')
-        student_interactions_logger.info(
-            StructuredEvent(user_id, assignment_id, event, action, '')
-        )
-        return log
+    class Meta:
+        indexes = [
+            BrinIndex(fields=['date_created'], name='log_date_created_brin'),
+            models.Index(fields=['assignment', 'user', 'date_created'],
+                         name='log_assignment_user_date'),
+            models.Index(fields=['user', 'date_created'],
+                         name='log_user_date'),
+        ]
 
     def __str__(self):
         return '<Log {} for {}>'.format(self.event, self.action)
+
+
+class GradePost(Base):
+    '''
+    A grade waiting to be posted to the LMS, or already posted.
+
+    There is at most one unsent post per consumer and lis_result_sourcedid;
+    queueing another grade for it replaces the pending one, see
+    lti_django_skeleton.grades.
+    '''
+    consumer = models.ForeignKey(LTIToolConsumer, on_delete=models.CASCADE)
+    lis_result_sourcedid = models.TextField()
+    lis_outcome_service_url = models.TextField()
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    score = models.FloatField()
+    summary = models.CharField(max_length=255, default="")
+    # when set, the result links to the submission and shows its touches
+    submission_url = models.TextField(blank=True, default="")
+    include_code = models.BooleanField(default=True)
+    # bumped whenever a newer grade replaces the pending one
+    revision = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    # when the post is due; null once it has been given up on
+    next_attempt = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True, default="")
+    sent = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return '<GradePost {} for {}>'.format(self.id,
+                                              self.lis_result_sourcedid)
@@ -0,0 +1,126 @@
+"""A local LIS Outcomes service that accepts grades and remembers them.
+
+Point a test consumer's ``lis_outcome_service_url`` at it to run the
+``send_grades`` worker without an LMS::
+
+    python -m lti_django_skeleton.outcomes_stub --port 8001 --delay 0.5
+
+It does not check OAuth signatures, only that requests are signed.  With
+``--fail-first`` it answers the first requests with a server error, to
+exercise retries.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from lti import OutcomeRequest, OutcomeResponse
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubOutcomesServer:
+    """Outcomes service on a background thread, for tests and local runs.
+
+    :param delay: seconds to wait before answering each request
+    :param fail_first: number of requests to fail before accepting any
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0, fail_first=0):
+        self.delay = delay
+        self.fail_first = fail_first
+        # score of each lis_result_sourcedid, by arrival
+        self.grades = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://{}:{}/outcomes'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='outcomes-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _handle(self, authorization, body):
+        """Return the status and XML to answer an outcome request with."""
+        time.sleep(self.delay)
+        with self._lock:
+            self.requests += 1
+            failing = self.requests <= self.fail_first
+        if not authorization.startswith('OAuth '):
+            return 401, self._response(None, 'failure', 'not signed')
+        if failing:
+            return 500, self._response(None, 'failure', 'stub failure')
+        request = OutcomeRequest()
+        request.process_xml(body)
+        with self._lock:
+            self.grades[str(request.lis_result_sourcedid)] = \
+                float(request.score)
+        return 200, self._response(request, 'success', 'Score set')
+
+    @staticmethod
+    def _response(request, code_major, description):
+        return OutcomeResponse(
+            message_identifier='stub',
+            message_ref_identifier=request and request.message_identifier,
+            operation='replaceResult',
+            code_major=code_major,
+            severity='status' if code_major == 'success' else 'error',
+            description=description).generate_response_xml()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status, xml = stub._handle(
+                    self.headers.get('Authorization', ''), body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/xml')
+                self.send_header('Content-Length', str(len(xml)))
+                self.end_headers()
+                self.wfile.write(xml)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--delay', type=float, default=0)
+    parser.add_argument('--fail-first', type=int, default=0)
+    args = parser.parse_args()
+    stub = StubOutcomesServer(args.host, args.port, args.delay,
+                              args.fail_first)
+    print("Accepting grades at {}".format(stub.url))
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("Received {} requests, grades: {}".format(stub.requests,
+                                                    stub.grades))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Monthly partitions of the ``Log`` table.
+
+``lti_django_skeleton_log`` is range-partitioned on ``date_created``, one
+partition per calendar month (UTC) named ``lti_django_skeleton_log_yYYYYmMM``,
+plus a default partition that catches rows no month partition covers yet.
+Partitions have to exist before their month starts for inserts to land in
+them; the ``log_partitions`` management command creates upcoming months and
+detaches or archives old ones, and should run from cron at least monthly.
+Native partitioning with a default partition needs PostgreSQL 11 or later.
+"""
+import datetime
+import gzip
+import logging
+import os
+import re
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'lti_django_skeleton_log'
+DEFAULT_PARTITION = TABLE + '_default'
+PARTITION_NAME = TABLE + '_y{:04d}m{:02d}'
+PARTITION_RE = re.compile('^' + TABLE + r'_y(\d{4})m(\d{2})$')
+
+
+def month_start(value):
+    """Return the first day of the month of a date."""
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Return the first day of the month ``count`` months after ``month``."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return PARTITION_NAME.format(month.year, month.month)
+
+
+def _utc_bound(month):
+    return '{} 00:00:00+00'.format(month.isoformat())
+
+
+def log_partitions():
+    """Return the months that have a partition attached, in order."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE parent.relname = %s", [TABLE])
+        return _months(row[0] for row in cursor.fetchall())
+
+
+def detached_log_partitions():
+    """Return the months whose partition is detached but not dropped."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r'"
+            " AND relname LIKE %s AND NOT relispartition"
+            " AND pg_table_is_visible(oid)",
+            [TABLE + '\\_y%'])
+        return _months(row[0] for row in cursor.fetchall())
+
+
+def _months(names):
+    months = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)),
+                                        int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_log_partition(month):
+    """Create and attach the partition of a month.
+
+    Rows of that month already in the default partition are moved into it,
+    so a month that was missed can still be partitioned later.
+    """
+    name = partition_name(month)
+    bounds = [_utc_bound(month), _utc_bound(add_months(month, 1))]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE "{}" (LIKE "{}" INCLUDING DEFAULTS'
+            ' INCLUDING CONSTRAINTS)'.format(name, TABLE))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM "{}" WHERE date_created >= %s'
+            ' AND date_created < %s RETURNING *)'
+            ' INSERT INTO "{}" SELECT * FROM moved'.format(
+                DEFAULT_PARTITION, name), bounds)
+        if cursor.rowcount:
+            logger.info("moved %d rows from %s to %s", cursor.rowcount,
+                        DEFAULT_PARTITION, name)
+        cursor.execute(
+            'ALTER TABLE "{}" ATTACH PARTITION "{}"'
+            ' FOR VALUES FROM (%s) TO (%s)'.format(TABLE, name), bounds)
+
+
+def detach_log_partition(month):
+    """Detach the partition of a month, leaving it as a plain table."""
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE "{}" DETACH PARTITION "{}"'.format(
+            TABLE, partition_name(month)))
+
+
+def archive_log_partition(month, directory):
+    """Detach the partition of a month, dump it and drop it.
+
+    The detach commits on its own: it locks the whole ``Log`` table, which
+    must not stay locked while the rows are dumped.  If the dump fails, the
+    partition is left detached and ``archive_detached_log_partition``
+    finishes the job.
+
+    :return: the path of the archive
+    """
+    with transaction.atomic():
+        detach_log_partition(month)
+    return archive_detached_log_partition(month, directory)
+
+
+def archive_detached_log_partition(month, directory):
+    """Dump the detached partition of a month and drop it.
+
+    The rows are written as gzipped CSV with a header line to
+    ``<directory>/<partition name>.csv.gz``.
+
+    :return: the path of the archive
+    """
+    name = partition_name(month)
+    path = os.path.join(directory, name + '.csv.gz')
+    with transaction.atomic():
+        with gzip.open(path, 'wt', encoding='utf-8') as archive, \
+                connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY "{}" TO STDOUT WITH (FORMAT csv, HEADER)'.format(name),
+                archive)
+        # only drop the rows once the archive is safely on disk
+        with open(path, 'rb') as archive:
+            os.fsync(archive.fileno())
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE "{}"'.format(name))
+    return path
@@ -1,3 +1,1146 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import zipfile
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from ltilaunch import LTILAUNCH_SESSION_KEY, LTIUSER_SESSION_KEY
+from ltilaunch.models import LTIToolConsumer, get_or_create_lti_user
+from lti_django_skeleton.autosave import Autosaver, Journal, replay_segments
+from lti_django_skeleton.catalog import (
+    get_assignment_versions, get_catalog, get_catalog_etag)
+from lti_django_skeleton.checks import check_catalog_cache
+from lti_django_skeleton.events import Event, EventQueue, parse_event
+from lti_django_skeleton.export import ExportFilter, export_chunks
+from lti_django_skeleton import grades
+from lti_django_skeleton.grades import OutcomeSender, enqueue_grade
+from lti_django_skeleton.highlighting import RenderCache
+from lti_django_skeleton.history import (CodeHistory, _read_index,
+                                         _read_record)
+from lti_django_skeleton.middleware import (LaunchContextMiddleware,
+                                            get_launch_context)
+from lti_django_skeleton.partitions import (
+    archive_log_partition, create_log_partition, detached_log_partitions,
+    log_partitions, month_start)
+from lti_django_skeleton.models import (Assignment, AssignmentGroup,
+                                        AssignmentGroupMembership, Course,
+                                        GradePost, Log, Submission,
+                                        VersionConflict)
+from lti_django_skeleton.outcomes_stub import StubOutcomesServer
+from lti_django_skeleton.views import ensure_canvas_arguments
+
+
+class LTIUserMixin:
+    """Creates ``self.consumer`` and a launched ``self.lti_user``.
+
+    Test cases change them through ``consumer_fields`` and ``launch_params``.
+    """
+    consumer_fields = {}
+
+    def setUp(self):
+        super().setUp()
+        self.consumer = LTIToolConsumer.objects.create(
+            name="testconsumer",
+            tool_consumer_instance_guid="guid",
+            **self.consumer_fields)
+        self.lti_user = self.launch(**self.launch_params())
+
+    def launch_params(self):
+        return {
+            "user_id": "alice",
+            "roles": "Instructor",
+            "context_id": "course1",
+            "context_title": "Course 1",
+        }
+
+    def launch(self, **params):
+        return get_or_create_lti_user(self.consumer, params)
+
+    def login(self, lti_user=None):
+        """Give the test client the session of a user's latest launch."""
+        lti_user = lti_user or self.lti_user
+        self.client.force_login(lti_user.user)
+        session = self.client.session
+        session[LTIUSER_SESSION_KEY] = lti_user.pk
+        session[LTILAUNCH_SESSION_KEY] = lti_user.last_launch_id
+        session.save()
+
+
+class CourseMixin(LTIUserMixin):
+    """Adds the user's ``self.course`` and an assignment in it.
+
+    ``assignment_fields`` are the fields of ``self.assignment``, or None to
+    leave the course empty.
+    """
+    assignment_fields = {}
+
+    def setUp(self):
+        super().setUp()
+        self.course = Course.from_lti("canvas", "course1", "Course 1",
+                                      self.lti_user.pk)
+        if self.assignment_fields is not None:
+            self.assignment = self.create_assignment(
+                **self.assignment_fields)
+
+    def create_assignment(self, **fields):
+        return Assignment.objects.create(owner=self.lti_user,
+                                         course=self.course, **fields)
+
+
+class LaunchContextTestCase(LTIUserMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = import_module(
+            settings.SESSION_ENGINE).SessionStore()
+        self.session[LTIUSER_SESSION_KEY] = self.lti_user.pk
+        self.session[LTILAUNCH_SESSION_KEY] = self.lti_user.last_launch_id
+
+    def _request(self):
+        request = RequestFactory().get("/")
+        request.user = self.lti_user.user
+        request.session = self.session
+        return request
+
+    def test_resolved_once_per_launch(self):
+        lti_user, roles, course = get_launch_context(self._request())
+        self.assertEqual(self.lti_user.pk, lti_user.pk)
+        self.assertEqual("Instructor", roles)
+        self.assertEqual("course1", course.external_id)
+
+        course_id = Course.objects.get(external_id="course1").pk
+        request = self._request()
+        with self.assertNumQueries(0):
+            lti_user, roles, course = get_launch_context(request)
+            self.assertEqual("Instructor", roles)
+            self.assertEqual(self.lti_user.return_url, lti_user.return_url)
+            self.assertEqual(course_id, course.pk)
+        self.assertIs(lti_user, get_launch_context(request).lti_user)
+
+    def test_middleware(self):
+        request = self._request()
+        LaunchContextMiddleware(lambda request: None)(request)
+        # resolved on first use only
+        self.assertFalse(hasattr(request, "_lti_context"))
+        lti_user, roles, course = ensure_canvas_arguments(request)
+        self.assertEqual(self.lti_user.pk, lti_user.pk)
+        self.assertEqual("course1", course.external_id)
+        self.assertIs(lti_user, get_launch_context(request).lti_user)
+
+    def test_without_middleware(self):
+        request = self._request()
+        lti_user, roles, course = ensure_canvas_arguments(request)
+        self.assertEqual(self.lti_user.pk, lti_user.pk)
+        self.assertEqual("course1", course.external_id)
+
+    def test_new_launch(self):
+        get_launch_context(self._request())
+        relaunched = self.launch(user_id="alice", roles="Learner",
+                                 context_id="course2",
+                                 context_title="Course 2")
+        self.session[LTILAUNCH_SESSION_KEY] = relaunched.last_launch_id
+        lti_user, roles, course = get_launch_context(self._request())
+        self.assertEqual("Learner", roles)
+        self.assertEqual("course2", course.external_id)
+
+
+class CourseFromLTITestCase(LTIUserMixin, TestCase):
+    def test_get_or_create(self):
+        course = Course.from_lti("canvas", "course1", "Course 1",
+                                 self.lti_user.pk)
+        self.assertEqual("Course 1", course.name)
+        self.assertEqual(self.lti_user.pk, course.owner_id)
+        with self.assertNumQueries(1):
+            same = Course.from_lti("canvas", "course1", "Renamed",
+                                   self.lti_user.pk)
+        self.assertEqual(course.pk, same.pk)
+        other = Course.from_lti("moodle", "course1", "Course 1",
+                                self.lti_user.pk)
+        self.assertNotEqual(course.pk, other.pk)
+
+    def test_insert_conflict(self):
+        course = Course.from_lti("canvas", "course1", "Course 1",
+                                 self.lti_user.pk)
+        self.assertIsNone(Course._insert_lti_course(
+            "canvas", "course1", "Course 1", self.lti_user.pk))
+        self.assertEqual([course.pk], list(
+            Course.objects.values_list("pk", flat=True)))
+
+
+class SubmissionLoadManyTestCase(CourseMixin, TestCase):
+    assignment_fields = None
+
+    def setUp(self):
+        super().setUp()
+        self.assignments = [
+            self.create_assignment(on_start="print({})".format(i))
+            for i in range(5)]
+        self.assignments[3].mode = 'explain'
+
+    def test_load_many(self):
+        started = Submission.load(self.lti_user.pk, self.assignments[1].pk)
+        with self.assertNumQueries(2):
+            submissions = Submission.load_many(self.lti_user.pk,
+                                               self.assignments)
+        self.assertEqual([a.pk for a in self.assignments],
+                         [s.assignment_id for s in submissions])
+        self.assertEqual(started.pk, submissions[1].pk)
+        self.assertEqual("print(0)", submissions[0].code)
+        self.assertIn("CORGIS_USE", submissions[3].explanation)
+        self.assertTrue(all(s.pk for s in submissions))
+        with self.assertNumQueries(1):
+            again = Submission.load_many(self.lti_user.pk, self.assignments)
+        self.assertEqual([s.pk for s in submissions], [s.pk for s in again])
+
+
+class AssignmentGroupTestCase(CourseMixin, TestCase):
+    assignment_fields = None
+
+    def setUp(self):
+        super().setUp()
+        self.assignments = [self.create_assignment() for _ in range(3)]
+        self.group1 = AssignmentGroup.objects.create(
+            name="group1", owner=self.lti_user, course=self.course)
+        self.group2 = AssignmentGroup.objects.create(
+            name="group2", owner=self.lti_user, course=self.course)
+        for position, assignment in enumerate(reversed(self.assignments)):
+            AssignmentGroupMembership.objects.create(
+                assignment_group=self.group1, assignment=assignment,
+                position=position)
+        AssignmentGroupMembership.objects.create(
+            assignment_group=self.group2, assignment=self.assignments[0],
+            position=0)
+
+    def test_get_assignments(self):
+        self.assertEqual(list(reversed(self.assignments)),
+                         list(self.group1.get_assignments()))
+        self.assertEqual([self.assignments[0]],
+                         list(self.group2.get_assignments()))
+
+    def test_by_course_with_assignments(self):
+        with self.assertNumQueries(2):
+            groups = AssignmentGroup.by_course_with_assignments(
+                self.course.pk)
+            self.assertEqual([
+                (self.group1, list(reversed(self.assignments))),
+                (self.group2, [self.assignments[0]]),
+            ], groups)
+
+    def test_shared(self):
+        self.login()
+        # the lti/ templates are not part of this app, and nothing is
+        # buffered to flush
+        with mock.patch("lti_django_skeleton.views.render",
+                        return_value=HttpResponse()) as render, \
+                mock.patch("lti_django_skeleton.views.get_autosaver"):
+            response = self.client.get(reverse("lti_shared"), {
+                "assignment_group_id": self.group1.pk})
+        self.assertEqual(200, response.status_code)
+        request, template, context = render.call_args[0]
+        self.assertEqual("lti/index.html", template)
+        self.assertEqual(self.lti_user.user, request.user)
+        self.assertEqual(list(reversed(self.assignments)),
+                         [a for a, _ in context["group"]])
+        self.assertEqual([a.pk for a in reversed(self.assignments)],
+                         [s.assignment_id for _, s in context["group"]])
+
+
+# counts only the catalog queries, not the cache's own
+@override_settings(CACHES={"default": {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CourseCatalogTestCase(CourseMixin, TestCase):
+    assignment_fields = None
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.grouped = self.create_assignment(name="grouped")
+        self.stray = self.create_assignment(mode="maze")
+        self.group = AssignmentGroup.objects.create(
+            name="group", owner=self.lti_user, course=self.course)
+        AssignmentGroupMembership.objects.create(
+            assignment_group=self.group, assignment=self.grouped, position=0)
+
+    def test_catalog(self):
+        catalog = get_catalog(self.course.pk)
+        self.assertEqual([self.grouped.pk], [
+            a["id"] for a in catalog.assignments(exclude_builtins=True)])
+        [(group, assignments)] = catalog.groups()
+        self.assertEqual("group", group["name"])
+        self.assertEqual(["grouped"], [a["title"] for a in assignments])
+        self.assertEqual(["Untitled ({})".format(self.stray.pk)],
+                         [a["title"] for a in catalog.strays()])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.data, get_catalog(self.course.pk).data)
+
+    def test_invalidated_on_write(self):
+        etag = get_catalog_etag(self.course.pk)
+        get_catalog(self.course.pk)
+        self.assertEqual(etag, get_catalog_etag(self.course.pk))
+        AssignmentGroupMembership.objects.create(
+            assignment_group=self.group, assignment=self.stray, position=1)
+        self.assertNotEqual(etag, get_catalog_etag(self.course.pk))
+        self.assertEqual([], get_catalog(self.course.pk).strays())
+        etag = get_catalog_etag(self.course.pk)
+        self.group.delete()
+        self.assertNotEqual(etag, get_catalog_etag(self.course.pk))
+        self.assertEqual(2, len(get_catalog(self.course.pk).strays()))
+
+    def test_etag(self):
+        self.login()
+        response = self.client.get(reverse("lti_catalog"))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()["assignments"]))
+        etag = response["ETag"]
+        response = self.client.get(reverse("lti_catalog"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.stray.delete()
+        response = self.client.get(reverse("lti_catalog"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()["assignments"]))
+
+    def test_check_assignments(self):
+        self.grouped.body = "Print hello"
+        self.grouped.save()
+        self.login()
+        assignments = self.client.get(
+            reverse("lti_check_assignments")).json()["assignments"]
+        # like Assignment.by_course, without maze levels
+        [assignment] = assignments
+        self.assertEqual(self.grouped.to_dict(), {
+            k: v for k, v in assignment.items()
+            if k in self.grouped.to_dict()})
+
+    def test_assignment_versions(self):
+        self.assertEqual({self.grouped.pk: 0, self.stray.pk: 0},
+                         get_assignment_versions(self.course.pk))
+        with self.assertNumQueries(0):
+            get_assignment_versions(self.course.pk)
+        Assignment.edit(self.grouped.pk, on_run="pass", expected_version=0)
+        self.assertEqual(1, get_assignment_versions(self.course.pk)[
+            self.grouped.pk])
+
+    def test_share_and_batch_edit(self):
+        self.login()
+        for url, template in (("lti_share", "lti/select.html"),
+                              ("lti_batch_edit", "lti/batch.html")):
+            with mock.patch("lti_django_skeleton.views.render",
+                            return_value=HttpResponse()) as render:
+                self.assertEqual(200,
+                                 self.client.get(reverse(url)).status_code)
+            request, rendered, context = render.call_args[0]
+            self.assertEqual(template, rendered)
+            self.assertEqual(self.lti_user.user, request.user)
+        self.assertEqual(2, len(context["assignments"]))
+
+    def test_shared_cache_check(self):
+        with self.settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "lti_cache"}}):
+            self.assertEqual([], check_catalog_cache(None))
+        self.assertEqual(["lti_django_skeleton.E001"],
+                         [e.id for e in check_catalog_cache(None)])
+
+
+class AutosaverTestCase(CourseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+        history_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, history_dir)
+        self.history = CodeHistory(history_dir)
+        self.key = (self.lti_user.pk, self.assignment.pk)
+
+    def _submission(self):
+        return Submission.objects.get(user=self.lti_user,
+                                      assignment=self.assignment)
+
+    def test_coalesced(self):
+        autosaver = Autosaver(self.journal_dir, flush_interval=None,
+                              history=self.history)
+        with self.assertNumQueries(0):
+            for i in range(3):
+                autosaver.save(*self.key, code="print({})".format(i),
+                               assignment_version=0)
+        self.assertEqual(1, len(os.listdir(self.journal_dir)))
+        autosaver.flush()
+        self.assertEqual([], os.listdir(self.journal_dir))
+        submission = self._submission()
+        self.assertEqual("print(2)", submission.code)
+        self.assertEqual(2, submission.version)
+
+        autosaver.save(*self.key, code="print(3)", assignment_version=0)
+        autosaver.save(*self.key, code="print(4)", assignment_version=0)
+        autosaver.flush_submissions([self.key])
+        submission = self._submission()
+        self.assertEqual("print(4)", submission.code)
+        self.assertEqual(4, submission.version)
+        with self.assertNumQueries(0):
+            autosaver.flush_submissions([self.key])
+        self.assertEqual(["print({})".format(i) for i in range(5)], [
+            snapshot.code for snapshot in self.history.snapshots(
+                self.assignment.pk, self.lti_user.pk)])
+
+    def test_replay(self):
+        # an earlier process with our pid, cut off mid-record
+        crashed = os.path.join(
+            self.journal_dir, "{}-{}-crashed-00000000.journal".format(
+                socket.gethostname(), os.getpid()))
+        with open(crashed, "w") as segment:
+            for i in range(2):
+                segment.write(json.dumps({
+                    "user": self.key[0], "assignment": self.key[1],
+                    "version": 0, "code": "print({})".format(i),
+                    "time": 1000.0 + i}) + "\n")
+            segment.write('{"user": 1, "assig')
+        Autosaver(self.journal_dir, flush_interval=None,
+                  history=self.history)
+        self.assertEqual([], os.listdir(self.journal_dir))
+        self.assertEqual("print(1)", self._submission().code)
+        self.assertEqual(["print(0)", "print(1)"], [
+            snapshot.code for snapshot in self.history.snapshots(
+                self.assignment.pk, self.lti_user.pk)])
+
+    def test_older_than_submission(self):
+        autosaver = Autosaver(self.journal_dir, flush_interval=None,
+                              history=self.history)
+        autosaver.save(*self.key, code="print(0)", assignment_version=0)
+        autosaver.flush()
+        # buffered here, then another tab saves with compare-and-swap
+        autosaver.save(*self.key, code="print(1)", assignment_version=0)
+        with mock.patch.object(Submission, "log_code"):
+            Submission.save_code(*self.key, code="print(2)",
+                                 assignment_version=0, expected_version=0)
+        autosaver.flush()
+        submission = self._submission()
+        self.assertEqual(("print(2)", 1), (submission.code, submission.version))
+        autosaver.save(*self.key, code="print(3)", assignment_version=0)
+        autosaver.flush()
+        self.assertEqual("print(3)", self._submission().code)
+
+    def test_sync_outside_lock(self):
+        autosaver = Autosaver(self.journal_dir, flush_interval=None,
+                              history=self.history)
+        locked = []
+        with mock.patch("lti_django_skeleton.autosave.os.fsync",
+                        side_effect=lambda fd: locked.append(
+                            autosaver._lock.locked())):
+            autosaver.save(*self.key, code="print(0)", assignment_version=0)
+            self.assertEqual([False], locked)
+            # one fsync covers every record written before it
+            journal = autosaver.journal
+            first = journal.append(*self.key, "print(1)", 0, 1.0)
+            second = journal.append(*self.key, "print(2)", 0, 2.0)
+            journal.sync(second)
+            journal.sync(first)
+            self.assertEqual(2, len(locked))
+
+    def test_flush_submissions_waits_for_running_flush(self):
+        autosaver = Autosaver(self.journal_dir, flush_interval=None,
+                              history=self.history)
+        autosaver.save(*self.key, code="print(0)", assignment_version=0)
+        writing, release = threading.Event(), threading.Event()
+        written = []
+
+        def slow_write(pending):
+            writing.set()
+            release.wait(5)
+            written.extend(pending)
+            return 0
+        with mock.patch("lti_django_skeleton.autosave.write_pending",
+                        slow_write):
+            flusher = threading.Thread(target=autosaver.flush)
+            flusher.start()
+            writing.wait(5)
+            reader = threading.Thread(target=autosaver.flush_submissions,
+                                      args=([self.key],))
+            reader.start()
+            reader.join(0.2)
+            # the save is out of the buffer but not in the database yet
+            self.assertTrue(reader.is_alive())
+            release.set()
+            flusher.join()
+            reader.join()
+        self.assertEqual([self.key], written)
+
+    def test_orphans_of_this_host_only(self):
+        journal = Journal(self.journal_dir)
+        journal.host = "web"
+        names = ["web-999999-abcdef12-00000000.journal",
+                 "web-2-999999-abcdef12-00000000.journal",
+                 "web-999999-abcdef12-claimed-00000001.journal"]
+        for name in names:
+            open(os.path.join(self.journal_dir, name), "w").close()
+        with mock.patch("lti_django_skeleton.autosave._process_alive",
+                        return_value=False):
+            orphans = journal.orphaned_segments()
+        self.assertEqual(sorted([names[0], names[2]]),
+                         [os.path.basename(path) for path in orphans])
+
+    def test_replayed_once(self):
+        crashed = os.path.join(
+            self.journal_dir, "{}-{}-crashed-00000000.journal".format(
+                socket.gethostname(), os.getpid()))
+        with open(crashed, "w") as segment:
+            for i in range(2):
+                segment.write(json.dumps({
+                    "user": self.key[0], "assignment": self.key[1],
+                    "version": 0, "code": "print({})".format(i),
+                    "time": 1000.0 + i}) + "\n")
+        # two workers starting together both see the orphan
+        first, second = Journal(self.journal_dir), Journal(self.journal_dir)
+        orphans = first.orphaned_segments()
+        with mock.patch.object(Journal, "orphaned_segments",
+                               return_value=orphans):
+            self.assertEqual(1, replay_segments(first.claim_orphans(),
+                                                self.history))
+            self.assertEqual(0, replay_segments(second.claim_orphans(),
+                                                self.history))
+        self.assertEqual([], os.listdir(self.journal_dir))
+        self.assertEqual(1, self._submission().version)
+        self.assertEqual(2, len(list(self.history.snapshots(
+            self.assignment.pk, self.lti_user.pk))))
+
+
+class EventQueueTestCase(CourseMixin, TestCase):
+    def _event(self, i, assignment_id=None):
+        return Event(self.lti_user.pk, assignment_id or self.assignment.pk,
+                     "editor", "run {}".format(i), timezone.now())
+
+    def test_batched(self):
+        events = EventQueue(maxsize=5, batch_size=3, flush_interval=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(5, events.offer(
+                [self._event(i) for i in range(7)]))
+        # each batch checks its assignments and inserts in one go
+        with self.assertNumQueries(4):
+            events.flush()
+        events.offer([self._event(5, assignment_id=self.assignment.pk + 1),
+                      self._event(6)])
+        events.flush()
+        self.assertEqual(["run {}".format(i) for i in (0, 1, 2, 3, 4, 6)],
+                         list(Log.objects.order_by("pk")
+                                         .values_list("action", flat=True)))
+        self.assertEqual({"accepted": 7, "refused": 2, "written": 6,
+                          "discarded": 1, "queued": 0}, events.stats())
+
+    def test_arrival_time(self):
+        arrived = timezone.now() - datetime.timedelta(seconds=30)
+        with mock.patch("lti_django_skeleton.events.timezone.now",
+                        return_value=arrived):
+            event = parse_event(self.lti_user.pk, {
+                "question_id": self.assignment.pk, "event": "editor",
+                "action": "run"})
+        events = EventQueue(flush_interval=None)
+        events.offer([event])
+        events.flush()
+        self.assertEqual(arrived, Log.objects.get().date_created)
+
+    def test_endpoint(self):
+        self.login()
+        events = EventQueue(maxsize=2, flush_interval=None)
+        with mock.patch("lti_django_skeleton.views.get_event_queue",
+                        return_value=events):
+            response = self.client.post(
+                reverse("lti_save_events"),
+                json.dumps([{"question_id": self.assignment.pk,
+                             "event": "editor", "action": "run"}] * 3),
+                content_type="application/json")
+            self.assertEqual(503, response.status_code)
+            self.assertEqual(2, response.json()["accepted"])
+            self.assertIn("Retry-After", response)
+            response = self.client.post(reverse("lti_save_events"),
+                                        "[{}]", content_type="application/json")
+            self.assertEqual(400, response.status_code)
+            events.flush()
+            response = self.client.post(reverse("lti_save_events"), {
+                "question_id": self.assignment.pk, "event": "editor",
+                "action": "submit"})
+            self.assertEqual(200, response.status_code)
+            events.flush()
+        self.assertEqual(["run", "run", "submit"], list(
+            Log.objects.order_by("pk").values_list("action", flat=True)))
+
+
+class LogPartitionTestCase(CourseMixin, TestCase):
+    def _log(self, date_created):
+        log = Log.objects.create(event="editor", action="run",
+                                 assignment=self.assignment, user=self.lti_user)
+        Log.objects.filter(pk=log.pk).update(date_created=date_created)
+        return log
+
+    def test_partitions(self):
+        self.assertIn(month_start(timezone.now()), log_partitions())
+        # past the partitions made so far, so it lands in the default one
+        log = self._log(datetime.datetime(2040, 1, 15, tzinfo=timezone.utc))
+        self.assertNotIn(datetime.date(2040, 1, 1), log_partitions())
+        with mock.patch("lti_django_skeleton.management.commands."
+                        "log_partitions.timezone.now",
+                        return_value=datetime.datetime(
+                            2039, 12, 1, tzinfo=timezone.utc)):
+            call_command("log_partitions", ahead=1, stdout=io.StringIO())
+        self.assertIn(datetime.date(2040, 1, 1), log_partitions())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM lti_django_skeleton_log_y2040m01")
+            self.assertEqual([(log.pk,)], cursor.fetchall())
+
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        # partitions with pending foreign key checks cannot be dropped
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        with mock.patch("lti_django_skeleton.management.commands."
+                        "log_partitions.timezone.now",
+                        return_value=datetime.datetime(
+                            2040, 3, 1, tzinfo=timezone.utc)):
+            call_command("log_partitions", ahead=0, retain=1,
+                         archive_dir=archive_dir, stdout=io.StringIO())
+        self.assertEqual(datetime.date(2040, 3, 1), log_partitions()[0])
+        self.assertFalse(Log.objects.filter(pk=log.pk).exists())
+        with gzip.open(os.path.join(
+                archive_dir, "lti_django_skeleton_log_y2040m01.csv.gz"),
+                "rt") as archive:
+            rows = list(csv.DictReader(archive))
+        self.assertEqual([str(log.pk)], [row["id"] for row in rows])
+
+    def test_archive_after_failed_dump(self):
+        month = datetime.date(2040, 1, 1)
+        create_log_partition(month)
+        log = self._log(datetime.datetime(2040, 1, 15, tzinfo=timezone.utc))
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        with mock.patch("lti_django_skeleton.partitions.gzip.open",
+                        side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                archive_log_partition(month, archive_dir)
+        # the detach stands on its own, the rows stay in the detached table
+        self.assertNotIn(month, log_partitions())
+        self.assertEqual([month], detached_log_partitions())
+        with mock.patch("lti_django_skeleton.management.commands."
+                        "log_partitions.timezone.now",
+                        return_value=datetime.datetime(
+                            2040, 3, 1, tzinfo=timezone.utc)):
+            call_command("log_partitions", ahead=0, retain=1,
+                         archive_dir=archive_dir, stdout=io.StringIO())
+        self.assertEqual([], detached_log_partitions())
+        with gzip.open(os.path.join(
+                archive_dir, "lti_django_skeleton_log_y2040m01.csv.gz"),
+                "rt") as archive:
+            rows = list(csv.DictReader(archive))
+        self.assertEqual([str(log.pk)], [row["id"] for row in rows])
+
+
+class GradeOutboxTestCase(CourseMixin, TestCase):
+    consumer_fields = {"oauth_consumer_key": "key",
+                       "oauth_consumer_secret": "secret"}
+
+    def setUp(self):
+        self.stub = StubOutcomesServer().start()
+        self.addCleanup(self.stub.stop)
+        super().setUp()
+        self.submission = Submission.load(self.lti_user.pk,
+                                          self.assignment.pk)
+        self.sender = OutcomeSender(concurrency=2)
+        self.addCleanup(self.sender.close)
+
+    def launch_params(self):
+        return dict(super().launch_params(),
+                    lis_outcome_service_url=self.stub.url,
+                    lis_result_sourcedid="result1")
+
+    def test_coalesced(self):
+        enqueue_grade(self.lti_user, self.submission, 0.0, "Incomplete")
+        post = enqueue_grade(self.lti_user, self.submission, 1.0, "Success!",
+                             submission_url="http://tool/code/1")
+        self.assertEqual(1, GradePost.objects.count())
+        self.assertEqual(1, post.revision)
+        self.assertEqual(1, self.sender.send_due())
+        self.assertEqual({"result1": 1.0}, self.stub.grades)
+        self.assertEqual(1, self.stub.requests)
+        self.assertIsNotNone(GradePost.objects.get().sent)
+        self.assertEqual(0, self.sender.send_due())
+        # once sent, the next grade is a new post
+        enqueue_grade(self.lti_user, self.submission, 0.5, "Partial")
+        self.assertEqual(2, GradePost.objects.count())
+
+    def test_retry(self):
+        self.stub.fail_first = 1
+        enqueue_grade(self.lti_user, self.submission, 1.0, "Success!",
+                      lis_result_sourcedid="result2")
+        self.sender.send_due()
+        post = GradePost.objects.get()
+        self.assertIsNone(post.sent)
+        self.assertEqual(1, post.attempts)
+        self.assertIn("HTTP 500", post.last_error)
+        self.assertGreater(post.next_attempt, timezone.now())
+        self.assertEqual(0, self.sender.send_due())
+        GradePost.objects.update(next_attempt=timezone.now())
+        self.assertEqual(1, self.sender.send_due())
+        self.assertEqual({"result2": 1.0}, self.stub.grades)
+        self.assertEqual(2, GradePost.objects.get().attempts)
+
+    def test_replaced_while_sending(self):
+        enqueue_grade(self.lti_user, self.submission, 0.0, "Incomplete")
+        claim_due = grades.claim_due
+
+        def claim_and_regrade(limit):
+            claimed = claim_due(limit)
+            enqueue_grade(self.lti_user, self.submission, 1.0, "Success!")
+            return claimed
+        with mock.patch("lti_django_skeleton.grades.claim_due",
+                        claim_and_regrade):
+            self.sender.send_due()
+        pending = GradePost.objects.get()
+        self.assertIsNone(pending.sent)
+        self.assertEqual(1.0, pending.score)
+        self.sender.send_due()
+        self.assertEqual({"result1": 1.0}, self.stub.grades)
+        self.assertEqual(2, self.stub.requests)
+
+
+class HighlightTestCase(CourseMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.submission = Submission.load(self.lti_user.pk,
+                                          self.assignment.pk)
+
+    def test_render_cache(self):
+        render_cache = RenderCache(max_size=10)
+        render_cache.put("a", "aaaa")
+        render_cache.put("b", "bbbb")
+        self.assertEqual("aaaa", render_cache.get("a"))
+        render_cache.put("c", "cccc")
+        self.assertIsNone(render_cache.get("b"))
+        self.assertEqual(8, render_cache.size)
+        render_cache.put("d", "d" * 11)
+        self.assertIsNone(render_cache.get("d"))
+
+    def test_rendered_once_per_version(self):
+        self.submission.code = "print('hello')"
+        self.submission.version = 1
+        self.submission.save()
+        with mock.patch("lti_django_skeleton.highlighting.get_render_cache",
+                        return_value=RenderCache()), \
+                mock.patch("lti_django_skeleton.highlighting.highlight",
+                           return_value="<pre>hello</pre>") as highlight:
+            self.assertEqual("<pre>hello</pre>",
+                             self.submission.highlighted_code())
+            submission = Submission.objects.get(pk=self.submission.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual("<pre>hello</pre>",
+                                 submission.highlighted_code())
+            # the same code in another version comes from the caches
+            submission.version = 2
+            submission.highlighted_code()
+        self.assertEqual(1, highlight.call_count)
+
+    def test_get_submission_code(self):
+        self.submission.code = "print('hello')"
+        self.submission.save()
+        self.login()
+        url = reverse("lti_get_submission_code", args=[self.submission.pk])
+        self.assertEqual(b"print('hello')", self.client.get(url).content)
+        response = self.client.get(url, {"format": "html"})
+        self.assertIn(b'<div class="highlight">', response.content)
+
+
+class ExportTestCase(CourseMixin, TestCase):
+    assignment_fields = None
+
+    def setUp(self):
+        super().setUp()
+        self.learner = self.launch(user_id="bob", roles="Learner",
+                                   context_id="course1",
+                                   context_title="Course 1")
+        other = Course.from_lti("canvas", "course2", "Course 2",
+                                self.lti_user.pk)
+        self.first = self.create_assignment()
+        self.second = self.create_assignment()
+        elsewhere = Assignment.objects.create(owner=self.lti_user,
+                                              course=other)
+        for assignment in (self.first, self.second, elsewhere):
+            submission = Submission.load(self.learner.pk, assignment.pk)
+            submission.code = "print({})".format(assignment.pk)
+            submission.save()
+            Log.objects.create(event="run", action="click",
+                               assignment=assignment, user=self.learner)
+        history_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, history_dir)
+        self.history = CodeHistory(history_dir)
+        patcher = mock.patch("lti_django_skeleton.export.get_code_history",
+                             return_value=self.history)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _records(self, export, format="ndjson"):
+        data = b"".join(export_chunks(export, format))
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def test_ndjson(self):
+        records = self._records(ExportFilter(self.course.pk))
+        self.assertEqual(["submission", "submission", "log", "log"],
+                         [r["type"] for r in records])
+        self.assertEqual([self.first.pk, self.second.pk] * 2,
+                         [r["assignment_id"] for r in records])
+        self.assertEqual("print({})".format(self.first.pk), records[0]["code"])
+        self.assertEqual("bob", records[0]["user__lti_user_id"])
+
+    def test_filters(self):
+        records = self._records(ExportFilter(self.course.pk,
+                                             [self.second.pk]))
+        self.assertEqual([self.second.pk] * 2,
+                         [r["assignment_id"] for r in records])
+        later = timezone.now() + datetime.timedelta(hours=1)
+        self.assertEqual([], self._records(ExportFilter(self.course.pk,
+                                                        since=later)))
+        self.assertEqual(4, len(self._records(ExportFilter(self.course.pk,
+                                                           until=later))))
+
+    def test_zip(self):
+        with mock.patch("lti_django_skeleton.export.CHUNK_SIZE", 1):
+            chunks = list(export_chunks(ExportFilter(self.course.pk), "zip"))
+        self.assertGreater(len(chunks), 2)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(
+            "print({})".format(self.first.pk),
+            archive.read("code/{}/{}.py".format(
+                self.first.pk, self.learner.pk)).decode())
+        logs = archive.read("logs.ndjson").decode().splitlines()
+        self.assertEqual(2, len(logs))
+        submissions = archive.read("submissions.ndjson").decode().splitlines()
+        self.assertNotIn("code", json.loads(submissions[0]))
+
+    def test_history(self):
+        now = timezone.now().timestamp()
+        for assignment in (self.first, self.second):
+            self.history.append(assignment.pk, self.learner.pk, "x = 1",
+                                timestamp=now - 7200)
+            self.history.append(assignment.pk, self.learner.pk, "x = 2",
+                                timestamp=now)
+        records = [r for r in self._records(ExportFilter(self.course.pk))
+                   if r["type"] == "snapshot"]
+        self.assertEqual(["x = 1", "x = 2"] * 2, [r["code"] for r in records])
+        self.assertEqual([self.first.pk] * 2 + [self.second.pk] * 2,
+                         [r["assignment_id"] for r in records])
+        hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        for bounds, code in (({"since": hour_ago}, "x = 2"),
+                             ({"until": hour_ago}, "x = 1")):
+            records = self._records(ExportFilter(
+                self.course.pk, [self.second.pk], **bounds))
+            self.assertEqual([code], [r["code"] for r in records
+                                      if r["type"] == "snapshot"])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(export_chunks(
+            ExportFilter(self.course.pk, [self.first.pk]), "zip"))))
+        lines = archive.read("history/{}/{}.ndjson".format(
+            self.first.pk, self.learner.pk)).decode().splitlines()
+        self.assertEqual(["x = 1", "x = 2"],
+                         [json.loads(line)["code"] for line in lines])
+        self.assertNotIn("history/{}/{}.ndjson".format(
+            self.second.pk, self.learner.pk), archive.namelist())
+
+    def test_history_read_once_per_assignment(self):
+        students = [self.learner.pk, self.lti_user.pk, self.learner.pk + 100]
+        for user_id in students:
+            self.history.append(self.first.pk, user_id, "x = 1")
+        with mock.patch("lti_django_skeleton.history._read_index",
+                        wraps=_read_index) as read_index:
+            records = [r for r in self._records(ExportFilter(
+                self.course.pk, [self.first.pk])) if r["type"] == "snapshot"]
+        self.assertEqual(sorted(students), [r["user_id"] for r in records])
+        # one segment, read for the whole class
+        self.assertEqual(1, read_index.call_count)
+
+    def test_view(self):
+        url = reverse("lti_export")
+        self.login(self.learner)
+        self.assertEqual(403, self.client.get(url).status_code)
+        self.login()
+        self.assertEqual(400, self.client.get(url, {"since": "soon"})
+                                         .status_code)
+        response = self.client.get(url, {"format": "zip"})
+        self.assertTrue(response.streaming)
+        self.assertEqual("application/zip", response["Content-Type"])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(
+            response.streaming_content)))
+        self.assertIn("submissions.ndjson", archive.namelist())
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), "export.ndjson")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command("export_course", str(self.course.pk), "--assignment",
+                     str(self.first.pk), "--output", path)
+        with open(path) as export:
+            self.assertEqual(2, len(export.readlines()))
+
+
+class VersionConflictTestCase(CourseMixin, TestCase):
+    assignment_fields = {"name": "Loops", "type": "parsons"}
+
+    def test_edit(self):
+        assignment = Assignment.edit(self.assignment.pk, on_run="pass",
+                                     expected_version=0)
+        self.assertEqual(1, assignment.version)
+        with self.assertRaises(VersionConflict) as raised:
+            Assignment.edit(self.assignment.pk, on_start="x = 1",
+                            expected_version=0)
+        self.assertEqual(1, raised.exception.current)
+        Assignment.edit(self.assignment.pk, on_start="x = 1")
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        self.assertEqual(("Loops", "parsons", "pass", "x = 1", 2),
+                         (assignment.name, assignment.type, assignment.on_run,
+                          assignment.on_start, assignment.version))
+
+    def test_save_code(self):
+        with mock.patch.object(Submission, "log_code"):
+            submission, is_version_correct = Submission.save_code(
+                self.lti_user.pk, self.assignment.pk, "a = 1", 0,
+                expected_version=0)
+            self.assertEqual((0, True), (submission.version,
+                                         is_version_correct))
+            submission, _ = Submission.save_code(
+                self.lti_user.pk, self.assignment.pk, "a = 2", 0,
+                expected_version=0)
+            self.assertEqual(1, submission.version)
+            with self.assertRaises(VersionConflict) as raised:
+                Submission.save_code(self.lti_user.pk, self.assignment.pk,
+                                     "a = 3", 0, expected_version=0)
+        self.assertEqual(1, raised.exception.current)
+        self.assertEqual("a = 2", Submission.objects.get(pk=submission.pk).code)
+
+    def test_view(self):
+        self.login()
+        url = reverse("lti_save_code")
+        data = {"question_id": self.assignment.pk, "filename": "on_run",
+                "code": "pass", "base_version": 0}
+        response = self.client.post(url, data)
+        self.assertEqual(1, response.json()["version"])
+        response = self.client.post(url, data)
+        self.assertEqual(409, response.status_code)
+        self.assertEqual({"success": False, "conflict": True, "version": 1},
+                         {k: v for k, v in response.json().items()
+                          if k != "message"})
+
+
+class ConcurrentSaveTestCase(CourseMixin, TransactionTestCase):
+    # flushing with CASCADE also empties the partitioned Log table, which
+    # Django's introspection does not list
+    available_apps = ['django.contrib.auth', 'django.contrib.contenttypes',
+                      'ltilaunch', 'lti_django_skeleton']
+
+    def test_one_save_per_version(self):
+        Submission.load(self.lti_user.pk, self.assignment.pk)
+        outcomes = []
+        start_line = threading.Barrier(8)
+
+        def tab(n):
+            try:
+                start_line.wait()
+                Submission.save_code(self.lti_user.pk, self.assignment.pk,
+                                     "print({})".format(n), 0,
+                                     expected_version=0)
+                outcomes.append("print({})".format(n))
+            except VersionConflict:
+                outcomes.append(None)
+            finally:
+                connection.close()
+
+        tabs = [threading.Thread(target=tab, args=(n,)) for n in range(8)]
+        with mock.patch.object(Submission, "log_code"):
+            for t in tabs:
+                t.start()
+            for t in tabs:
+                t.join()
+        saved = [code for code in outcomes if code is not None]
+        self.assertEqual(1, len(saved))
+        submission = Submission.objects.get(assignment=self.assignment)
+        self.assertEqual((saved[0], 1), (submission.code, submission.version))
+
+
+class ExplanationTestCase(CourseMixin, TestCase):
+    assignment_fields = {"mode": "explain"}
+
+    def setUp(self):
+        super().setUp()
+        self.submission = Submission.load(self.lti_user.pk,
+                                          self.assignment.pk)
+        patcher = mock.patch.object(Submission, "log_code")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _answer(self, name, answer):
+        return Submission.save_explanation_answer(
+            self.lti_user.pk, self.assignment.pk, name, answer)
+
+    def test_answer(self):
+        self.submission.save_explanation_code("for x in y:\n    a = x",
+                                              {"FOR_LOOP": [1, 0]})
+        with self.assertNumQueries(1):
+            element = self._answer("FOR_LOOP", "goes through y")
+        self.assertEqual({"line": [1, 0], "present": True,
+                          "answer": "goes through y", "name": "FOR_LOOP"},
+                         element)
+        self.assertIsNone(self._answer("WHILE_LOOP", "?"))
+        submission = Submission.objects.get(pk=self.submission.pk)
+        self.assertEqual("for x in y:\n    a = x", submission.code)
+        self.assertEqual(2, submission.version)
+
+    def test_save_code_keeps_answers(self):
+        self.submission.save_explanation_code(
+            "a = 1\nfor x in y:\n    pass",
+            {"ASSIGNMENT": [1, 0], "FOR_LOOP": [2, 0]})
+        self._answer("FOR_LOOP", "loops")
+        elements = self.submission.save_explanation_code(
+            "for x in y:\n    pass", {"FOR_LOOP": [1, 0]})
+        self.assertFalse(elements["ASSIGNMENT"]["present"])
+        self.assertEqual(([1, 0], True, "loops"),
+                         (elements["FOR_LOOP"]["line"],
+                          elements["FOR_LOOP"]["present"],
+                          elements["FOR_LOOP"]["answer"]))
+
+    def test_load_explanation(self):
+        self.submission.save_explanation_code(
+            "code", {"ASSIGNMENT": [1, 0], "FOR_LOOP": [2, 0],
+                     "LIST_APPEND": [2, 4], "CORGIS_USE": [3, 0]})
+        code, elements = self.submission.load_explanation(2)
+        self.assertEqual("code", code)
+        self.assertEqual(["CORGIS_USE", "FOR_LOOP"],
+                         [e["name"] for e in elements])
+        code, elements = self.submission.load_explanation(5)
+        # LIST_APPEND shares its line with FOR_LOOP
+        self.assertEqual(["CORGIS_USE", "FOR_LOOP", "ASSIGNMENT"],
+                         [e["name"] for e in elements])
+
+
+class CodeHistoryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.history = CodeHistory(self.directory, segment_size=200)
+
+    def test_snapshots(self):
+        for i in range(20):
+            self.history.append(7, i % 2, "print({})".format(i),
+                                timestamp=1000.0 + i)
+        self.assertGreater(len(os.listdir(os.path.join(self.directory, "7"))),
+                           3, "segments should roll")
+        self.assertEqual(["print({})".format(i) for i in range(1, 20, 2)], [
+            s.code for s in self.history.snapshots(7, 1)])
+        self.assertEqual([1004.0, 1006.0], [
+            s.timestamp for s in self.history.snapshots(
+                7, 0, since=1003.0, until=1006.0)])
+        self.assertEqual([], list(self.history.snapshots(8, 0)))
+
+    def test_assignment_snapshots(self):
+        for i in range(20):
+            self.history.append(7, i % 2, "print({})".format(i),
+                                timestamp=1000.0 + i)
+        students = self.history.assignment_snapshots(7, since=1015.0)
+        students = [(user_id, [s.code for s in snapshots])
+                    for user_id, snapshots in students]
+        self.assertEqual([(0, ["print(16)", "print(18)"]),
+                          (1, ["print(15)", "print(17)", "print(19)"])],
+                         students)
+
+    def test_deltas(self):
+        history = CodeHistory(self.directory, keyframe_interval=4)
+        code = "def f():\n    return 1\n"
+        revisions = []
+        for i in range(10):
+            code = code.replace("return", "x = {}\n    return".format(i), 1)
+            revisions.append(code)
+            history.append(7, 1, code, timestamp=1000.0 + i)
+        history.append(7, 2, "other", timestamp=1000.5)
+        # a rewrite goes in as a keyframe
+        revisions.append("print('hi')")
+        history.append(7, 1, revisions[-1], timestamp=1010.0)
+        self.assertEqual(revisions,
+                         [s.code for s in history.snapshots(7, 1)])
+        with open(os.path.join(self.directory, "7", "00000000.seg"),
+                  "rb") as data:
+            kinds = [record[0] for record in iter(
+                lambda: _read_record(data), None)]
+        self.assertEqual([0, 1, 1, 1, 0, 1, 1, 1, 0, 1, 0, 0], kinds)
+        # a fresh process keyframes first, then deltas against its own writes
+        reopened = CodeHistory(self.directory, keyframe_interval=4)
+        reopened.append(7, 1, revisions[-1] + "\n", timestamp=1011.0)
+        self.assertEqual(revisions[-1] + "\n",
+                         reopened.snapshot_at(7, 1, 1011.0).code)
+
+    def test_snapshot_at(self):
+        for i in range(5):
+            self.history.append(7, 1, "print({})".format(i),
+                                timestamp=1000.0 + i)
+        self.assertIsNone(self.history.snapshot_at(7, 1, 999.0))
+        snapshot = self.history.snapshot_at(7, 1, 1002.5)
+        self.assertEqual((1002.0, "print(2)"),
+                         (snapshot.timestamp, snapshot.code))
+        self.assertEqual("print(4)", self.history.snapshot_at(7, 1, 2000).code)
+
+    def test_written_out_of_order(self):
+        # a flush, then an older save replayed from a crashed journal
+        for timestamp in (1000.0, 1003.0, 1001.0, 1002.0):
+            self.history.append(7, 1, "print({})".format(int(timestamp)),
+                                timestamp=timestamp)
+        self.assertEqual([1000.0, 1001.0, 1002.0, 1003.0], [
+            s.timestamp for s in self.history.snapshots(7, 1)])
+        self.assertEqual([1001.0, 1002.0], [
+            s.timestamp for s in self.history.snapshots(
+                7, 1, since=1000.5, until=1002.5)])
+        self.assertEqual("print(1001)",
+                         self.history.snapshot_at(7, 1, 1001.5).code)
+        self.assertEqual([[1000.0, 1001.0, 1002.0, 1003.0]], [
+            [s.timestamp for s in snapshots]
+            for _, snapshots in self.history.assignment_snapshots(7)])
+
+    def test_rebuild_index(self):
+        for i in range(5):
+            self.history.append(7, 1, "print({})".format(i))
+        for name in os.listdir(os.path.join(self.directory, "7")):
+            if name.endswith(".idx"):
+                os.remove(os.path.join(self.directory, "7", name))
+        self.assertEqual([], list(self.history.snapshots(7, 1)))
+        self.history.rebuild_index(7)
+        self.assertEqual(5, len(list(self.history.snapshots(7, 1))))
+
+    def test_import_code_logs(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        user_dir = os.path.join(source, "7", "1")
+        os.makedirs(user_dir)
+        os.makedirs(os.path.join(source, "history"))
+        for i, name in enumerate(["20170901-120000.py",
+                                  "20170901-120005.py"]):
+            with open(os.path.join(user_dir, name), "w") as code_file:
+                code_file.write("print({})".format(i))
+        with mock.patch("lti_django_skeleton.management.commands."
+                        "import_code_logs.get_code_history",
+                        return_value=self.history):
+            call_command("import_code_logs", source=source, delete=True,
+                         stdout=io.StringIO())
+        snapshots = list(self.history.snapshots(7, 1))
+        self.assertEqual(["print(0)", "print(1)"], [s.code for s in snapshots])
+        self.assertEqual(5.0, snapshots[1].timestamp - snapshots[0].timestamp)
+        self.assertFalse(os.path.exists(user_dir))
@@ -20,6 +20,8 @@ urlpatterns = [
         name='lti_select'),
     url(r'^check_assignments$', views.check_assignments,
         name='lti_check_assignments'),
+    url(r'^catalog$', views.catalog,
+        name='lti_catalog'),
     url(r'^save_code$', views.save_code,
         name='lti_save_code'),
     url(r'^save_events', views.save_events,
@@ -44,6 +46,8 @@ urlpatterns = [
         name='lti_batch_edit'),
     url(r'^dashboard$', views.dashboard,
         name='lti_dashboard'),
+    url(r'^export$', views.export,
+        name='lti_export'),
     url(r'^share$', views.share,
         name='lti_share'),
     url(r'^shared$', views.shared,
@@ -1,7 +1,10 @@
+import json
+
 from django.views.generic import View
 from django.urls import reverse
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.utils.html import MLStripper
@@ -10,9 +13,22 @@ from urllib.parse import urlencode
 
 
 from lti import ToolConfig
+from lti_django_skeleton.autosave import get_autosaver
+from lti_django_skeleton.catalog import (
+    get_assignment_versions, get_catalog, get_catalog_etag)
+from lti_django_skeleton.events import get_event_queue, parse_event
+from lti_django_skeleton.export import (
+    CONTENT_TYPES, FORMATS, ExportFilter, export_chunks, parse_bound)
+from lti_django_skeleton.grades import enqueue_grade
+from lti_django_skeleton.middleware import get_launch_context
 from lti_django_skeleton.models import Role, Course
 from ltilaunch.models import LTIUser
-from lti_django_skeleton.models import Assignment, AssignmentGroup, Submission
+from lti_django_skeleton.models import (Assignment, AssignmentGroup,
+                                        Submission, VersionConflict)
+
+MAX_EVENTS_PER_REQUEST = 1000
+# seconds a client should wait before resending refused events
+EVENT_RETRY_AFTER = 2
 
 def strip_tags(html):
     s = MLStripper()
@@ -37,19 +53,17 @@ def ensure_canvas_arguments(request):
     """
     Returns roles and course of the current user.
 
+    The LTI user and course are resolved once per launch and set on the
+    request by lti_django_skeleton.middleware.LaunchContextMiddleware, or
+    resolved here for requests that did not pass through it.
+
     :param request: the incoming HttpRequest
     :return: roles and course of user
     """
-    user = LTIUser.objects.get(user=request.user)
-    roles = user.last_launch_parameters.get("roles", "")
-    context_id = user.last_launch_parameters.get("context_id", "")
-    context_title = user.last_launch_parameters.get("context_title", "")
-    course = Course.from_lti("canvas",
-                             context_id,
-                             context_title,
-                             user.id)
-
-    return user, roles, course
+    context = getattr(request, 'lti_context', None)
+    if context is None:
+        return get_launch_context(request)
+    return context
 
 
 class ConfigView(View):
@@ -95,10 +109,13 @@ def index(request):
     # Assignment group or individual assignment?
     if assignment_group_id is not None:
         group = AssignmentGroup.by_id(assignment_group_id)
-        assignments = group.get_assignments()
-        submissions = [a.get_submission(user.id) for a in assignments]
+        assignments = list(group.get_assignments())
+        get_autosaver().flush_submissions(
+            [(user.id, a.id) for a in assignments])
+        submissions = Submission.load_many(user.id, assignments)
     elif assignment_id is not None:
         assignments = [Assignment.by_id(assignment_id)]
+        get_autosaver().flush_submissions([(user.id, assignments[0].id)])
         submissions = [assignments[0].get_submission(user.id)]
     else:
         return error()
@@ -124,7 +141,7 @@ def index(request):
         return render(request, 'lti/explain.html', context)
     else:
         context = {
-            'group': zip(assignments, submissions),
+            'group': list(zip(assignments, submissions)),
             'user_id': user.id
         }
         return render(request, 'lti/index.html', context)
@@ -138,11 +155,11 @@ def select(request):
     :return: the select.html template rendered
     """
     user, roles, course = ensure_canvas_arguments(request)
-    assignments = Assignment.by_course(course.id, exclude_builtins=True)
-    groups = [(group, group.get_assignments())
-              for group in AssignmentGroup.by_course(course.id)]
-    strays = AssignmentGroup.get_ungrouped_assignments(course.id)
-    return_url = user.last_launch_parameters.get('launch_presentation_return_url', None)
+    catalog = get_catalog(course.id)
+    assignments = catalog.assignments(exclude_builtins=True)
+    groups = catalog.groups()
+    strays = catalog.strays()
+    return_url = user.return_url or None
 
     context = {
         'assignments': assignments,
@@ -161,77 +178,185 @@ def check_assignments(request):
     Unused.
     """
     # Store current user_id and context_id
-    user, roles, course = ensure_canvas_arguments()
-    assignments = Assignment.by_course(course.id)
+    user, roles, course = ensure_canvas_arguments(request)
     return JsonResponse({
         'success': True,
-        'assignments': [a.to_dict() for a in assignments]
+        'assignments': get_catalog(course.id).assignments(
+            exclude_builtins=True)
     })
 
+
+def _catalog_etag(request):
+    user, roles, course = ensure_canvas_arguments(request)
+    return get_catalog_etag(course.id)
+
+
+@login_required
+@condition(etag_func=_catalog_etag)
+def catalog(request):
+    """
+    The course's assignments, groups and ungrouped assignments as JSON.
+
+    Responds 304 Not Modified while the client's If-None-Match ETag is
+    still the course's content version, so it is cheap to poll.
+
+    :param request: HttpRequest
+    :return: the catalog as JSON
+    """
+    user, roles, course = ensure_canvas_arguments(request)
+    return JsonResponse(get_catalog(course.id).data)
+
+def _base_version(request):
+    """The version the client's change is based on, if it sent one."""
+    base_version = request.POST.get('base_version', '')
+    return int(base_version) if base_version else None
+
+def _conflict(conflict):
+    """Tells the client its change lost to one saved since it loaded."""
+    return JsonResponse({
+        'success': False,
+        'conflict': True,
+        'version': conflict.current,
+        'message': "Saved elsewhere since you loaded it."
+    }, status=409)
+
 @login_required
 def save_code(request):
-    assignment_id = request.form.get('question_id', None)
-    assignment_version = int(request.form.get('version', -1))
+    """
+    Autosave endpoint for the editor.
+
+    Student code is journaled and buffered, and reaches the database in
+    batches, see lti_django_skeleton.autosave.  A client that sends the
+    ``base_version`` its code is based on, of the submission or, for
+    instructor files, of the assignment, is saved right away instead, and
+    gets a 409 with the current version if another tab or instructor saved
+    first.
+
+    :param request: HttpRequest
+    :return: JSON with success and whether the assignment version matched
+    """
+    assignment_id = request.POST.get('question_id', None)
+    assignment_version = int(request.POST.get('version', -1))
     if assignment_id is None:
         return JsonResponse({
             'success': False,
             'message': "No Assignment ID given!"
         })
-    code = request.form.get('code', '')
-    filename = request.form.get('filename', '__main__')
-    user = User.from_lti("canvas", session["pylti_user_id"],
-                         session.get("user_email", ""),
-                         session.get("lis_person_name_given", ""),
-                         session.get("lis_person_name_family", ""))
+    assignment_id = int(assignment_id)
+    code = request.POST.get('code', '')
+    filename = request.POST.get('filename', '__main__')
+    base_version = _base_version(request)
+    user, roles, course = ensure_canvas_arguments(request)
     is_version_correct = True
-    if filename == "__main__":
-        submission, is_version_correct = Submission.save_code(user.id, assignment_id, code, assignment_version)
-    elif User.is_lti_instructor(session["roles"]):
-        if filename == "on_run":
-            Assignment.edit(assignment_id=assignment_id, on_run=code)
-        elif filename == "on_change":
-            Assignment.edit(assignment_id=assignment_id, on_step=code)
-        elif filename == "starting_code":
-            Assignment.edit(assignment_id=assignment_id, on_start=code)
-    return JsonResponse({
+    version = None
+    try:
+        if filename == "__main__" and base_version is None:
+            get_autosaver().save(user.id, assignment_id, code,
+                                 assignment_version)
+            current = get_assignment_versions(course.id).get(assignment_id)
+            if current is not None:
+                is_version_correct = (assignment_version == current)
+        elif filename == "__main__":
+            # older saves buffered in this process count towards the version
+            get_autosaver().flush_submissions([(user.id, assignment_id)])
+            submission, is_version_correct = Submission.save_code(
+                user.id, assignment_id, code, assignment_version,
+                expected_version=base_version)
+            version = submission.version
+        elif LTIUser.is_lti_instructor(roles):
+            files = {'on_run': 'on_run', 'on_change': 'on_step',
+                     'starting_code': 'on_start'}
+            if filename in files:
+                assignment = Assignment.edit(
+                    assignment_id=assignment_id, expected_version=base_version,
+                    **{files[filename]: code})
+                version = assignment.version
+    except VersionConflict as conflict:
+        return _conflict(conflict)
+    response = {
         'success': True,
         'is_version_correct': is_version_correct
-    })
+    }
+    if version is not None:
+        response['version'] = version
+    return JsonResponse(response)
 
 @login_required
 def save_events(request):
-    assignment_id = request.form.get('question_id', None)
-    event = request.form.get('event', "blank")
-    action = request.form.get('action', "missing")
-    if assignment_id is None:
+    """
+    Clickstream endpoint for the editor.
+
+    Takes a JSON array of events, each with question_id, event and action,
+    or a single event as form fields.  Events are queued and written in
+    batches, see lti_django_skeleton.events.  If the queue is full, only
+    the first ``accepted`` events are kept and the client should send the
+    rest again after Retry-After seconds.
+
+    :param request: HttpRequest
+    :return: JSON with success and the number of events accepted
+    """
+    user, roles, course = ensure_canvas_arguments(request)
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except ValueError:
+            data = None
+        if not isinstance(data, list):
+            return JsonResponse({
+                'success': False,
+                'message': "Expected a JSON array of events!"
+            }, status=400)
+    else:
+        data = [request.POST]
+    if len(data) > MAX_EVENTS_PER_REQUEST:
         return JsonResponse({
             'success': False,
-            'message': "No Assignment ID given!"
-        })
-    user = User.from_lti("canvas", session["pylti_user_id"],
-                         session.get("user_email", ""),
-                         session.get("lis_person_name_given", ""),
-                         session.get("lis_person_name_family", ""))
-    log = Log.new(event, action, assignment_id, user.id)
+            'message': "At most {} events per request!".format(
+                MAX_EVENTS_PER_REQUEST)
+        }, status=400)
+    try:
+        events = [parse_event(user.id, d) for d in data]
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+    accepted = get_event_queue().offer(events)
+    if accepted < len(events):
+        response = JsonResponse({
+            'success': False,
+            'accepted': accepted,
+            'message': "Too many events, try again later."
+        }, status=503)
+        response['Retry-After'] = str(EVENT_RETRY_AFTER)
+        return response
     return JsonResponse({
-        'success': True
+        'success': True,
+        'accepted': accepted
     })
 
 @login_required
 def save_correct(request):
-    assignment_id = request.form.get('question_id', None)
-    status = float(request.form.get('status', "0.0"))
-    lis_result_sourcedid = request.form.get('lis_result_sourcedid', None)
+    """
+    Records whether a submission is correct and queues its grade.
+
+    The grade reaches the LMS through the send_grades worker, see
+    lti_django_skeleton.grades.
+
+    :param request: HttpRequest
+    :return: JSON with success
+    """
+    assignment_id = request.POST.get('question_id', None)
+    status = float(request.POST.get('status', "0.0"))
+    lis_result_sourcedid = request.POST.get('lis_result_sourcedid', None)
     if assignment_id is None:
         return JsonResponse({
             'success': False,
             'message': "No Assignment ID given!"
         })
-    user = User.from_lti("canvas", session["pylti_user_id"],
-                         session.get("user_email", ""),
-                         session.get("lis_person_name_given", ""),
-                         session.get("lis_person_name_family", ""))
+    user, roles, course = ensure_canvas_arguments(request)
     assignment = Assignment.by_id(assignment_id)
+    get_autosaver().flush_submissions([(user.id, assignment.id)])
     if status == 1:
         submission = Submission.save_correct(user.id, assignment_id)
     else:
@@ -240,16 +365,22 @@ def save_correct(request):
         message = "Success!"
     else:
         message = "Incomplete"
-    url = url_for('lti_assignments.get_submission_code', submission_id=submission.id, _external=True)
     if lis_result_sourcedid is None:
         return JsonResponse({
             'success': False,
             'message': "Not in a grading context."
         })
     if assignment.mode == 'maze':
-        lti.post_grade(float(submission.correct), "<h1>{0}</h1>".format(message), endpoint=lis_result_sourcedid);
+        enqueue_grade(user, submission, float(submission.correct), message,
+                      include_code=False,
+                      lis_result_sourcedid=lis_result_sourcedid)
     else:
-        lti.post_grade(float(submission.correct), "<h1>{0}</h1>".format(message)+"<div>Latest work in progress: <a href='{0}' target='_blank'>View</a></div>".format(url)+"<div>Touches: {0}</div>".format(submission.version)+"Last ran code:<br>"+highlight(submission.code, PythonLexer(), HtmlFormatter()), endpoint=lis_result_sourcedid)
+        url = request.build_absolute_uri(
+            reverse('lti_get_submission_code', args=[submission.id]) +
+            '?format=html')
+        enqueue_grade(user, submission, float(submission.correct), message,
+                      submission_url=url,
+                      lis_result_sourcedid=lis_result_sourcedid)
     return JsonResponse({
         'success': True
     })
@@ -258,27 +389,38 @@ def save_correct(request):
 def get_submission_code(request, submission_id):
     user, roles, course = ensure_canvas_arguments(request)
     submission = Submission.objects.get(pk=submission_id)
-    if LTIUser.is_lti_instructor(roles) or submission.user.id == user.id:
-        return HttpResponse(submission.code) if submission.code else "#No code given!"
+    if LTIUser.is_lti_instructor(roles) or submission.user_id == user.id:
+        if request.GET.get('format') == 'html':
+            return HttpResponse(submission.highlighted_code())
+        return HttpResponse(submission.code) if submission.code else HttpResponse("#No code given!")
     else:
         return HttpResponse("Sorry, you do not have sufficient permissions to spy!")
 
 @login_required
 def save_presentation(request):
-    assignment_id = request.form.get('question_id', None)
+    assignment_id = request.POST.get('question_id', None)
     if assignment_id is None:
         return JsonResponse({
             'success': False,
             'message': "No Assignment ID given!"
         })
-    presentation = request.form.get('presentation', "")
-    parsons = request.form.get('parsons', "false") == "true"
-    text_first = request.form.get('text_first', "false") == "true"
-    name = request.form.get('name', "")
-    if User.is_lti_instructor(session["roles"]):
-        Assignment.edit(assignment_id=assignment_id, presentation=presentation, name=name, parsons=parsons, text_first=text_first)
+    presentation = request.POST.get('presentation', "")
+    parsons = request.POST.get('parsons', "false") == "true"
+    text_first = request.POST.get('text_first', "false") == "true"
+    name = request.POST.get('name', "")
+    base_version = _base_version(request)
+    user, roles, course = ensure_canvas_arguments(request)
+    if LTIUser.is_lti_instructor(roles):
+        try:
+            assignment = Assignment.edit(
+                assignment_id=assignment_id, presentation=presentation,
+                name=name, parsons=parsons, text_first=text_first,
+                expected_version=base_version)
+        except VersionConflict as conflict:
+            return _conflict(conflict)
         return JsonResponse({
-            'success': True
+            'success': True,
+            'version': assignment.version
         })
     else:
         return JsonResponse({
@@ -288,11 +430,11 @@ def save_presentation(request):
 
 @login_required
 def new_assignment(request, menu):
-user, roles, course = ensure_canvas_arguments(request)
+    user, roles, course = ensure_canvas_arguments(request)
     user = LTIUser.objects.get(pk=1)
     course = Course.objects.get(pk=1)
-   if not LTIUser.is_lti_instructor(roles):
-       return HttpResponse("You are not an instructor in this course.")
+    if not LTIUser.is_lti_instructor(roles):
+        return HttpResponse("You are not an instructor in this course.")
     assignment = Assignment.new(owner_id=user.id, course_id=course.id)
     launch_type = 'lti_launch_url' if menu != 'share' else 'iframe'
     endpoint = 'lti_index' if menu != 'share' else 'lti_shared'
@@ -405,14 +547,14 @@ def batch_edit(request):
     user, roles, course = ensure_canvas_arguments(request)
     if not LTIUser.is_lti_instructor(roles):
         return HttpResponse("You are not an instructor in this course.")
-    assignments = Assignment.by_course(course.id)
+    assignments = get_catalog(course.id).assignments()
 
     context = {
         'assignments': assignments,
         'user_id': user.id,
         'context_id': course.id
     }
-    return render('lti/batch.html', context)
+    return render(request, 'lti/batch.html', context)
 
 @login_required
 def dashboard(request):
@@ -423,6 +565,40 @@ def dashboard(request):
     """
     return HttpResponse("Choose from the below:<ol><li>Test</li></ol>")
 
+@login_required
+def export(request):
+    """
+    Streams the course's submissions, logs and code history to an instructor.
+
+    Takes a ``format`` of ndjson or zip, ``assignment`` ids to export only
+    those, and ISO ``since`` and ``until`` bounds.
+
+    :param request: the Django HttpRequest
+    :return: the export as an attachment, streamed as it is read
+    """
+    user, roles, course = ensure_canvas_arguments(request)
+    if not LTIUser.is_lti_instructor(roles):
+        return JsonResponse({
+            'success': False,
+            'message': "Only instructors can export the course."
+        }, status=403)
+    fmt = request.GET.get('format', 'ndjson')
+    try:
+        if fmt not in FORMATS:
+            raise ValueError("unknown format: {!r}".format(fmt))
+        assignment_ids = [int(a) for a in request.GET.getlist('assignment')]
+        since, until = [parse_bound(request.GET[bound])
+                        if request.GET.get(bound) else None
+                        for bound in ('since', 'until')]
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    chunks = export_chunks(ExportFilter(course.id, assignment_ids, since,
+                                        until), fmt)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = \
+        'attachment; filename="course-{}.{}"'.format(course.id, fmt)
+    return response
+
 @login_required
 def share(request):
     """ render the contents of the staff.html template
@@ -431,11 +607,11 @@ def share(request):
     :return: the staff.html template rendered
     """
     user, roles, course = ensure_canvas_arguments(request)
-    assignments = Assignment.by_course(course.id, exclude_builtins=True)
-    groups = [(group, group.get_assignments())
-              for group in AssignmentGroup.by_course(course.id)]
-    strays = AssignmentGroup.get_ungrouped_assignments(course.id)
-    return_url = user.last_launch_parameters.get('launch_presentation_return_url', '')
+    catalog = get_catalog(course.id)
+    assignments = catalog.assignments(exclude_builtins=True)
+    groups = catalog.groups()
+    strays = catalog.strays()
+    return_url = user.return_url
 
     context = {
         'assignments': assignments,
@@ -444,7 +620,7 @@ def share(request):
         'return_url': return_url,
         'menu': 'share'
     }
-    return render('lti/select.html', context)
+    return render(request, 'lti/select.html', context)
 
 @login_required
 def shared(request):
@@ -455,14 +631,17 @@ def shared(request):
     """
     assignment_id = request.GET.get('assignment_id', None)
     assignment_group_id = request.GET.get('assignment_group_id', None)
-    user, roles, course = ensure_canvas_arguments()
+    user, roles, course = ensure_canvas_arguments(request)
     # Assignment group or individual assignment?
     if assignment_group_id is not None:
         group = AssignmentGroup.by_id(assignment_group_id)
-        assignments = group.get_assignments()
-        submissions = [a.get_submission(user.id) for a in assignments]
+        assignments = list(group.get_assignments())
+        get_autosaver().flush_submissions(
+            [(user.id, a.id) for a in assignments])
+        submissions = Submission.load_many(user.id, assignments)
     elif assignment_id is not None:
         assignments = [Assignment.by_id(assignment_id)]
+        get_autosaver().flush_submissions([(user.id, assignments[0].id)])
         submissions = [assignments[0].get_submission(user.id)]
     else:
         return error()
@@ -474,39 +653,37 @@ def shared(request):
             'level': assignments[0].name,
             'user_id': user.id
         }
-        return render('lti/maze.html', context)
+        return render(request, 'lti/maze.html', context)
     elif assignments[0].mode == 'explain':
         context = {
             'assignment': assignments[0],
             'submission': submissions[0],
             'user_id': user.id
         }
-        return render('lti/explain.html', context)
+        return render(request, 'lti/explain.html', context)
     else:
         context = {
-            'group': zip(assignments, submissions),
+            'group': list(zip(assignments, submissions)),
             'user_id': user.id
         }
-        return render('lti/index.html', context)
+        return render(request, 'lti/index.html', context)
 
 @login_required
 def grade(request):
     """
-    Post grade
+    Marks the submission correct and queues a full grade for the LMS.
 
     :param request: the Django HttpRequest
-    :return: grade rendered by grade.html template
+    :return: whether the grade was queued
     """
-    assignment_id = request.form.get('question_id', None)
+    assignment_id = request.POST.get('question_id', None)
     if assignment_id is None:
         return JsonResponse({
             'success': False,
             'message': "No Assignment ID given!"
         })
-    user = LTIUser.from_lti("canvas", session["pylti_user_id"],
-                         session.get("user_email", ""))
+    user, roles, course = ensure_canvas_arguments(request)
     submission = Submission.save_correct(user.id, assignment_id)
-    if 'lis_result_sourcedid' not in session:
-        return "Failure"
-    lti.post_grade(1, "<h1>Success</h1>"+highlight(submission.code, PythonLexer(), HtmlFormatter()))
+    if enqueue_grade(user, submission, 1.0, "Success") is None:
+        return HttpResponse("Failure")
     return HttpResponse("Successful!")
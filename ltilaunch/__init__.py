@@ -1,2 +1,3 @@
 default_app_config = 'ltilaunch.apps.LTILaunchConfig'
 LTIUSER_SESSION_KEY = "ltilaunch_ltiuser_id"
+LTILAUNCH_SESSION_KEY = "ltilaunch_launch_id"
@@ -6,7 +6,7 @@ from django.forms import Widget
 from django.utils.safestring import mark_safe
 
 from .models import LTIToolConsumer, LTIToolProvider, LTIToolConsumerGroup, \
-    LTIUser
+    LTIUser, LTILaunch
 
 
 class LTIToolConsumerAdmin(admin.ModelAdmin):
@@ -18,7 +18,6 @@ class LTIToolConsumerAdmin(admin.ModelAdmin):
         ('OAuth', {'fields': ('oauth_consumer_key', 'oauth_consumer_secret')}),
         ('LTI User Matching', {'fields': ('consumer_group',
                                           'matcher_class_name')}))
-    exclude = ('recent_nonces',)
     list_display = ('name',)
 
     def get_form(self, request, obj=None, **kwargs):
@@ -76,6 +75,14 @@ class LTILaunchParameterInputs(Widget):
 class LTIUserAdmin(admin.ModelAdmin):
     list_display = ("person_name", "source_lms",
                     "last_launch_course_id")
+    list_select_related = ("lti_tool_consumer", "user")
+    raw_id_fields = ("user", "last_launch")
+
+
+class LTILaunchAdmin(admin.ModelAdmin):
+    list_display = ("lti_user", "launch_time", "context_id", "roles")
+    list_select_related = ("lti_user__user",)
+    raw_id_fields = ("lti_user",)
     formfield_overrides = {
         JSONField: {'widget': LTILaunchParameterInputs}
     }
@@ -84,4 +91,5 @@ class LTIUserAdmin(admin.ModelAdmin):
 admin.site.register(LTIToolConsumer, LTIToolConsumerAdmin)
 admin.site.register(LTIToolProvider, LTIToolProviderAdmin)
 admin.site.register(LTIToolConsumerGroup, admin.ModelAdmin)
-admin.site.register(LTIUser, LTIUserAdmin)
\ No newline at end of file
+admin.site.register(LTIUser, LTIUserAdmin)
+admin.site.register(LTILaunch, LTILaunchAdmin)
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LTILaunchConfig(AppConfig):
     name = 'ltilaunch'
     verbose_name = 'LTI launch configuration'
+
+    def ready(self):
+        from . import checks  # noqa: F401 registers system checks
+        from . import consumers  # noqa: F401 connects invalidation signals
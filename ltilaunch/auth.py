@@ -2,8 +2,9 @@ import logging
 
 from django.contrib.auth import get_user_model
 
-from .utils import headers_from_request
-from .models import get_or_create_lti_user, LTIToolConsumer
+from .consumers import consumer_registry
+from .utils import oauth_headers_from_request
+from .models import get_or_create_lti_user
 from .oauth import validate_lti_launch
 
 logger = logging.getLogger(__name__)
@@ -41,10 +42,8 @@ class LTILaunchBackend:
         tool_guid = launch_request.POST.get(
             'tool_consumer_instance_guid', '')
         result = None
-        try:
-            consumer = LTIToolConsumer.objects.get(
-                oauth_consumer_key=consumer_key)
-        except LTIToolConsumer.DoesNotExist:
+        consumer = consumer_registry.get(consumer_key)
+        if consumer is None:
             logger.error("no LTI consumer found for OAuth consumer key '%s'",
                          consumer_key)
         else:
@@ -58,15 +57,18 @@ class LTILaunchBackend:
                     consumer,
                     launch_request.build_absolute_uri(),
                     launch_request.body,
-                    headers_from_request(launch_request))
+                    oauth_headers_from_request(launch_request))
                 logger.debug("request: %s", req)
                 if not is_valid:
                     logger.error(
                         "LTI launch not valid for OAuth consumer key '%s',"
                         " user_id '%s'", consumer_key, lti_user_id)
                 else:
-                    result = get_or_create_lti_user(
-                        consumer, launch_request.POST).user
+                    lti_user = get_or_create_lti_user(
+                        consumer, launch_request.POST)
+                    # LaunchView reads this instead of looking it up again
+                    launch_request.lti_user = lti_user
+                    result = lti_user.user
         return result
 
     @staticmethod
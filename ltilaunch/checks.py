@@ -0,0 +1,34 @@
+"""System checks for the ltilaunch app."""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# backends whose entries other processes never see: each process keeps
+# its own, or nothing is kept at all
+UNSHARED_CACHES = ('django.core.cache.backends.locmem.LocMemCache',
+                   'django.core.cache.backends.dummy.DummyCache')
+
+
+def shared_cache_errors(alias, purpose, id):
+    """Return an Error if a cache alias is not shared between processes.
+
+    :param purpose: what the cache is used for, completing "the cache
+        holds ..."
+    """
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in UNSHARED_CACHES:
+        return []
+    return [Error(
+        "The '{}' cache uses {}, which does not share entries between "
+        "processes, but it holds {}.".format(alias, backend, purpose),
+        hint="Configure a cache shared by all workers, e.g. "
+             "django.core.cache.backends.db.DatabaseCache.",
+        id=id)]
+
+
+@register()
+def check_consumer_cache(app_configs, **kwargs):
+    from .consumers import consumer_registry
+    return shared_cache_errors(
+        consumer_registry.cache_alias,
+        "the version that tells workers to reload changed consumers",
+        'ltilaunch.E001')
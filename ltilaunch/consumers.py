@@ -0,0 +1,138 @@
+"""In-process registry of LTI tool consumers.
+
+Launches look consumers up by OAuth consumer key on every request, but the
+consumer table is tiny and rarely changes.  Each worker keeps an immutable
+snapshot of every consumer and reloads it only when the shared version
+stored in the Django cache moves, which happens whenever a consumer is saved
+or deleted in any process.  That cache must be shared by all workers; the
+``ltilaunch.E001`` system check rejects a per-process one.
+
+Reading the version is a cache round trip, a query with the database cache,
+so a worker reads it at most every ``LTILAUNCH_CONSUMER_CHECK_INTERVAL``
+seconds and most launches resolve their consumer without any I/O.  Changes
+made in another worker are therefore seen within that interval, except that
+an unknown key always checks the version, so a new consumer can launch at
+once.  Changes made in the same worker are seen immediately.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .matchers import warm_matchers
+from .models import LTIToolConsumer
+
+logger = logging.getLogger(__name__)
+
+# seconds between reads of the shared version
+DEFAULT_CHECK_INTERVAL = 5
+
+ConsumerSnapshot = namedtuple('ConsumerSnapshot', [
+    'pk',
+    'name',
+    'oauth_consumer_key',
+    'oauth_consumer_secret',
+    'tool_consumer_instance_guid',
+    'match_guid_and_consumer',
+    'consumer_group_id',
+    'matcher_class_name',
+])
+
+
+class ConsumerRegistry:
+    version_key = 'ltilaunch:consumers:version'
+
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._version = None
+        # time.monotonic() of the last read of the shared version
+        self._checked = None
+        # (consumers by key, consumer pks by group), swapped as a whole
+        self._state = (MappingProxyType({}), MappingProxyType({}))
+
+    def get(self, consumer_key):
+        """Return the ConsumerSnapshot for a consumer key, or None."""
+        consumer = self._snapshot()[0].get(consumer_key)
+        if consumer is None:
+            # perhaps added in another worker since the last check
+            consumer = self._snapshot(recheck=True)[0].get(consumer_key)
+        return consumer
+
+    def matching_consumer_ids(self, consumer):
+        """Return pks of the consumers whose users may match ``consumer``'s.
+
+        That is every consumer in the same consumer group, or only the
+        consumer itself if it has no group.
+        """
+        group_id = consumer.consumer_group_id
+        if group_id:
+            return self._snapshot()[1].get(group_id, (consumer.pk,))
+        return (consumer.pk,)
+
+    @property
+    def version(self):
+        """The version of the snapshot this worker holds, or None."""
+        return self._version
+
+    def invalidate(self):
+        """Drop this worker's snapshot and tell other workers to reload."""
+        with self._lock:
+            self._version = None
+        self._cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    @property
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    def _snapshot(self, recheck=False):
+        now = time.monotonic()
+        interval = getattr(settings, 'LTILAUNCH_CONSUMER_CHECK_INTERVAL',
+                           DEFAULT_CHECK_INTERVAL)
+        if not recheck and self._version is not None and \
+                now - self._checked < interval:
+            return self._state
+        version = self._cache.get(self.version_key)
+        if version is None or version != self._version:
+            with self._lock:
+                if version is None or version != self._version:
+                    self._reload(version)
+        self._checked = now
+        return self._state
+
+    def _reload(self, version):
+        if version is None:
+            self._cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = self._cache.get(self.version_key)
+        rows = LTIToolConsumer.objects.values_list(*ConsumerSnapshot._fields)
+        consumers = [ConsumerSnapshot(*row) for row in rows]
+        by_group = {}
+        for c in consumers:
+            if c.consumer_group_id:
+                by_group.setdefault(c.consumer_group_id, []).append(c.pk)
+        self._state = (
+            MappingProxyType({c.oauth_consumer_key: c for c in consumers}),
+            MappingProxyType(
+                {group: tuple(pks) for group, pks in by_group.items()}))
+        self._version = version
+        warm_matchers(c.matcher_class_name for c in consumers)
+        logger.debug("loaded %d LTI consumers", len(consumers))
+
+
+consumer_registry = ConsumerRegistry()
+
+
+@receiver(post_save, sender=LTIToolConsumer)
+@receiver(post_delete, sender=LTIToolConsumer)
+def _consumer_changed(**kwargs):
+    consumer_registry.invalidate()
+    # invalidate again once the change is visible to other connections
+    transaction.on_commit(consumer_registry.invalidate)
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ltilaunch.models import LTILaunch, LTIUser
+
+
+class Command(BaseCommand):
+    help = ("Compact and expire the LTI launch history. The latest launch "
+            "of every LTI user is always kept intact.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compact-days', type=int, default=30,
+            help="drop the raw parameters of launches older than this")
+        parser.add_argument(
+            '--keep-days', type=int, default=365,
+            help="delete launches older than this")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        latest = LTIUser.objects.filter(
+            last_launch__isnull=False).values('last_launch')
+        old = LTILaunch.objects.exclude(pk__in=latest)
+
+        compacted = self._in_batches(
+            old.filter(launch_time__lt=now - timedelta(
+                days=options['compact_days'])).exclude(parameters={}),
+            lambda launches: launches.update(parameters={}),
+            options['batch_size'])
+        deleted = self._in_batches(
+            old.filter(launch_time__lt=now - timedelta(
+                days=options['keep_days'])),
+            lambda launches: launches.delete()[0],
+            options['batch_size'])
+        self.stdout.write("Compacted {} and deleted {} LTI launches.".format(
+            compacted, deleted))
+
+    @staticmethod
+    def _in_batches(launches, action, batch_size):
+        total = 0
+        while True:
+            batch = list(launches.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return total
+            total += action(LTILaunch.objects.filter(pk__in=batch))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ltilaunch.nonces import get_nonce_store
+
+
+class Command(BaseCommand):
+    help = "Remove expired OAuth nonces from the configured nonce store."
+
+    def handle(self, *args, **options):
+        removed = get_nonce_store().sweep()
+        self.stdout.write("Removed {} expired nonces.".format(removed))
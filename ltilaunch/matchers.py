@@ -0,0 +1,63 @@
+"""Resolution and caching of LTI user matcher classes.
+
+Consumers name their matcher by dotted class path.  Paths are resolved and
+instantiated once per process and the instance is reused for every launch,
+so matchers must not keep per-launch state.  Consumer forms validate the
+path with ``validate_matcher_class_name`` before it is ever saved.
+"""
+import functools
+import logging
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_class(class_name):
+    """Import and return the object at a dotted path, caching the result."""
+    return import_string(class_name)
+
+
+def _load_matcher_class(class_name):
+    from .usermatch import LTIUserMatcher
+    try:
+        matcher_class = resolve_class(class_name)
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "cannot import LTI user matcher {!r}: {}".format(class_name, e))
+    if not (isinstance(matcher_class, type) and
+            issubclass(matcher_class, LTIUserMatcher)):
+        raise ImproperlyConfigured(
+            "{!r} is not an LTIUserMatcher subclass".format(class_name))
+    return matcher_class
+
+
+@functools.lru_cache(maxsize=None)
+def get_matcher(class_name):
+    """Return the shared matcher instance for a dotted class path.
+
+    :param class_name: dotted path to an LTIUserMatcher subclass
+    :raises ImproperlyConfigured: if the path is not a matcher class
+    """
+    return _load_matcher_class(class_name)()
+
+
+def validate_matcher_class_name(value):
+    """Model field validator rejecting paths that are not matcher classes."""
+    if not value:
+        return
+    try:
+        _load_matcher_class(value)
+    except ImproperlyConfigured as e:
+        raise ValidationError(str(e), code='invalid_matcher')
+
+
+def warm_matchers(class_names):
+    """Resolve matchers ahead of launches, logging any broken paths."""
+    for class_name in set(filter(None, class_names)):
+        try:
+            get_matcher(class_name)
+        except ImproperlyConfigured:
+            logger.exception("invalid LTI user matcher %r", class_name)
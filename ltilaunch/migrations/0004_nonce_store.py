@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0003_auto_20160914_2157'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LTINonce',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer_key', models.TextField()),
+                ('nonce', models.TextField()),
+                ('expires', models.IntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'LTI nonce',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='ltitoolconsumer',
+            name='recent_nonces',
+        ),
+        migrations.AlterUniqueTogether(
+            name='ltinonce',
+            unique_together=set([('consumer_key', 'nonce')]),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:58
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0004_nonce_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LTILaunch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('launch_time', models.DateTimeField(db_index=True)),
+                ('context_id', models.TextField(blank=True)),
+                ('roles', models.TextField(blank=True)),
+                ('return_url', models.TextField(blank=True)),
+                ('canvas_course_id', models.TextField(blank=True)),
+                ('parameters', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name': 'LTI launch',
+            },
+        ),
+        migrations.AddField(
+            model_name='ltilaunch',
+            name='lti_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='launches', to='ltilaunch.LTIUser', verbose_name='LTI user'),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='last_launch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ltilaunch.LTILaunch'),
+        ),
+    ]
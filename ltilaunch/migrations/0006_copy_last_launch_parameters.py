@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:58
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+PROMOTED_PARAMETERS = (('context_id', 'context_id'),
+                       ('roles', 'roles'),
+                       ('return_url', 'launch_presentation_return_url'),
+                       ('canvas_course_id', 'custom_canvas_course_id'))
+
+
+def copy_last_launch_parameters(apps, schema_editor):
+    LTIUser = apps.get_model('ltilaunch', 'LTIUser')
+    LTILaunch = apps.get_model('ltilaunch', 'LTILaunch')
+    users = LTIUser.objects.filter(last_launch__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        LTILaunch.objects.bulk_create([
+            LTILaunch(lti_user=user,
+                      launch_time=user.last_launch_time,
+                      parameters=user.last_launch_parameters,
+                      **{column: user.last_launch_parameters.get(parameter, '')
+                         for column, parameter in PROMOTED_PARAMETERS})
+            for user in batch])
+        latest = LTILaunch.objects.filter(
+            lti_user=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+        LTIUser.objects.filter(pk__in=[user.pk for user in batch]).update(
+            last_launch=Subquery(latest))
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0005_launch_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_last_launch_parameters,
+                             migrations.RunPython.noop),
+    ]
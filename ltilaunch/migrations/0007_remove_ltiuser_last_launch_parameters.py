@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:58
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0006_copy_last_launch_parameters'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ltiuser',
+            name='last_launch_parameters',
+        ),
+        migrations.RemoveField(
+            model_name='ltiuser',
+            name='last_launch_time',
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0007_remove_ltiuser_last_launch_parameters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ltiuser',
+            name='canvas_course_id',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='canvas_login_id',
+            field=models.TextField(blank=True, db_index=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='context_id',
+            field=models.TextField(blank=True, db_index=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='context_title',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='full_name',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='return_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='roles',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ltiuser',
+            name='sourcedid',
+            field=models.TextField(blank=True, db_index=True, default=''),
+        ),
+    ]
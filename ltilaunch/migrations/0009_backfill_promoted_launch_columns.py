@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+PROMOTED_PARAMETERS = (('context_id', 'context_id'),
+                       ('context_title', 'context_title'),
+                       ('roles', 'roles'),
+                       ('return_url', 'launch_presentation_return_url'),
+                       ('canvas_course_id', 'custom_canvas_course_id'),
+                       ('full_name', 'lis_person_name_full'),
+                       ('canvas_login_id', 'custom_canvas_user_login_id'),
+                       ('sourcedid', 'lis_person_sourcedid'))
+
+
+def backfill_promoted_columns(apps, schema_editor):
+    LTIUser = apps.get_model('ltilaunch', 'LTIUser')
+    LTILaunch = apps.get_model('ltilaunch', 'LTILaunch')
+    quote = schema_editor.connection.ops.quote_name
+    assignments = ", ".join(
+        "{} = COALESCE(launch.parameters ->> '{}', '')".format(column,
+                                                               parameter)
+        for column, parameter in PROMOTED_PARAMETERS)
+    sql = ("UPDATE {users} SET {assignments} "
+           "FROM {launches} launch "
+           "WHERE launch.id = {users}.last_launch_id "
+           "AND {users}.id > %s AND {users}.id <= %s").format(
+        users=quote(LTIUser._meta.db_table),
+        launches=quote(LTILaunch._meta.db_table),
+        assignments=assignments)
+    last_pk = LTIUser.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, last_pk, BATCH_SIZE):
+            cursor.execute(sql, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0008_promoted_launch_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_promoted_columns,
+                             migrations.RunPython.noop),
+    ]
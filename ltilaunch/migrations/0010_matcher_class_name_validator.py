@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 08:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import ltilaunch.matchers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ltilaunch', '0009_backfill_promoted_launch_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ltitoolconsumer',
+            name='matcher_class_name',
+            field=models.CharField(blank=True, max_length=160, null=True, validators=[ltilaunch.matchers.validate_matcher_class_name]),
+        ),
+    ]
@@ -1,12 +1,12 @@
 import logging
-from pydoc import locate
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.fields import JSONField, ArrayField
-from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.db import IntegrityError, connection, models, transaction
 from django.utils import timezone
 
+from .matchers import get_matcher, validate_matcher_class_name
 from .utils import generate_random_string
 
 
@@ -38,52 +38,85 @@ class LTIToolConsumer(models.Model):
     match_guid_and_consumer = models.BooleanField(
         default=True,
         verbose_name="Match GUID and OAuth consumer")
-    recent_nonces = ArrayField(base_field=models.TextField(),
-                               size=10, default=[])
     consumer_group = models.ForeignKey(LTIToolConsumerGroup,
                                        blank=True,
                                        null=True,
                                        on_delete=models.SET_NULL)
-    matcher_class_name = models.CharField(max_length=160,
-                                          blank=True,
-                                          null=True)
+    matcher_class_name = models.CharField(
+        max_length=160,
+        blank=True,
+        null=True,
+        validators=[validate_matcher_class_name])
 
     def __str__(self):
         return self.name
 
-    def add_nonce(self, nonce):
-        self.recent_nonces = [nonce] + self.recent_nonces[:9]
-        self.save()
-
     class Meta:
         verbose_name = "LTI tool consumer"
 
 
+class LTINonce(models.Model):
+    consumer_key = models.TextField()
+    nonce = models.TextField()
+    expires = models.IntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ('consumer_key', 'nonce')
+        verbose_name = "LTI nonce"
+
+
 class LTIUser(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
     lti_tool_consumer = models.ForeignKey(
         LTIToolConsumer, verbose_name="LTI tool consumer")
     lti_user_id = models.TextField(verbose_name="LTI user ID")
-    last_launch_parameters = JSONField()
-    last_launch_time = models.DateTimeField()
-
+    last_launch = models.ForeignKey('LTILaunch',
+                                    blank=True,
+                                    null=True,
+                                    on_delete=models.SET_NULL,
+                                    related_name='+')
+    # copied from the latest launch, see PROMOTED_PARAMETERS
+    context_id = models.TextField(blank=True, default='', db_index=True)
+    context_title = models.TextField(blank=True, default='')
+    roles = models.TextField(blank=True, default='')
+    return_url = models.TextField(blank=True, default='')
+    canvas_course_id = models.TextField(blank=True, default='')
+    full_name = models.TextField(blank=True, default='')
+    canvas_login_id = models.TextField(blank=True, default='', db_index=True)
+    sourcedid = models.TextField(blank=True, default='', db_index=True)
+
+    PROMOTED_PARAMETERS = (('context_id', 'context_id'),
+                           ('context_title', 'context_title'),
+                           ('roles', 'roles'),
+                           ('return_url', 'launch_presentation_return_url'),
+                           ('canvas_course_id', 'custom_canvas_course_id'),
+                           ('full_name', 'lis_person_name_full'),
+                           ('canvas_login_id', 'custom_canvas_user_login_id'),
+                           ('sourcedid', 'lis_person_sourcedid'))
 
     def __str__(self):
         return self.person_name
 
 
+    @property
+    def last_launch_parameters(self):
+        return self.last_launch.parameters if self.last_launch else {}
+
+
+    @property
+    def last_launch_time(self):
+        return self.last_launch.launch_time if self.last_launch else None
+
+
     @property
     def last_launch_course_id(self):
-        return self.last_launch_parameters.get("custom_canvas_course_id", None)
+        return self.canvas_course_id or None
 
 
     @property
     def person_name(self):
-        if "lis_person_name_full" in self.last_launch_parameters:
-            return self.last_launch_parameters["lis_person_name_full"]
-        else:
-            return self.user.username
+        return self.full_name or self.user.username
 
 
     @property
@@ -123,6 +156,36 @@ class LTIUser(models.Model):
         return new_user
 
 
+class LTILaunch(models.Model):
+    """One launch of an LTI user, appended to on every launch.
+
+    Parameters read on most requests are copied into their own columns, so
+    the raw ``parameters`` of old launches can be dropped by the
+    ``prune_lti_launches`` command without losing them.
+    """
+    lti_user = models.ForeignKey(LTIUser,
+                                 on_delete=models.CASCADE,
+                                 related_name='launches',
+                                 verbose_name="LTI user")
+    launch_time = models.DateTimeField(db_index=True)
+    context_id = models.TextField(blank=True)
+    roles = models.TextField(blank=True)
+    return_url = models.TextField(blank=True)
+    canvas_course_id = models.TextField(blank=True)
+    parameters = JSONField(blank=True, default=dict)
+
+    PROMOTED_PARAMETERS = (('context_id', 'context_id'),
+                           ('roles', 'roles'),
+                           ('return_url', 'launch_presentation_return_url'),
+                           ('canvas_course_id', 'custom_canvas_course_id'))
+
+    def __str__(self):  # pragma: no cover
+        return "{} at {}".format(self.lti_user_id, self.launch_time)
+
+    class Meta:
+        verbose_name = "LTI launch"
+
+
 class LTIToolProvider(models.Model):
     VISIBILITY_ALL = ""
     VISIBILITY_ADMINS = "admins"
@@ -147,41 +210,117 @@ class LTIToolProvider(models.Model):
 
 
 def get_or_create_lti_user(consumer, launch_data):
+    """Record a launch against its LTIUser, creating the user if needed.
+
+    A returning user costs a single statement that appends an LTILaunch and
+    points the LTIUser at it.  New users are inserted with INSERT ... ON
+    CONFLICT, so simultaneous first launches of the same user (e.g. two
+    browser tabs) resolve to the same LTIUser.
+    """
     lti_user_id = launch_data["user_id"]
-    try:
-        lti_user = LTIUser.objects.get(
-            lti_tool_consumer=consumer,
-            lti_user_id=lti_user_id)
-        lti_user.last_launch_parameters = launch_data
-        lti_user.last_launch_time = timezone.now()
-    except LTIUser.DoesNotExist:
-        user_model = get_user_model()
+    launch_time = timezone.now()
+    lti_user = _record_launch(consumer, lti_user_id, launch_data, launch_time)
+    if lti_user is None:
         djuser = None
+        created = False
         if consumer.matcher_class_name:
-            matcher_class = locate(consumer.matcher_class_name)
-            matcher = matcher_class()
+            matcher = get_matcher(consumer.matcher_class_name)
             djuser = matcher.get_matching_user(consumer, launch_data)
         if djuser is None:
-            djuser = user_model.objects.create_user(
-                username=(consumer.tool_consumer_instance_guid[:14] +
-                          lti_user_id[:14]))
-        lti_user = LTIUser.objects.create(
-            user=djuser,
-            lti_user_id=lti_user_id,
-            lti_tool_consumer=consumer,
-            last_launch_parameters=launch_data,
-            last_launch_time=timezone.now()
-        )
-    lti_user.save()
+            djuser, created = _create_django_user(consumer, lti_user_id)
+        _insert_lti_user(consumer, lti_user_id, djuser)
+        lti_user = _record_launch(consumer, lti_user_id, launch_data,
+                                  launch_time)
+        if created and lti_user.user_id != djuser.pk:
+            # a concurrent launch inserted the LTIUser first
+            djuser.delete()
     return lti_user
 
 
+def _launch_sql(sql, launch_columns=(), user_columns=()):
+    quote = connection.ops.quote_name
+    return sql.format(user_table=quote(LTIUser._meta.db_table),
+                      launch_table=quote(LTILaunch._meta.db_table),
+                      launch_columns=", ".join(launch_columns),
+                      launch_values=", ".join(["%s"] * len(launch_columns)),
+                      user_columns=", ".join(user_columns),
+                      user_values=", ".join(["%s"] * len(user_columns)),
+                      user_assignments=", ".join(
+                          "{} = %s".format(column) for column in user_columns))
+
+
+def _promoted(model, launch_data):
+    return [(column, launch_data.get(parameter, ''))
+            for column, parameter in model.PROMOTED_PARAMETERS]
+
+
+def _record_launch(consumer, lti_user_id, launch_data, launch_time):
+    parameters = LTILaunch._meta.get_field('parameters').get_db_prep_value(
+        launch_data, connection)
+    launch_values = ([('launch_time', launch_time),
+                      ('parameters', parameters)] +
+                     _promoted(LTILaunch, launch_data))
+    user_values = _promoted(LTIUser, launch_data)
+    sql = _launch_sql(
+        "WITH target AS ("
+        "SELECT id FROM {user_table} "
+        "WHERE lti_tool_consumer_id = %s AND lti_user_id = %s"
+        "), launch AS ("
+        "INSERT INTO {launch_table} (lti_user_id, {launch_columns}) "
+        "SELECT id, {launch_values} FROM target "
+        "RETURNING id, lti_user_id"
+        ") "
+        "UPDATE {user_table} SET last_launch_id = launch.id, "
+        "{user_assignments} FROM launch "
+        "WHERE {user_table}.id = launch.lti_user_id "
+        "RETURNING {user_table}.*",
+        [column for column, _ in launch_values],
+        [column for column, _ in user_values])
+    params = ([consumer.pk, lti_user_id] +
+              [value for _, value in launch_values + user_values])
+    return next(iter(LTIUser.objects.raw(sql, params)), None)
+
+
+def _insert_lti_user(consumer, lti_user_id, djuser):
+    # the launch itself is recorded afterwards by _record_launch
+    user_columns = [column for column, _ in LTIUser.PROMOTED_PARAMETERS]
+    sql = _launch_sql(
+        "INSERT INTO {user_table} "
+        "(user_id, lti_tool_consumer_id, lti_user_id, {user_columns}) "
+        "VALUES (%s, %s, %s, {user_values}) "
+        "ON CONFLICT (lti_tool_consumer_id, lti_user_id) DO NOTHING",
+        user_columns=user_columns)
+    params = [djuser.pk, consumer.pk, lti_user_id] + [''] * len(user_columns)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _create_django_user(consumer, lti_user_id):
+    user_model = get_user_model()
+    username = consumer.tool_consumer_instance_guid[:14] + lti_user_id[:14]
+    try:
+        with transaction.atomic():
+            return user_model.objects.create_user(username=username), True
+    except IntegrityError:
+        # lost a race with a concurrent first launch of the same user, unless
+        # the username already belongs to somebody else's LTIUser
+        djuser = user_model.objects.get(username=username)
+        others = LTIUser.objects.filter(user=djuser).exclude(
+            lti_tool_consumer_id=consumer.pk, lti_user_id=lti_user_id)
+        if others.exists():
+            raise
+        return djuser, False
+
+
 def get_lti_user(launch_data):
+    from .consumers import consumer_registry
     lti_user_id = launch_data["user_id"]
-    lti_consumer_key = launch_data["oauth_consumer_key"]
+    consumer = consumer_registry.get(launch_data["oauth_consumer_key"])
+    if consumer is None:
+        raise LTIUser.DoesNotExist("no LTI consumer for launch")
     return LTIUser.objects.get(
-        last_launch_parameters__user_id=lti_user_id,
-        lti_tool_consumer__oauth_consumer_key=lti_consumer_key)
+        lti_tool_consumer_id=consumer.pk,
+        lti_user_id=lti_user_id)
 
 
 def lti_launch_return_url(user):
@@ -191,6 +330,5 @@ def lti_launch_return_url(user):
     except LTIUser.DoesNotExist:
         logger.error("no LTIUser found for '%s'", user)
     else:
-        result = lti_user.last_launch_parameters.get(
-            'launch_presentation_return_url', None)
+        result = lti_user.return_url or None
     return result
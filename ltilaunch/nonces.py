@@ -0,0 +1,145 @@
+"""Replay protection for OAuth launch nonces.
+
+A nonce store remembers each (consumer key, nonce) pair until the launch
+timestamp it arrived with falls out of the accepted window.  Checking a nonce
+is a single atomic insert-or-reject: ``add`` returns False if the pair has
+already been seen.  The store used for launches is chosen with the
+``LTILAUNCH_NONCE_STORE`` setting.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NONCE_STORE = 'ltilaunch.nonces.DatabaseNonceStore'
+
+
+class BaseNonceStore:
+    def add(self, client_key, nonce, expires):
+        """Record a nonce unless it has been seen before.
+
+        :param client_key: the OAuth consumer key of the launch
+        :param nonce: the OAuth nonce of the launch
+        :param expires: epoch seconds after which the nonce may be forgotten
+        :return: True if the nonce is new, False if it is a replay
+        """
+        raise NotImplementedError
+
+    def sweep(self, now=None):
+        """Forget expired nonces, returning how many were removed."""
+        return 0
+
+
+class MemoryNonceStore(BaseNonceStore):
+    """Per-process store keeping nonces in buckets of expiry time.
+
+    Expired buckets are dropped whole, so sweeping never scans individual
+    nonces.  Only suitable for single-process deployments and tests.
+    """
+
+    def __init__(self, bucket_seconds=10):
+        self.bucket_seconds = bucket_seconds
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, client_key, nonce, expires):
+        entry = (client_key, nonce)
+        with self._lock:
+            self._sweep(time.time())
+            if any(entry in bucket for bucket in self._buckets.values()):
+                return False
+            bucket = int(expires) // self.bucket_seconds
+            self._buckets.setdefault(bucket, set()).add(entry)
+        return True
+
+    def sweep(self, now=None):
+        with self._lock:
+            return self._sweep(time.time() if now is None else now)
+
+    def _sweep(self, now):
+        # a bucket holds nonces expiring before the start of the next one
+        expired = [b for b in self._buckets
+                   if (b + 1) * self.bucket_seconds <= now]
+        return sum(len(self._buckets.pop(b)) for b in expired)
+
+
+class CacheNonceStore(BaseNonceStore):
+    """Store backed by a Django cache, relying on its atomic ``add``.
+
+    Entries expire through the cache's own timeouts.
+    """
+
+    key_prefix = 'ltilaunch:nonce:'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def add(self, client_key, nonce, expires):
+        digest = hashlib.sha1(
+            '{}\n{}'.format(client_key, nonce).encode('utf-8')).hexdigest()
+        timeout = max(1, int(expires - time.time()))
+        return caches[self.alias].add(self.key_prefix + digest, 1, timeout)
+
+
+class DatabaseNonceStore(BaseNonceStore):
+    """Store backed by the ``LTINonce`` table.
+
+    A unique index on (consumer key, nonce) makes the insert itself the
+    replay check.  Expired rows are swept at most once per
+    ``sweep_interval`` seconds per process, and by the ``sweep_lti_nonces``
+    management command.
+    """
+
+    def __init__(self, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+
+    def add(self, client_key, nonce, expires):
+        from .models import LTINonce
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep(now)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} (consumer_key, nonce, expires) '
+                'VALUES (%s, %s, %s) '
+                'ON CONFLICT (consumer_key, nonce) DO NOTHING'.format(
+                    connection.ops.quote_name(LTINonce._meta.db_table)),
+                [client_key, nonce, int(expires)])
+            return cursor.rowcount == 1
+
+    def sweep(self, now=None):
+        from .models import LTINonce
+        now = time.time() if now is None else now
+        removed, _ = LTINonce.objects.filter(expires__lte=now).delete()
+        if removed:
+            logger.debug("swept %d expired LTI nonces", removed)
+        return removed
+
+
+_nonce_store = None
+
+
+def get_nonce_store():
+    global _nonce_store
+    if _nonce_store is None:
+        path = getattr(settings, 'LTILAUNCH_NONCE_STORE', DEFAULT_NONCE_STORE)
+        _nonce_store = import_string(path)()
+    return _nonce_store
+
+
+@receiver(setting_changed)
+def _reset_nonce_store(setting, **kwargs):
+    global _nonce_store
+    if setting == 'LTILAUNCH_NONCE_STORE':
+        _nonce_store = None
@@ -2,9 +2,41 @@ import time
 
 from oauthlib.oauth1 import RequestValidator, SignatureOnlyEndpoint
 
+from .consumers import consumer_registry
+from .nonces import get_nonce_store
+
+# seconds a launch timestamp stays acceptable, and so how long nonces are kept
+TIMESTAMP_WINDOW = 30
+
+
+# (consumer registry version, shared endpoints by consumer key); see
+# endpoint_for_consumer
+_endpoints = (None, {})
+
+
+def endpoint_for_consumer(consumer):
+    """Return a SignatureOnlyEndpoint for a consumer, reusing past ones.
+
+    Endpoints and their validators keep no per-request state, so one
+    instance per consumer is shared by every thread.  A consumer snapshot is
+    replaced whenever the consumer changes, which also replaces its
+    endpoint, and the pool starts over whenever the consumer registry
+    reloads, so deleted and re-keyed consumers do not linger.
+    """
+    global _endpoints
+    version, endpoints = _endpoints
+    if version != consumer_registry.version:
+        endpoints = {}
+        _endpoints = (consumer_registry.version, endpoints)
+    endpoint = endpoints.get(consumer.oauth_consumer_key)
+    if endpoint is None or endpoint.request_validator.consumer is not consumer:
+        endpoint = SignatureOnlyEndpoint(LTIOAuthValidator(consumer))
+        endpoints[consumer.oauth_consumer_key] = endpoint
+    return endpoint
+
 
 def validate_lti_launch(consumer, uri, body, headers):
-    verifier = SignatureOnlyEndpoint(LTIOAuthValidator(consumer))
+    verifier = endpoint_for_consumer(consumer)
 
     #@@@ spoof the request results for dev purposes
     #return verifier.validate_request(
@@ -33,10 +65,9 @@ class LTIOAuthValidator(RequestValidator):
                                      nonce, request,
                                      request_token=None,
                                      access_token=None):
-        result = (nonce not in self.consumer.recent_nonces and
-                  int(timestamp) + 30 > time.time())
-        self.consumer.add_nonce(nonce)
-        return result
+        expires = int(timestamp) + TIMESTAMP_WINDOW
+        return (expires > time.time() and
+                get_nonce_store().add(client_key, nonce, expires))
 
     def validate_client_key(self, client_key, request):
         return client_key == self.consumer.oauth_consumer_key
@@ -0,0 +1,86 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from ltilaunch.checks import check_consumer_cache
+from ltilaunch.consumers import ConsumerRegistry, consumer_registry
+from ltilaunch.models import LTIToolConsumer, LTIToolConsumerGroup
+
+
+class ConsumerRegistryTestCase(TestCase):
+    def setUp(self):
+        self.consumer = LTIToolConsumer.objects.create(
+            name="testconsumer",
+            tool_consumer_instance_guid="guid")
+
+    def test_lookup(self):
+        snapshot = consumer_registry.get(self.consumer.oauth_consumer_key)
+        self.assertEqual(self.consumer.pk, snapshot.pk)
+        self.assertEqual(self.consumer.oauth_consumer_secret,
+                         snapshot.oauth_consumer_secret)
+        self.assertEqual("guid", snapshot.tool_consumer_instance_guid)
+        self.assertIsNone(consumer_registry.get("missing"))
+
+    def test_cached(self):
+        key = self.consumer.oauth_consumer_key
+        consumer_registry.get(key)
+        # not even the database cache is read within the check interval
+        with self.assertNumQueries(0):
+            consumer_registry.get(key)
+
+    def test_invalidated_on_save(self):
+        key = self.consumer.oauth_consumer_key
+        self.assertTrue(consumer_registry.get(key).match_guid_and_consumer)
+        self.consumer.match_guid_and_consumer = False
+        self.consumer.save()
+        self.assertFalse(consumer_registry.get(key).match_guid_and_consumer)
+
+    def test_invalidated_on_delete(self):
+        key = self.consumer.oauth_consumer_key
+        consumer_registry.get(key)
+        self.consumer.delete()
+        self.assertIsNone(consumer_registry.get(key))
+
+    def test_invalidated_across_workers(self):
+        key = self.consumer.oauth_consumer_key
+        other_worker = ConsumerRegistry()
+        self.assertEqual("testconsumer", other_worker.get(key).name)
+        LTIToolConsumer.objects.filter(pk=self.consumer.pk).update(
+            name="renamed")
+        consumer_registry.invalidate()
+        self.assertEqual("testconsumer", other_worker.get(key).name)
+        later = time.monotonic() + 5
+        with mock.patch("ltilaunch.consumers.time.monotonic",
+                        return_value=later):
+            self.assertEqual("renamed", other_worker.get(key).name)
+
+    def test_new_consumer_across_workers(self):
+        other_worker = ConsumerRegistry()
+        other_worker.get(self.consumer.oauth_consumer_key)
+        added = LTIToolConsumer.objects.create(
+            name="added", tool_consumer_instance_guid="addedguid")
+        self.assertEqual(added.pk,
+                         other_worker.get(added.oauth_consumer_key).pk)
+
+    def test_matching_consumer_ids(self):
+        self.assertEqual((self.consumer.pk,),
+                         consumer_registry.matching_consumer_ids(self.consumer))
+        group = LTIToolConsumerGroup.objects.create(name="group")
+        self.consumer.consumer_group = group
+        self.consumer.save()
+        other = LTIToolConsumer.objects.create(
+            name="otherconsumer",
+            tool_consumer_instance_guid="otherguid",
+            consumer_group=group)
+        self.assertEqual(
+            {self.consumer.pk, other.pk},
+            set(consumer_registry.matching_consumer_ids(self.consumer)))
+
+    def test_shared_cache_check(self):
+        self.assertEqual([], check_consumer_cache(None))
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            with self.settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.' + backend}}):
+                self.assertEqual(['ltilaunch.E001'],
+                                 [e.id for e in check_consumer_cache(None)])
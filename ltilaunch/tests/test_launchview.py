@@ -2,6 +2,7 @@ import oauthlib.oauth1
 from django.core.urlresolvers import reverse
 from django.test import TestCase, override_settings
 
+from ltilaunch import LTIUSER_SESSION_KEY
 from ltilaunch.models import LTIToolConsumer, LTIUser
 
 
@@ -74,6 +75,27 @@ class LaunchViewTestCase(TestCase):
         self.test_success()
         self.assertEqual(1, LTIUser.objects.count())
 
+    def test_session_lti_user(self):
+        oauth_signer = oauthlib.oauth1.Client(
+            client_key=self.key,
+            client_secret=self.secret,
+            signature_type=oauthlib.oauth1.SIGNATURE_TYPE_BODY)
+        params = {"tool_consumer_instance_guid": self.guid,
+                  "user_id": self.user_id}
+        uri, headers, body = oauth_signer.sign(
+            self.uri,
+            http_method="POST",
+            body=params,
+            headers={"Content-Type": "application/x-www-form-urlencoded"})
+        self.client.post(
+            uri, body,
+            headers=headers,
+            secure=True,
+            content_type="application/x-www-form-urlencoded")
+        lti_user = LTIUser.objects.get(lti_user_id=self.user_id)
+        self.assertEqual(lti_user.pk,
+                         self.client.session[LTIUSER_SESSION_KEY])
+
     def _successful(self, oauth_signer, params):
         uri, headers, body = oauth_signer.sign(
             self.uri,
@@ -90,7 +112,7 @@ class LaunchViewTestCase(TestCase):
         self.assertEqual(1, len(users), "user should exist")
         # check cool json stuff
         results = LTIUser.objects.filter(
-            last_launch_parameters__music='response')
+            last_launch__parameters__music='response')
         self.assertEqual(1, len(results),
                          "should be able to search by LTI launch data")
         self.assertRedirects(resp, '/', status_code=303,
@@ -0,0 +1,32 @@
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import SimpleTestCase
+
+from ltilaunch.matchers import get_matcher
+from ltilaunch.models import LTIToolConsumer
+from ltilaunch.usermatch import CanvasCustomUserMatcher
+
+
+class MatcherRegistryTestCase(SimpleTestCase):
+    def test_cached_instance(self):
+        name = "ltilaunch.usermatch.CanvasCustomUserMatcher"
+        matcher = get_matcher(name)
+        self.assertIsInstance(matcher, CanvasCustomUserMatcher)
+        self.assertIs(matcher, get_matcher(name))
+
+    def test_bad_paths(self):
+        for name in ("ltilaunch.usermatch.NoSuchMatcher",
+                     "nosuchmodule.Matcher",
+                     "ltilaunch.models.LTIUser"):
+            with self.assertRaises(ImproperlyConfigured):
+                get_matcher(name)
+
+    def test_validation(self):
+        consumer = LTIToolConsumer(
+            name="testconsumer",
+            tool_consumer_instance_guid="guid",
+            matcher_class_name="ltilaunch.usermatch.NoSuchMatcher")
+        with self.assertRaises(ValidationError) as cm:
+            consumer.clean_fields()
+        self.assertIn("matcher_class_name", cm.exception.message_dict)
+        consumer.matcher_class_name = "ltilaunch.usermatch.LTIUserMatcher"
+        consumer.clean_fields()
@@ -1,6 +1,14 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
+from django.utils.timezone import now
 
-from ltilaunch.models import LTIToolConsumer, LTIToolProvider
+from ltilaunch.models import (LTILaunch, LTIToolConsumer, LTIToolProvider,
+                              LTIUser, get_lti_user, get_or_create_lti_user)
 
 
 class LTIToolConsumerTestCase(TestCase):
@@ -20,4 +28,121 @@ class LTIToolProviderTestCase(TestCase):
             display_name="bar",
             launch_path="/thud"
         )
-        self.assertEquals(c.name, str(c))
\ No newline at end of file
+        self.assertEquals(c.name, str(c))
+
+
+class GetOrCreateLTIUserTestCase(TestCase):
+    def setUp(self):
+        self.consumer = LTIToolConsumer.objects.create(
+            name="consumer",
+            tool_consumer_instance_guid="guid")
+        self.launch = {"user_id": "alice", "roles": "Learner"}
+
+    def test_create(self):
+        lti_user = get_or_create_lti_user(self.consumer, self.launch)
+        self.assertEqual("alice", lti_user.lti_user_id)
+        self.assertEqual("guidalice", lti_user.user.username)
+        self.assertEqual(self.launch, lti_user.last_launch_parameters)
+
+    def test_returning_user_single_query(self):
+        first = get_or_create_lti_user(self.consumer, self.launch)
+        relaunch = {"user_id": "alice", "roles": "Instructor"}
+        with self.assertNumQueries(1):
+            lti_user = get_or_create_lti_user(self.consumer, relaunch)
+        self.assertEqual(first.pk, lti_user.pk)
+        self.assertEqual(relaunch, LTIUser.objects.get(
+            pk=first.pk).last_launch_parameters)
+        self.assertGreater(lti_user.last_launch_time, first.last_launch_time)
+
+    def test_concurrent_first_launch(self):
+        # the other tab already created the Django user for this LTI user
+        djuser = User.objects.create_user(username="guidalice")
+        lti_user = get_or_create_lti_user(self.consumer, self.launch)
+        self.assertEqual(djuser.pk, lti_user.user_id)
+        self.assertEqual(1, LTIUser.objects.count())
+
+    def test_username_taken_by_other_lti_user(self):
+        other = LTIToolConsumer.objects.create(
+            name="other",
+            tool_consumer_instance_guid="guid")
+        get_or_create_lti_user(other, self.launch)
+        with self.assertRaises(IntegrityError):
+            get_or_create_lti_user(self.consumer, self.launch)
+
+
+class GetLTIUserTestCase(TestCase):
+    def test_lookup(self):
+        consumer = LTIToolConsumer.objects.create(
+            name="consumer",
+            tool_consumer_instance_guid="guid")
+        created = get_or_create_lti_user(consumer, {"user_id": "bob"})
+        launch = {"user_id": "bob",
+                  "oauth_consumer_key": consumer.oauth_consumer_key}
+        self.assertEqual(created.pk, get_lti_user(launch).pk)
+        launch["oauth_consumer_key"] = "unknown"
+        with self.assertRaises(LTIUser.DoesNotExist):
+            get_lti_user(launch)
+
+
+class LTILaunchTestCase(TestCase):
+    def setUp(self):
+        self.consumer = LTIToolConsumer.objects.create(
+            name="consumer",
+            tool_consumer_instance_guid="guid")
+
+    def test_history(self):
+        first = {"user_id": "carol", "context_id": "course1",
+                 "roles": "Learner",
+                 "launch_presentation_return_url": "http://lms/return"}
+        second = {"user_id": "carol", "context_id": "course2",
+                  "custom_canvas_course_id": "42"}
+        get_or_create_lti_user(self.consumer, first)
+        lti_user = get_or_create_lti_user(self.consumer, second)
+        launches = lti_user.launches.order_by("pk")
+        self.assertEqual(["course1", "course2"],
+                         [launch.context_id for launch in launches])
+        self.assertEqual("http://lms/return", launches[0].return_url)
+        self.assertEqual(launches[1].pk, lti_user.last_launch_id)
+        self.assertEqual(second, lti_user.last_launch_parameters)
+        self.assertEqual("42", lti_user.last_launch_course_id)
+
+    def test_promoted_columns(self):
+        launch = {"user_id": "erin", "context_id": "course1",
+                  "context_title": "Course One", "roles": "Instructor",
+                  "lis_person_name_full": "Erin Example",
+                  "custom_canvas_user_login_id": "erin",
+                  "lis_person_sourcedid": "1234"}
+        get_or_create_lti_user(self.consumer, launch)
+        lti_user = LTIUser.objects.get(lti_user_id="erin")
+        self.assertEqual("course1", lti_user.context_id)
+        self.assertEqual("Course One", lti_user.context_title)
+        self.assertEqual("Instructor", lti_user.roles)
+        self.assertEqual("Erin Example", lti_user.person_name)
+        self.assertEqual("erin", lti_user.canvas_login_id)
+        self.assertEqual("1234", lti_user.sourcedid)
+        get_or_create_lti_user(self.consumer, {"user_id": "erin",
+                                               "context_id": "course2"})
+        lti_user.refresh_from_db()
+        self.assertEqual("course2", lti_user.context_id)
+        self.assertEqual("", lti_user.roles)
+        self.assertEqual(lti_user.user.username, lti_user.person_name)
+
+    def test_prune(self):
+        old = now() - timedelta(days=400)
+        lti_user = get_or_create_lti_user(self.consumer, {"user_id": "dan"})
+        LTILaunch.objects.filter(pk=lti_user.last_launch_id).update(
+            launch_time=old)
+        expired = LTILaunch.objects.create(
+            lti_user=lti_user, launch_time=old, parameters={"a": "b"})
+        compacted = LTILaunch.objects.create(
+            lti_user=lti_user, launch_time=now() - timedelta(days=60),
+            context_id="ctx", parameters={"a": "b"})
+        call_command("prune_lti_launches", stdout=StringIO())
+        self.assertFalse(LTILaunch.objects.filter(pk=expired.pk).exists())
+        compacted.refresh_from_db()
+        self.assertEqual({}, compacted.parameters)
+        self.assertEqual("ctx", compacted.context_id)
+        # the latest launch survives however old it is
+        lti_user.refresh_from_db()
+        self.assertEqual({"user_id": "dan"},
+                         lti_user.last_launch_parameters)
@@ -0,0 +1,72 @@
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ltilaunch.models import LTINonce
+from ltilaunch.nonces import (CacheNonceStore, DatabaseNonceStore,
+                              MemoryNonceStore, get_nonce_store)
+from ltilaunch.oauth import LTIOAuthValidator
+
+
+class MemoryNonceStoreTestCase(SimpleTestCase):
+    def test_replay_rejected(self):
+        store = MemoryNonceStore()
+        expires = time.time() + 30
+        self.assertTrue(store.add("key", "nonce", expires))
+        self.assertFalse(store.add("key", "nonce", expires + 15))
+        self.assertTrue(store.add("otherkey", "nonce", expires))
+
+    def test_sweep(self):
+        store = MemoryNonceStore(bucket_seconds=10)
+        now = time.time()
+        store.add("key", "old", now + 5)
+        store.add("key", "new", now + 60)
+        self.assertEqual(1, store.sweep(now + 30))
+        self.assertFalse(store.add("key", "new", now + 60))
+
+
+# the store is under test, not the cache
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheNonceStoreTestCase(SimpleTestCase):
+    def test_replay_rejected(self):
+        store = CacheNonceStore()
+        expires = time.time() + 30
+        self.assertTrue(store.add("key", "cachednonce", expires))
+        self.assertFalse(store.add("key", "cachednonce", expires))
+
+
+class DatabaseNonceStoreTestCase(TestCase):
+    def test_replay_rejected(self):
+        store = DatabaseNonceStore()
+        expires = time.time() + 30
+        self.assertTrue(store.add("key", "nonce", expires))
+        self.assertFalse(store.add("key", "nonce", expires))
+        self.assertTrue(store.add("otherkey", "nonce", expires))
+        self.assertEqual(2, LTINonce.objects.count())
+
+    def test_sweep(self):
+        store = DatabaseNonceStore()
+        now = time.time()
+        store.add("key", "old", now - 1)
+        store.add("key", "new", now + 30)
+        self.assertEqual(1, store.sweep(now))
+        self.assertEqual(["new"], list(
+            LTINonce.objects.values_list("nonce", flat=True)))
+
+
+@override_settings(LTILAUNCH_NONCE_STORE='ltilaunch.nonces.MemoryNonceStore')
+class ValidatorNonceTestCase(SimpleTestCase):
+    def test_configured_store(self):
+        self.assertIsInstance(get_nonce_store(), MemoryNonceStore)
+
+    def test_timestamp_and_nonce(self):
+        validator = LTIOAuthValidator(None)
+        now = str(int(time.time()))
+        self.assertTrue(validator.validate_timestamp_and_nonce(
+            "key", now, "validatornonce", None))
+        self.assertFalse(validator.validate_timestamp_and_nonce(
+            "key", now, "validatornonce", None))
+        stale = str(int(time.time()) - 60)
+        self.assertFalse(validator.validate_timestamp_and_nonce(
+            "key", stale, "stalenonce", None))
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ltilaunch import oauth
+from ltilaunch.consumers import ConsumerRegistry, ConsumerSnapshot
+from ltilaunch.oauth import endpoint_for_consumer
+
+
+class EndpointPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.consumer = ConsumerSnapshot(
+            pk=1, name="pooled", oauth_consumer_key="pooledkey",
+            oauth_consumer_secret="secret", tool_consumer_instance_guid="",
+            match_guid_and_consumer=False, consumer_group_id=None,
+            matcher_class_name=None)
+
+    def test_reused(self):
+        endpoint = endpoint_for_consumer(self.consumer)
+        self.assertIs(endpoint, endpoint_for_consumer(self.consumer))
+
+    def test_replaced_with_snapshot(self):
+        endpoint = endpoint_for_consumer(self.consumer)
+        rotated = self.consumer._replace(oauth_consumer_secret="rotated")
+        new_endpoint = endpoint_for_consumer(rotated)
+        self.assertIsNot(endpoint, new_endpoint)
+        self.assertEqual(
+            "rotated",
+            new_endpoint.request_validator.get_client_secret("pooledkey",
+                                                             None))
+
+    def test_cleared_on_registry_reload(self):
+        endpoint = endpoint_for_consumer(self.consumer)
+        other = self.consumer._replace(pk=2, oauth_consumer_key="otherkey")
+        with mock.patch.object(ConsumerRegistry, "version",
+                               new_callable=mock.PropertyMock,
+                               return_value="reloaded"):
+            endpoint_for_consumer(other)
+            # e.g. deleted meanwhile: its endpoint is gone with the old pool
+            self.assertNotIn("pooledkey", oauth._endpoints[1])
+            self.assertIsNot(endpoint, endpoint_for_consumer(self.consumer))
@@ -1,7 +1,6 @@
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import override_settings, TestCase
-from django.utils.timezone import now
 
 from ltilaunch.models import LTIUser, LTIToolConsumer
 
@@ -19,9 +18,7 @@ class RedirectViewTestCase(TestCase):
             user=self.user,
             lti_user_id="irrelevant",
             lti_tool_consumer=self.consumer,
-            last_launch_parameters={"launch_presentation_return_url":
-                                    "http://example.com/test?foo=bar"},
-            last_launch_time=now())
+            return_url="http://example.com/test?foo=bar")
 
     def test_launch_return(self):
         self.client.force_login(self.user, "ltilaunch.auth.LTILaunchBackend")
@@ -1,7 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from ltilaunch.consumers import consumer_registry
 from ltilaunch.models import (LTIToolConsumer, LTIToolConsumerGroup,
                               get_or_create_lti_user)
+from ltilaunch.usermatch import CanvasCustomUserMatcher
 
 
 class LTIUserMatcherTestCase(TestCase):
@@ -46,6 +48,9 @@ class LTIUserMatcherTestCase(TestCase):
         self.assertNotEqual(alice1.user.pk, bob1.user.pk)
 
 
+# counts only the matching queries, not the consumer version lookup
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class CanvasCustomUserMatcherTestCase(TestCase):
     def test_match_canvas_id(self):
         group = LTIToolConsumerGroup.objects.create(name="group")
@@ -137,3 +142,31 @@ class CanvasCustomUserMatcherTestCase(TestCase):
         self.assertNotEqual(alice1.user.pk, other_alice.user.pk,
                             "users from different consumers should not match"
                             " without being in the same consumer group")
+
+    def test_single_query(self):
+        group = LTIToolConsumerGroup.objects.create(name="group")
+        consumer = LTIToolConsumer.objects.create(
+            name="testconsumer1",
+            tool_consumer_instance_guid="testconsumer1",
+            matcher_class_name="ltilaunch.usermatch.CanvasCustomUserMatcher",
+            consumer_group=group
+        )
+        get_or_create_lti_user(consumer, {
+            "user_id": "aliceABC",
+            "lis_person_sourcedid": "1234"
+        })
+        bob = get_or_create_lti_user(consumer, {
+            "user_id": "bobABC",
+            "custom_canvas_user_login_id": "bob",
+            "lis_person_sourcedid": "5678"
+        })
+        matcher = CanvasCustomUserMatcher()
+        launch = {
+            "custom_canvas_user_login_id": "bob",
+            "lis_person_sourcedid": "1234"
+        }
+        consumer_registry.matching_consumer_ids(consumer)
+        with self.assertNumQueries(1):
+            user = matcher.get_matching_user(consumer, launch)
+        self.assertEqual(bob.user.pk, user.pk,
+                         "a login ID match should win over a sourcedid match")
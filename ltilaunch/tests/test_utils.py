@@ -0,0 +1,26 @@
+from django.test import RequestFactory, SimpleTestCase
+
+from ltilaunch.utils import headers_from_request, oauth_headers_from_request
+
+
+class HeadersFromRequestTestCase(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().post(
+            "/lti/launch", "a=b",
+            content_type="application/x-www-form-urlencoded",
+            HTTP_AUTHORIZATION='OAuth oauth_nonce="abc"',
+            HTTP_X_FORWARDED_FOR="10.0.0.1",
+            HTTP_ACCEPT_LANGUAGE="en")
+
+    def test_all_headers(self):
+        headers = headers_from_request(self.request)
+        self.assertEqual("en", headers["Accept-Language"])
+        self.assertEqual('OAuth oauth_nonce="abc"', headers["Authorization"])
+        self.assertNotIn("X-Forwarded-For", headers)
+        self.assertNotIn("Wsgi.Input", headers)
+
+    def test_oauth_headers(self):
+        self.assertEqual({
+            "Authorization": 'OAuth oauth_nonce="abc"',
+            "Content-Type": "application/x-www-form-urlencoded",
+        }, oauth_headers_from_request(self.request))
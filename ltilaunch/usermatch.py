@@ -1,6 +1,8 @@
-from pydoc import locate
 from django.db import models
+from django.db.models import Case, IntegerField, Q, Value, When
 
+from ltilaunch.consumers import consumer_registry
+from ltilaunch.matchers import resolve_class
 from ltilaunch.models import LTIToolConsumer
 
 
@@ -9,13 +11,9 @@ class LTIUserMatcher:
 
     def _scope_to_consumer_group(self,
                                  lti_consumer: LTIToolConsumer):
-        all_users = locate(self.lti_user_model).objects.all() # type: models.query.QuerySet
-        group = lti_consumer.consumer_group
-        if group:
-            consumers = LTIToolConsumer.objects.filter(consumer_group=group)
-        else:
-            consumers = LTIToolConsumer.objects.filter(pk=lti_consumer.pk)
-        return all_users.filter(lti_tool_consumer__in=consumers)
+        all_users = resolve_class(self.lti_user_model).objects.all() # type: models.query.QuerySet
+        consumer_ids = consumer_registry.matching_consumer_ids(lti_consumer)
+        return all_users.filter(lti_tool_consumer_id__in=consumer_ids)
 
     def get_matching_user(self,
                           lti_consumer: LTIToolConsumer,
@@ -23,7 +21,8 @@ class LTIUserMatcher:
         """Return a Django user for the given launch data.
 
         Uses the users_for_launch method to execute a query against the LTI
-        user database.
+        user database, fetching only its first result together with the
+        user in a single query.
 
         :param lti_consumer: an LTIConsumer object for the launch data
         :param launch_data: a dict containing LTI launch parameters
@@ -31,10 +30,8 @@ class LTIUserMatcher:
         """
         other_users = self._scope_to_consumer_group(lti_consumer)
         results = self.users_for_launch(other_users, launch_data)
-        if results.exists():
-            return results[0].user
-        else:
-            return None
+        match = results.select_related('user').first()
+        return match.user if match else None
 
     def users_for_launch(self,
                          lti_users: models.query.QuerySet,
@@ -42,8 +39,8 @@ class LTIUserMatcher:
         """Match the given launch data to known LTI users.
 
         Override this method to provide custom user search logic against the
-        LTI user database.  The returned result should contain either
-        zero or one result.
+        LTI user database.  Only the first result is used, so order the
+        query set by preference if it can contain more than one.
 
         :param lti_users: a query set scoped to a LTIToolConsumerGroup
         :param launch_data: a dict containing LTI launch parameters
@@ -56,14 +53,21 @@ class CanvasCustomUserMatcher(LTIUserMatcher):
     def users_for_launch(self,
                          lti_users: models.query.QuerySet,
                          launch_data: dict):
-        result = lti_users.none()
+        # prefer a Canvas login ID match, then fall back to the SIS ID
         canvas_id = launch_data.get("custom_canvas_user_login_id")
-        if canvas_id and canvas_id != "$Canvas.user.loginId":
-            result = lti_users.filter(
-                last_launch_parameters__custom_canvas_user_login_id=canvas_id)
-        if not result.exists():
-            lis_id = launch_data.get("lis_person_sourcedid")
-            if lis_id:
-                result = lti_users.filter(
-                    last_launch_parameters__lis_person_sourcedid=lis_id)
-        return result
+        if canvas_id == "$Canvas.user.loginId":
+            canvas_id = None
+        lis_id = launch_data.get("lis_person_sourcedid")
+        if canvas_id and lis_id:
+            return lti_users.filter(
+                Q(canvas_login_id=canvas_id) | Q(sourcedid=lis_id)
+            ).order_by(
+                Case(When(canvas_login_id=canvas_id, then=Value(0)),
+                     default=Value(1),
+                     output_field=IntegerField()),
+                'pk')
+        elif canvas_id:
+            return lti_users.filter(canvas_login_id=canvas_id)
+        elif lis_id:
+            return lti_users.filter(sourcedid=lis_id)
+        return lti_users.none()
@@ -1,3 +1,4 @@
+import functools
 import re
 import string
 
@@ -25,12 +26,35 @@ def as_https(url):
 
 HEADER_KEY_RE = re.compile(r"^(HTTP_.+|CONTENT_TYPE|CONTENT_LENGTH)$")
 
+# the only request headers oauthlib reads when checking a launch signature
+OAUTH_HEADER_KEYS = (("HTTP_AUTHORIZATION", "Authorization"),
+                     ("CONTENT_TYPE", "Content-Type"))
+
 
 def meta_key_to_header(meta_key):
     return re.sub("_", "-", re.sub("^HTTP_", "", meta_key)).title()
 
 
+# bounded, since clients choose the header names
+@functools.lru_cache(maxsize=512)
+def _header_for_meta_key(meta_key):
+    if HEADER_KEY_RE.match(meta_key) and \
+            not meta_key.startswith("HTTP_X_FORWARDED"):
+        return meta_key_to_header(meta_key)
+    return None
+
+
 def headers_from_request(request):
-    return dict(
-        (meta_key_to_header(k), v) for k, v in request.META.items()
-        if re.match(HEADER_KEY_RE, k) and not k.startswith("HTTP_X_FORWARDED"))
+    headers = {}
+    for k, v in request.META.items():
+        header = _header_for_meta_key(k)
+        if header is not None:
+            headers[header] = v
+    return headers
+
+
+def oauth_headers_from_request(request):
+    """Return just the request headers needed to validate an OAuth launch."""
+    meta = request.META
+    return {header: meta[key] for key, header in OAUTH_HEADER_KEYS
+            if key in meta}
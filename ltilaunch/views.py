@@ -8,7 +8,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView, View
 from django.shortcuts import redirect
 
-from . import LTIUSER_SESSION_KEY
+from . import LTILAUNCH_SESSION_KEY, LTIUSER_SESSION_KEY
 from .models import lti_launch_return_url, LTIToolProvider, get_lti_user, \
     LTIUser
 from .utils import absolute_url_for_path, as_https
@@ -41,8 +41,11 @@ class LaunchView(View):
 
     @staticmethod
     def _set_session_data(request):
-        lti_user = get_lti_user(request.POST)
+        lti_user = getattr(request, 'lti_user', None)
+        if lti_user is None:
+            lti_user = get_lti_user(request.POST)
         request.session[LTIUSER_SESSION_KEY] = lti_user.pk
+        request.session[LTILAUNCH_SESSION_KEY] = lti_user.last_launch_id
 
 
 class ReturnRedirectView(View):
@@ -102,5 +105,6 @@ class DevLoginView(ListView):
             login(request, user,
                   backend="ltilaunch.auth.DevLTILaunchBackend")
             request.session[LTIUSER_SESSION_KEY] = lti_user.pk
+            request.session[LTILAUNCH_SESSION_KEY] = lti_user.last_launch_id
             result = HttpResponseRedirect(self.tool_provider_url, status=303)
         return result